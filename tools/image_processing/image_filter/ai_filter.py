@@ -11,6 +11,8 @@ import re
 import base64
 import configparser
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image
 from openai import OpenAI
@@ -180,6 +182,9 @@ def batch_filter_images(image_folder, condition_text, config,
                         should_cancel=None, on_match_callback=None):
     """批量筛选图片：遍历文件夹中所有图片，用 AI 逐一判断
 
+    [FILTER] max_concurrency 大于 1 时，图片编码与 API 请求在线程池中并发执行，
+    回调与结果仍按文件名顺序依次产生。
+
     Args:
         image_folder: 图片文件夹路径
         condition_text: 筛选条件描述
@@ -219,64 +224,90 @@ def batch_filter_images(image_folder, condition_text, config,
     llm_client = LLMFilterClient(config)
     max_attempts = config.getint('FILTER', 'max_attempts', fallback=2)
 
+    max_concurrency = max(1, config.getint('FILTER', 'max_concurrency', fallback=1))
+
     results = []
     yes_count = 0
     no_count = 0
     error_count = 0
 
-    for i, filename in enumerate(image_files):
-        # 检查取消
-        if should_cancel and should_cancel():
-            if status_callback:
-                status_callback("已取消 AI 筛选")
-            return {
-                "results": results,
-                "yes_count": yes_count,
-                "no_count": no_count,
-                "error_count": error_count,
-                "_cancelled": True
-            }
-
+    def check_one(filename):
+        """在工作线程中完成编码与 API 请求"""
         image_path = os.path.join(image_folder, filename)
+        return llm_client.check_image(image_path, condition_text, max_attempts=max_attempts)
 
+    def cancelled_result():
         if status_callback:
-            status_callback(f"正在判断 ({i + 1}/{total}): {filename}")
-
-        try:
-            result = llm_client.check_image(image_path, condition_text, max_attempts=max_attempts)
-
-            if result is True:
-                yes_count += 1
-                # 立即回调，边识别边复制
-                if on_match_callback:
-                    try:
-                        on_match_callback(filename, image_path)
-                    except Exception as cb_err:
-                        logger.error(f"on_match_callback 执行失败 ({filename}): {str(cb_err)}")
-            elif result is False:
-                no_count += 1
-            else:
-                error_count += 1
+            status_callback("已取消 AI 筛选")
+        return {
+            "results": results,
+            "yes_count": yes_count,
+            "no_count": no_count,
+            "error_count": error_count,
+            "_cancelled": True
+        }
+
+    # 滑动窗口：最多 max_concurrency 个请求同时在途，按提交顺序取回结果，
+    # 保证 results 顺序、on_match_callback 调用顺序与串行模式一致
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    pending = deque()
+    next_index = 0
+
+    try:
+        for i, filename in enumerate(image_files):
+            # 检查取消
+            if should_cancel and should_cancel():
+                return cancelled_result()
+
+            # 补满在途窗口
+            while next_index < total and len(pending) < max_concurrency:
+                pending.append(executor.submit(check_one, image_files[next_index]))
+                next_index += 1
 
-            results.append({
-                "filename": filename,
-                "path": image_path,
-                "result": result,
-                "error": None
-            })
-
-        except Exception as e:
-            error_count += 1
-            results.append({
-                "filename": filename,
-                "path": image_path,
-                "result": None,
-                "error": str(e)
-            })
-            logger.error(f"处理 {filename} 时出错: {str(e)}")
-
-        if progress_callback:
-            progress_callback(i + 1, total)
+            future = pending.popleft()
+            image_path = os.path.join(image_folder, filename)
+
+            if status_callback:
+                status_callback(f"正在判断 ({i + 1}/{total}): {filename}")
+
+            try:
+                result = future.result()
+
+                if result is True:
+                    yes_count += 1
+                    # 立即回调，边识别边复制
+                    if on_match_callback:
+                        try:
+                            on_match_callback(filename, image_path)
+                        except Exception as cb_err:
+                            logger.error(f"on_match_callback 执行失败 ({filename}): {str(cb_err)}")
+                elif result is False:
+                    no_count += 1
+                else:
+                    error_count += 1
+
+                results.append({
+                    "filename": filename,
+                    "path": image_path,
+                    "result": result,
+                    "error": None
+                })
+
+            except Exception as e:
+                error_count += 1
+                results.append({
+                    "filename": filename,
+                    "path": image_path,
+                    "result": None,
+                    "error": str(e)
+                })
+                logger.error(f"处理 {filename} 时出错: {str(e)}")
+
+            if progress_callback:
+                progress_callback(i + 1, total)
+    finally:
+        # 取消时丢弃尚未开始的请求，不等待在途请求返回
+        executor.shutdown(wait=False, cancel_futures=True)
 
     if status_callback:
         status_callback(f"AI 筛选完成！满足: {yes_count} | 不满足: {no_count} | 错误: {error_count}")
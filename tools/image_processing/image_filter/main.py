@@ -38,6 +38,7 @@ def load_config():
         config['FILTER'] = {
             'image_max_size': '1024',
             'max_attempts': '2',
+            'max_concurrency': '4',
         }
     return config
 
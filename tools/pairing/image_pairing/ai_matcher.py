@@ -13,11 +13,15 @@ import configparser
 import logging
 import threading
 import shutil
+from collections import OrderedDict
 from pathlib import Path
 
 from PIL import Image
 from openai import OpenAI
 
+from prefilter import PerceptualPrefilter, SCREENED_OUT_LABEL
+from verdict_store import VerdictStore
+
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -49,6 +53,68 @@ DEFAULT_MATCH_PROMPT = (
 )
 
 
+class EncodedImageCache:
+    """已编码图片 data URL 的内存 LRU 缓存
+
+    以 (绝对路径, mtime, 文件大小, 最大边长) 为键，文件被修改后自动失效。
+    按已缓存字符串的总长度限制内存占用，超出时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, max_bytes):
+        """初始化缓存
+
+        Args:
+            max_bytes: 缓存占用上限（字节），<= 0 表示不缓存
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image_path, max_size):
+        """生成缓存键，文件不存在时返回 None"""
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        return (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, max_size)
+
+    def get(self, key):
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            data_url = self._entries.get(key)
+            if data_url is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data_url
+
+    def put(self, key, data_url):
+        """写入缓存并按容量淘汰旧条目"""
+        size = len(data_url)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._current_bytes -= len(old)
+            self._entries[key] = data_url
+            self._current_bytes += size
+            while self._current_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._current_bytes -= len(evicted)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+
 class LLMClient:
     """LLM API 客户端封装类，通过 OpenAI 兼容 API 格式调用 AI 服务"""
 
@@ -60,6 +126,8 @@ class LLMClient:
         """
         self.config = config
         self.client = None
+        cache_mb = self.config.getint('AI_MATCH', 'encode_cache_mb', fallback=1024)
+        self.image_cache = EncodedImageCache(cache_mb * 1024 * 1024)
         self._init_client()
 
     def _init_client(self):
@@ -87,7 +155,7 @@ class LLMClient:
         return model_name, max_new_tokens, temperature, top_p
 
     def convert_image_to_base64(self, image_path):
-        """将图片文件转换为 base64 编码
+        """将图片文件转换为 base64 编码（结果缓存在 image_cache 中）
 
         Args:
             image_path: 图片文件路径
@@ -97,6 +165,20 @@ class LLMClient:
         """
         max_size = self.config.getint('AI_MATCH', 'image_max_size', fallback=720)
 
+        cache_key = self.image_cache.make_key(image_path, max_size)
+        if cache_key is not None:
+            data_url = self.image_cache.get(cache_key)
+            if data_url is not None:
+                return data_url
+
+        data_url = self._encode_image(image_path, max_size)
+        if cache_key is not None:
+            self.image_cache.put(cache_key, data_url)
+        return data_url
+
+    @staticmethod
+    def _encode_image(image_path, max_size):
+        """解码、缩放并以 JPEG 编码图片，返回 data URL"""
         image = Image.open(image_path)
         # 转换为 RGB（处理 RGBA / P 等模式）
         if image.mode in ('RGBA', 'P'):
@@ -206,7 +288,7 @@ def run_ai_person_match(left_image_path, right_folder, output_base_folder,
     """在后台线程中执行 AI 人物判断匹配
 
     遍历右侧文件夹中的所有图片，依次与左侧选中的图片进行 AI 比对，
-    根据结果将右图复制到对应的分类文件夹中。
+    根据结果将右图复制到对应的分类文件夹中。参照图只编码一次。
 
     Args:
         left_image_path: 左侧选中的图片路径（参照图）
@@ -312,6 +394,9 @@ def run_ai_person_match(left_image_path, right_folder, output_base_folder,
         if progress_callback:
             progress_callback(i + 1, total)
 
+    cache = llm_client.image_cache
+    logger.info(f"图片编码缓存: 命中 {cache.hits} | 编码 {cache.misses}")
+
     # 完成提示
     if status_callback:
         summary = (
@@ -358,6 +443,23 @@ def _make_pair_key(name_a, name_b):
     return (name_b, name_a)
 
 
+def _get_stored_verdict(verdict_store, left_path, right_path):
+    """读取持久化缓存中的结果，读取失败时视为未命中"""
+    try:
+        return verdict_store.get(left_path, right_path)
+    except Exception as e:
+        logger.warning(f"读取判断缓存失败: {str(e)}")
+        return None
+
+
+def _put_stored_verdict(verdict_store, left_path, right_path, result_label):
+    """写入持久化缓存，写入失败（数据库被锁、磁盘已满等）只记录日志，不中断批量判断"""
+    try:
+        verdict_store.put(left_path, right_path, result_label)
+    except Exception as e:
+        logger.error(f"写入判断缓存失败: {str(e)}")
+
+
 def run_ai_person_match_batch(left_folder, right_folder, output_base_folder,
                                config, status_callback=None, progress_callback=None,
                                should_cancel=None):
@@ -365,6 +467,9 @@ def run_ai_person_match_batch(left_folder, right_folder, output_base_folder,
 
     遍历左侧文件夹中的所有图片，每张作为参照图与右侧所有图片进行 AI 比对。
     使用对称配对缓存避免重复判断：(A,B) 和 (B,A) 只调用一次 AI。
+    判断结果同时写入输出目录下的 SQLite 缓存，中断后重新运行会跳过已判断的配对。
+    启用 prefilter_enabled 时先按感知相似度为候选排序，只有前 K 个或达到阈值的配对才调用 AI。
+    图片编码结果在整个批次内共享（受 encode_cache_mb 限制），右图不会重复编码。
 
     Args:
         left_folder: 左侧图片文件夹路径
@@ -406,6 +511,10 @@ def run_ai_person_match_batch(left_folder, right_folder, output_base_folder,
     # 对称配对缓存：key=(name_a, name_b) sorted, value=result_label
     pair_cache = {}
 
+    # 感知相似度预筛选：排名靠后的候选不调用 AI，直接归入"完全不是"
+    prefilter = PerceptualPrefilter.from_config(config)
+    right_paths = [os.path.join(right_folder, f) for f in right_images]
+
     # 统计
     total_results = {
         "完全不是": 0,
@@ -414,43 +523,29 @@ def run_ai_person_match_batch(left_folder, right_folder, output_base_folder,
         "errors": [],
         "unmatched": 0,
         "cached": 0,       # 命中缓存的次数
+        "resumed": 0,      # 从持久化缓存恢复的次数
         "skipped_self": 0, # 跳过的自身对比
+        "prefiltered": 0,  # 预筛选排除（节省的 AI 调用次数）
+        "prefilter_reasons": [],
     }
 
     # 计算总任务数（用于进度条）
     total_pairs = total_left * total_right
     completed = 0
 
-    for li, left_filename in enumerate(left_images):
-        left_path = os.path.join(left_folder, left_filename)
-        left_stem = Path(left_filename).stem
-
-        # 检查取消
-        if should_cancel and should_cancel():
-            if status_callback:
-                status_callback("已取消批量 AI 判断")
-            total_results["_cancelled"] = True
-            return total_results
-
-        # 为当前左图创建输出子文件夹
-        left_output = os.path.join(output_base_folder, left_stem)
-        os.makedirs(left_output, exist_ok=True)
+    # 持久化结果缓存：中断后重新运行时跳过已判断的配对
+    verdict_store = None
+    if config.getboolean('AI_MATCH', 'persist_verdicts', fallback=True):
+        model_name = llm_client.get_model_config()[0]
+        image_max_size = config.getint('AI_MATCH', 'image_max_size', fallback=720)
+        verdict_store = VerdictStore(output_base_folder, model_name,
+                                     DEFAULT_MATCH_PROMPT, image_max_size)
 
-        # 复制参考图
-        ref_dest = _get_unique_filename(left_output, left_filename)
-        shutil.copy2(left_path, ref_dest)
+    try:
+        for li, left_filename in enumerate(left_images):
+            left_path = os.path.join(left_folder, left_filename)
+            left_stem = Path(left_filename).stem
 
-        # 创建置信度子文件夹
-        left_output_folders = {}
-        for label, folder_name in OUTPUT_FOLDERS.items():
-            folder_path = os.path.join(left_output, folder_name)
-            os.makedirs(folder_path, exist_ok=True)
-            left_output_folders[label] = folder_path
-
-        if status_callback:
-            status_callback(f"参照图 ({li + 1}/{total_left}): {left_filename}")
-
-        for ri, right_filename in enumerate(right_images):
             # 检查取消
             if should_cancel and should_cancel():
                 if status_callback:
@@ -458,60 +553,119 @@ def run_ai_person_match_batch(left_folder, right_folder, output_base_folder,
                 total_results["_cancelled"] = True
                 return total_results
 
-            completed += 1
-            if progress_callback:
-                progress_callback(completed, total_pairs)
+            # 为当前左图创建输出子文件夹
+            left_output = os.path.join(output_base_folder, left_stem)
+            os.makedirs(left_output, exist_ok=True)
 
-            right_path = os.path.join(right_folder, right_filename)
+            # 复制参考图（断点恢复时已存在则跳过）
+            ref_dest = os.path.join(left_output, left_filename)
+            if not os.path.exists(ref_dest):
+                shutil.copy2(left_path, ref_dest)
 
-            # 同一张图跳过
-            if left_path == right_path:
-                total_results["skipped_self"] += 1
-                continue
+            # 创建置信度子文件夹
+            left_output_folders = {}
+            for label, folder_name in OUTPUT_FOLDERS.items():
+                folder_path = os.path.join(left_output, folder_name)
+                os.makedirs(folder_path, exist_ok=True)
+                left_output_folders[label] = folder_path
 
-            # 检查对称缓存
-            pair_key = _make_pair_key(left_filename, right_filename)
-            if pair_key in pair_cache:
-                result_label = pair_cache[pair_key]
-                total_results["cached"] += 1
-            else:
-                # 调用 AI 判断
+            if status_callback:
+                status_callback(f"参照图 ({li + 1}/{total_left}): {left_filename}")
+
+            screened_out = {}
+            if prefilter is not None:
                 if status_callback:
-                    status_callback(
-                        f"AI判断 ({li + 1}/{total_left}): {left_filename} vs {right_filename} "
-                        f"({completed}/{total_pairs})"
-                    )
-
-                try:
-                    result_label = llm_client.match_person(
-                        left_path, right_path,
-                        max_attempts=max_attempts
-                    )
-                except Exception as e:
-                    error_msg = f"{left_filename} vs {right_filename}: {str(e)}"
-                    total_results["errors"].append(error_msg)
-                    logger.error(error_msg)
+                    status_callback(f"预筛选候选 ({li + 1}/{total_left}): {left_filename}")
+                screened_out = prefilter.screen(left_path, right_paths)
+
+            for ri, right_filename in enumerate(right_images):
+                # 检查取消
+                if should_cancel and should_cancel():
+                    if status_callback:
+                        status_callback("已取消批量 AI 判断")
+                    total_results["_cancelled"] = True
+                    return total_results
+
+                completed += 1
+                if progress_callback:
+                    progress_callback(completed, total_pairs)
+
+                right_path = os.path.join(right_folder, right_filename)
+
+                # 同一张图跳过
+                if left_path == right_path:
+                    total_results["skipped_self"] += 1
                     continue
 
-                # 存入缓存
-                pair_cache[pair_key] = result_label
-
-            # 根据结果处理
-            if result_label is not None and result_label in left_output_folders:
-                dest_folder = left_output_folders[result_label]
-                dest_path = _get_unique_filename(dest_folder, right_filename)
-                shutil.copy2(right_path, dest_path)
-                total_results[result_label] += 1
-            elif result_label == "完全不是":
-                total_results["完全不是"] += 1
-                # 不复制，跳过
-            else:
-                # 无法判断 → 归入"有些像"
-                dest_folder = left_output_folders["有些像"]
-                dest_path = _get_unique_filename(dest_folder, right_filename)
-                shutil.copy2(right_path, dest_path)
-                total_results["有些像"] += 1
-                total_results["unmatched"] += 1
+                # 检查对称缓存
+                pair_key = _make_pair_key(left_filename, right_filename)
+                stored_label = None
+                if pair_key not in pair_cache and verdict_store is not None:
+                    stored_label = _get_stored_verdict(verdict_store, left_path, right_path)
+
+                if pair_key in pair_cache:
+                    result_label = pair_cache[pair_key]
+                    total_results["cached"] += 1
+                elif stored_label is not None:
+                    result_label = stored_label
+                    pair_cache[pair_key] = result_label
+                    total_results["resumed"] += 1
+                elif right_path in screened_out:
+                    # 预筛选排除，不写入配对缓存，反向配对时仍可由 AI 判断
+                    result_label = SCREENED_OUT_LABEL
+                    total_results["prefiltered"] += 1
+                    reason = f"{left_filename} vs {right_filename}: {screened_out[right_path]}"
+                    total_results["prefilter_reasons"].append(reason)
+                    logger.info(f"[预筛选排除] {reason}")
+                else:
+                    # 调用 AI 判断
+                    if status_callback:
+                        status_callback(
+                            f"AI判断 ({li + 1}/{total_left}): {left_filename} vs {right_filename} "
+                            f"({completed}/{total_pairs})"
+                        )
+
+                    try:
+                        result_label = llm_client.match_person(
+                            left_path, right_path,
+                            max_attempts=max_attempts
+                        )
+                    except Exception as e:
+                        error_msg = f"{left_filename} vs {right_filename}: {str(e)}"
+                        total_results["errors"].append(error_msg)
+                        logger.error(error_msg)
+                        continue
+
+                    # 存入缓存
+                    pair_cache[pair_key] = result_label
+                    if verdict_store is not None and result_label is not None:
+                        _put_stored_verdict(verdict_store, left_path, right_path, result_label)
+
+                # 根据结果处理
+                if result_label is not None and result_label in left_output_folders:
+                    dest_folder = left_output_folders[result_label]
+                    # 断点恢复时，上次已复制过的文件不再重复复制
+                    if stored_label is None or not os.path.exists(os.path.join(dest_folder, right_filename)):
+                        dest_path = _get_unique_filename(dest_folder, right_filename)
+                        shutil.copy2(right_path, dest_path)
+                    total_results[result_label] += 1
+                elif result_label == "完全不是":
+                    total_results["完全不是"] += 1
+                    # 不复制，跳过
+                else:
+                    # 无法判断 → 归入"有些像"
+                    dest_folder = left_output_folders["有些像"]
+                    dest_path = _get_unique_filename(dest_folder, right_filename)
+                    shutil.copy2(right_path, dest_path)
+                    total_results["有些像"] += 1
+                    total_results["unmatched"] += 1
+    finally:
+        # 取消或出错时也要关闭连接
+        if verdict_store is not None:
+            verdict_store.close()
+
+    cache = llm_client.image_cache
+    logger.info(f"图片编码缓存: 命中 {cache.hits} | 编码 {cache.misses}")
 
     # 完成提示
     if status_callback:
@@ -525,6 +679,10 @@ def run_ai_person_match_batch(left_folder, right_folder, output_base_folder,
         )
         if cache_hit > 0:
             summary += f" | 缓存命中: {cache_hit}"
+        if total_results["resumed"] > 0:
+            summary += f" | 断点恢复: {total_results['resumed']}"
+        if total_results["prefiltered"] > 0:
+            summary += f" | 预筛选节省AI调用: {total_results['prefiltered']}"
         if skipped > 0:
             summary += f" | 跳过自身: {skipped}"
         if total_results["errors"]:
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+双面板图片配对工具 - 命令行批量导出
+不启动界面，直接将两个文件夹中的同名图片对导出到 control / target 子文件夹
+
+用法示例:
+    python export_cli.py 左文件夹 右文件夹 导出文件夹 --rename --rotate --format webp
+"""
+
+import os
+import sys
+import argparse
+import configparser
+
+from utils import get_export_format, EXPORT_FORMAT_EXTENSIONS
+from export_engine import find_common_files, plan_export, PairExportEngine
+
+
+def load_config():
+    """读取与本脚本同目录的 config.ini"""
+    config = configparser.ConfigParser()
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.ini")
+    if os.path.exists(config_path):
+        config.read(config_path, encoding='utf-8')
+    return config
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="批量导出同名图片对")
+    parser.add_argument("left_folder", help="左侧（control）图片文件夹")
+    parser.add_argument("right_folder", help="右侧（target）图片文件夹")
+    parser.add_argument("export_folder", help="导出文件夹")
+    parser.add_argument("--size", default="min", choices=["min", "fill", "crop", "custom"],
+                        help="尺寸处理: min 取两图最小宽高 / fill 白底填充 1:1 / crop 裁剪 1:1 / custom 自定义尺寸")
+    parser.add_argument("--crop-style", default="top", choices=["top", "bottom"],
+                        help="竖图裁剪时保留的位置（--size crop 时生效）")
+    parser.add_argument("--custom-size", default="1024x1024", help="自定义尺寸，如 1024x1024（--size custom 时生效）")
+    parser.add_argument("--rename", action="store_true", help="按 pair_XXX 序号重命名")
+    parser.add_argument("--shuffle", action="store_true", help="打乱序号（需要 --rename）")
+    parser.add_argument("--rotate", action="store_true", help="额外导出 90/180/270 度旋转版本")
+    parser.add_argument("--preview", action="store_true", help="生成配对预览拼接图")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMAT_EXTENSIONS), help="导出格式，默认读取 config.ini")
+    parser.add_argument("--workers", type=int, help="导出进程数，默认读取 config.ini")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config = load_config()
+
+    for folder in (args.left_folder, args.right_folder):
+        if not os.path.isdir(folder):
+            print(f"错误: 文件夹不存在 {folder}")
+            return 1
+
+    common_files = find_common_files(args.left_folder, args.right_folder)
+    if not common_files:
+        print("没有找到同名文件")
+        return 1
+
+    export_format = get_export_format(config)
+    if args.format:
+        export_format["format"] = args.format
+
+    custom_size = None
+    if args.size == "custom":
+        try:
+            w, h = args.custom_size.lower().split("x")
+            custom_size = (int(w), int(h))
+        except ValueError:
+            print(f"错误: 无效的自定义尺寸 {args.custom_size}")
+            return 1
+
+    options = {
+        "fill_ratio": args.size in ("fill", "crop"),
+        "crop_style": args.crop_style if args.size == "crop" else None,
+        "size_mode": 3 if args.size == "custom" else 0,
+        "custom_size": custom_size,
+        "enable_rename": args.rename,
+        "shuffle_order": args.shuffle and args.rename,
+        "rotate": args.rotate,
+        "export_format": export_format,
+        "preview": args.preview,
+    }
+
+    jobs, settings = plan_export(args.left_folder, args.right_folder, args.export_folder, options, common_files)
+    workers = args.workers if args.workers is not None else config.getint('EXPORT', 'workers', fallback=0)
+    engine = PairExportEngine(jobs, settings, args.export_folder, max_workers=workers or None)
+
+    print(f"找到 {len(common_files)} 对同名图片，开始导出...")
+    engine.start()
+    summary = None
+    try:
+        while summary is None:
+            event = engine.progress_queue.get()
+            if event[0] == "progress":
+                _, completed, total, success, error = event
+                print(f"\r进度 {completed}/{total} 成功:{success} 失败:{error}", end="", flush=True)
+            elif event[0] == "done":
+                summary = event[1]
+    except KeyboardInterrupt:
+        print("\n正在取消，等待进行中的图片对完成...")
+        engine.cancel()
+        while summary is None:
+            event = engine.progress_queue.get()
+            if event[0] == "done":
+                summary = event[1]
+
+    print()
+    for error in summary["errors"][:10]:
+        print(f"  失败: {error}")
+    status = "已取消" if summary["cancelled"] else "完成"
+    print(f"{status}: 成功 {summary['success_count']}，失败 {summary['error_count']}")
+    if summary["manifest_path"]:
+        print(f"导出清单: {summary['manifest_path']}")
+    return 0 if summary["error_count"] == 0 and not summary["cancelled"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
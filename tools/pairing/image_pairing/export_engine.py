@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+双面板图片配对工具 - 批量导出引擎
+
+负责同名图片对的导出规划（序号分配、已有文件重新编号）与执行。
+缩放与编码在进程池中进行，进度通过队列上报，GUI 用 Tk 定时器轮询，命令行直接阻塞运行。
+每次导出会在导出目录写入 export_manifest.json，记录生成的全部图片对。
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import shutil
+import threading
+import logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from PIL import Image
+
+from config import IMAGE_EXTENSIONS
+from utils import (
+    fill_image_with_background, crop_to_square, stitch_pair_preview,
+    EXPORT_FORMAT_EXTENSIONS, save_export_image
+)
+
+logger = logging.getLogger(__name__)
+
+# str.endswith 需要元组
+IMAGE_SUFFIXES = tuple(IMAGE_EXTENSIONS)
+ROT_SUFFIX = {0: "", 90: "_r90", 180: "_r180", 270: "_r270"}
+MANIFEST_NAME = "export_manifest.json"
+PREVIEW_FOLDER_NAME = "配对预览"
+
+
+def find_common_files(left_folder, right_folder):
+    """找出左右文件夹中的同名图片（排序）"""
+    left_files = set(f for f in os.listdir(left_folder) if Path(f).suffix.lower() in IMAGE_SUFFIXES)
+    right_files = set(f for f in os.listdir(right_folder) if Path(f).suffix.lower() in IMAGE_SUFFIXES)
+    return sorted(left_files & right_files)
+
+
+def _renumber_existing(folder, existing_index_map):
+    """打乱模式下将文件夹中已存在的 pair_XXX 图片与 TXT 按新序号重命名（经过临时名称避免冲突）"""
+    temp_items = []
+    for f in os.listdir(folder):
+        lower = f.lower()
+        if not f.startswith("pair_") or not (lower.endswith(IMAGE_SUFFIXES) or lower.endswith('.txt')):
+            continue
+        try:
+            old_idx = int(f[5:8])
+        except ValueError:
+            continue
+        if old_idx not in existing_index_map:
+            continue
+        ext = Path(f).suffix
+        rot_part = f[:-len(ext)][8:]  # 例如 "_r90" 或 ""
+        temp_name = f"_temp_{old_idx:03d}{rot_part}{ext}"
+        os.rename(os.path.join(folder, f), os.path.join(folder, temp_name))
+        temp_items.append((temp_name, existing_index_map[old_idx], rot_part, ext))
+
+    for temp_name, new_idx, rot_part, ext in temp_items:
+        os.rename(os.path.join(folder, temp_name),
+                  os.path.join(folder, f"pair_{new_idx:03d}{rot_part}{ext}"))
+
+
+def plan_export(left_folder, right_folder, export_folder, options, common_files=None):
+    """规划一次批量导出
+
+    Args:
+        left_folder: 左侧（control）图片文件夹
+        right_folder: 右侧（target）图片文件夹
+        export_folder: 导出根目录
+        options: 导出选项字典，键包括 fill_ratio / crop_style / size_mode / custom_size /
+                 enable_rename / shuffle_order / rotate / export_format / preview
+        common_files: 同名文件列表，默认自动查找
+
+    Returns:
+        tuple: (jobs, settings)
+            jobs: 每个图片对一个任务 {"filename", "left_path", "right_path", "outputs": [(angle, stem), ...]}
+            settings: 所有任务共享的处理参数
+    """
+    if common_files is None:
+        common_files = find_common_files(left_folder, right_folder)
+
+    enable_rename = options["enable_rename"]
+    shuffle_order = options["shuffle_order"]
+    angles = [0, 90, 180, 270] if options["rotate"] else [0]
+
+    control_folder = os.path.join(export_folder, "control")
+    target_folder = os.path.join(export_folder, "target")
+    os.makedirs(control_folder, exist_ok=True)
+    os.makedirs(target_folder, exist_ok=True)
+    preview_folder = os.path.join(export_folder, PREVIEW_FOLDER_NAME) if options.get("preview") else None
+    if preview_folder:
+        os.makedirs(preview_folder, exist_ok=True)
+
+    # 先展开旋转版本，再打乱
+    task_list = [(f, angle) for f in sorted(common_files) for angle in angles]
+    if shuffle_order:
+        random.shuffle(task_list)
+
+    # 如果启用重命名，先扫描已存在的文件，获取已使用的序号
+    used_indices = set()
+    if enable_rename:
+        for folder in [control_folder, target_folder]:
+            for f in os.listdir(folder):
+                if f.startswith("pair_") and f.lower().endswith(IMAGE_SUFFIXES):
+                    try:
+                        used_indices.add(int(f[5:8]))
+                    except ValueError:
+                        pass
+
+    # 为每个任务分配序号
+    file_index_map = {}
+    if enable_rename and shuffle_order:
+        # 彻底打乱模式：所有文件（已存在 + 新导出）一起分配随机序号
+        all_indices = list(range(1, len(used_indices) + len(task_list) + 1))
+        random.shuffle(all_indices)
+
+        used_indices_list = sorted(used_indices)
+        existing_index_map = {old_idx: all_indices[i] for i, old_idx in enumerate(used_indices_list)}
+        remaining_indices = all_indices[len(used_indices_list):]
+        for i, task in enumerate(task_list):
+            file_index_map[task] = remaining_indices[i]
+
+        if existing_index_map:
+            for folder in [control_folder, target_folder]:
+                _renumber_existing(folder, existing_index_map)
+    elif enable_rename:
+        # 顺序模式：从 1 开始依次分配，跳过已使用的
+        next_index = 1
+        for task in task_list:
+            while next_index in used_indices:
+                next_index += 1
+            file_index_map[task] = next_index
+            next_index += 1
+
+    # 按图片对分组：每对图片只解码一次
+    jobs = {}
+    for filename, angle in task_list:
+        if enable_rename:
+            stem = f"pair_{file_index_map[(filename, angle)]:03d}{ROT_SUFFIX[angle]}"
+        else:
+            stem = f"{Path(filename).stem}{ROT_SUFFIX[angle]}"
+        job = jobs.setdefault(filename, {
+            "filename": filename,
+            "left_path": os.path.join(left_folder, filename),
+            "right_path": os.path.join(right_folder, filename),
+            "outputs": [],
+        })
+        job["outputs"].append((angle, stem))
+
+    settings = {
+        "fill_ratio": options["fill_ratio"],
+        "crop_style": options["crop_style"],
+        "size_mode": options.get("size_mode", 0),
+        "custom_size": options.get("custom_size"),
+        "export_format": options["export_format"],
+        "control_folder": control_folder,
+        "target_folder": target_folder,
+        "preview_folder": preview_folder,
+    }
+    return list(jobs.values()), settings
+
+
+def _resize_pair(img_left, img_right, settings):
+    """按尺寸模式处理一对（已旋转的）图片"""
+    size_mode = settings["size_mode"]
+    target_w = min(img_left.width, img_right.width)
+    target_h = min(img_left.height, img_right.height)
+
+    if size_mode == 3:
+        target_w, target_h = settings["custom_size"]
+        return (img_left.resize((target_w, target_h), Image.LANCZOS),
+                img_right.resize((target_w, target_h), Image.LANCZOS))
+
+    if settings["fill_ratio"]:
+        square = max(target_w, target_h)
+        crop_style = settings["crop_style"]
+        if crop_style:
+            return (crop_to_square(img_left, crop_style).resize((square, square), Image.LANCZOS),
+                    crop_to_square(img_right, crop_style).resize((square, square), Image.LANCZOS))
+        return (fill_image_with_background(img_left, (square, square)),
+                fill_image_with_background(img_right, (square, square)))
+
+    return (img_left.resize((target_w, target_h), Image.LANCZOS),
+            img_right.resize((target_w, target_h), Image.LANCZOS))
+
+
+def export_pair(job, settings):
+    """导出一个图片对的所有旋转版本（在子进程中执行）
+
+    Returns:
+        list: 每个输出一条记录 {"filename", "angle", "export_name", "success", "error"}
+    """
+    filename = job["filename"]
+    export_format = settings["export_format"]
+    export_ext = EXPORT_FORMAT_EXTENSIONS[export_format["format"]]
+    control_folder = settings["control_folder"]
+    target_folder = settings["target_folder"]
+    preview_folder = settings["preview_folder"]
+
+    def record(angle, export_name, error=None):
+        return {"filename": filename, "angle": angle, "export_name": export_name,
+                "success": error is None, "error": error}
+
+    try:
+        img_left_raw = Image.open(job["left_path"])
+        img_left_raw.load()
+        img_right_raw = Image.open(job["right_path"])
+        img_right_raw.load()
+    except Exception as e:
+        return [record(angle, None, str(e)) for angle, _ in job["outputs"]]
+
+    txt_name = Path(filename).stem + '.txt'
+    left_txt = os.path.join(os.path.dirname(job["left_path"]), txt_name)
+    right_txt = os.path.join(os.path.dirname(job["right_path"]), txt_name)
+
+    records = []
+    for angle, stem in job["outputs"]:
+        export_name = stem + export_ext
+        try:
+            img_left = img_left_raw.rotate(angle, expand=True)
+            img_right = img_right_raw.rotate(angle, expand=True)
+            img_left_processed, img_right_processed = _resize_pair(img_left, img_right, settings)
+
+            save_export_image(img_left_processed, os.path.join(control_folder, export_name), export_format)
+            save_export_image(img_right_processed, os.path.join(target_folder, export_name), export_format)
+
+            # 导出同名 TXT 标注文件
+            if os.path.exists(left_txt):
+                shutil.copy2(left_txt, os.path.join(control_folder, stem + '.txt'))
+            if os.path.exists(right_txt):
+                shutil.copy2(right_txt, os.path.join(target_folder, stem + '.txt'))
+
+            # 生成配对预览拼接图
+            if preview_folder:
+                stitched = stitch_pair_preview(img_left_processed, img_right_processed)
+                save_export_image(stitched, os.path.join(preview_folder, export_name), export_format)
+
+            records.append(record(angle, export_name))
+        except Exception as e:
+            records.append(record(angle, export_name, str(e)))
+
+    return records
+
+
+class PairExportEngine:
+    """批量导出执行器
+
+    调用 start() 在后台线程中运行，通过 progress_queue 上报事件：
+        ("progress", completed, total, success_count, error_count)
+        ("done", summary)
+    也可以直接调用 run() 同步执行。
+    """
+
+    def __init__(self, jobs, settings, export_folder, max_workers=None, use_processes=True):
+        self.jobs = jobs
+        self.settings = settings
+        self.export_folder = export_folder
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.use_processes = use_processes
+        self.progress_queue = queue.Queue()
+        self.summary = None
+        self._cancel_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """在后台线程中开始导出"""
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """请求取消：尚未开始的图片对不再处理，正在处理的图片对完成后停止"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def run(self):
+        """同步执行导出，返回结果汇总
+
+        无论成功、取消还是出错，最后都会向 progress_queue 放入一个 ("done", summary) 事件；
+        进程池无法启动等整体错误记录在 summary["fatal_error"] 中。
+        """
+        total = sum(len(job["outputs"]) for job in self.jobs)
+        records = []
+        success_count = 0
+        error_count = 0
+        futures = []
+        consumed = set()
+        fatal_error = None
+        manifest_path = None
+
+        def consume(future):
+            nonlocal success_count, error_count
+            consumed.add(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                job = self.jobs[futures.index(future)]
+                result = [{"filename": job["filename"], "angle": angle, "export_name": None,
+                           "success": False, "error": str(e)} for angle, _ in job["outputs"]]
+            for rec in result:
+                records.append(rec)
+                if rec["success"]:
+                    success_count += 1
+                else:
+                    error_count += 1
+            self.progress_queue.put(("progress", len(records), total, success_count, error_count))
+
+        try:
+            # 创建进程池和提交任务也可能失败（进程池损坏、settings 无法序列化等）
+            executor_cls = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            workers = max(1, min(self.max_workers, len(self.jobs)))
+            executor = executor_cls(max_workers=workers)
+            try:
+                futures.extend(executor.submit(export_pair, job, self.settings) for job in self.jobs)
+                for future in as_completed(futures):
+                    consume(future)
+                    if self._cancel_event.is_set():
+                        break
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+            # 取消时收集已经完成但尚未统计的任务
+            for future in futures:
+                if future not in consumed and future.done() and not future.cancelled():
+                    consume(future)
+
+            manifest_path = self._write_manifest(records)
+        except Exception as e:
+            fatal_error = str(e)
+            logger.error(f"导出失败: {fatal_error}")
+        finally:
+            errors = [f"{r['filename']}: {r['error']}" for r in records if not r["success"]]
+            if fatal_error:
+                errors.insert(0, f"导出中止: {fatal_error}")
+            self.summary = {
+                "success_count": success_count,
+                "error_count": error_count + (1 if fatal_error else 0),
+                "errors": errors,
+                "paired_files": sorted({r["filename"] for r in records if r["success"]}),
+                "total": total,
+                "cancelled": self._cancel_event.is_set(),
+                "manifest_path": manifest_path,
+                "fatal_error": fatal_error,
+            }
+            # 保证 GUI / 命令行的轮询一定能结束
+            self.progress_queue.put(("done", self.summary))
+        return self.summary
+
+    def _write_manifest(self, records):
+        """写入本次导出的图片对清单"""
+        job_map = {job["filename"]: job for job in self.jobs}
+        control_rel = os.path.relpath(self.settings["control_folder"], self.export_folder)
+        target_rel = os.path.relpath(self.settings["target_folder"], self.export_folder)
+        preview_folder = self.settings["preview_folder"]
+        preview_rel = os.path.relpath(preview_folder, self.export_folder) if preview_folder else None
+
+        pairs = []
+        for rec in sorted(records, key=lambda r: (r["export_name"] or "", r["filename"])):
+            if not rec["success"]:
+                continue
+            job = job_map[rec["filename"]]
+            name = rec["export_name"]
+            pairs.append({
+                "source": rec["filename"],
+                "left": job["left_path"],
+                "right": job["right_path"],
+                "angle": rec["angle"],
+                "control": os.path.join(control_rel, name),
+                "target": os.path.join(target_rel, name),
+                "preview": os.path.join(preview_rel, name) if preview_rel else None,
+            })
+
+        manifest = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "export_format": self.settings["export_format"],
+            "cancelled": self._cancel_event.is_set(),
+            "pairs": pairs,
+        }
+        manifest_path = os.path.join(self.export_folder, MANIFEST_NAME)
+        try:
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.error(f"写入导出清单失败: {e}")
+            return None
+        return manifest_path
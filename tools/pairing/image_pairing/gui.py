@@ -8,11 +8,10 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
 import threading
+import queue
 import configparser
 from pathlib import Path
 import shutil
-import random
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from PIL import Image, ImageTk, ImageDraw
 
 from config import (
@@ -20,8 +19,12 @@ from config import (
     DARK_CONTAINER_BG, DARK_HIGHLIGHT, DEFAULT_WINDOW_WIDTH, DEFAULT_WINDOW_HEIGHT
 )
 from panel import ImagePanel
-from utils import fill_image_with_background, crop_to_square, generate_renamed_filename, get_image_files, stitch_pair_preview
+from utils import (
+    fill_image_with_background, crop_to_square, generate_renamed_filename, get_image_files, stitch_pair_preview,
+    EXPORT_FORMAT_EXTENSIONS, get_export_format, save_export_image
+)
 from ai_matcher import run_ai_person_match, run_ai_person_match_batch
+from export_engine import find_common_files, plan_export, PairExportEngine
 
 
 class ImagePairToolGUI:
@@ -50,6 +53,9 @@ class ImagePairToolGUI:
         # AI 匹配取消标志
         self._cancel_ai_match = False
 
+        # 正在运行的批量导出引擎
+        self._export_engine = None
+
         self.create_widgets()
 
         # 绑定键盘快捷键
@@ -101,9 +107,10 @@ class ImagePairToolGUI:
                   fg="white").pack(side=tk.RIGHT, padx=5)
 
         # 一键自动配对按钮
-        tk.Button(toolbar, text="一键自动配对", command=self.auto_pair_all, width=15,
-                  bg="#0078d4" if self.dark_mode else "#0078d4",
-                  fg="white").pack(side=tk.RIGHT, padx=5)
+        self.auto_pair_button = tk.Button(toolbar, text="一键自动配对", command=self.auto_pair_all, width=15,
+                                          bg="#0078d4" if self.dark_mode else "#0078d4",
+                                          fg="white")
+        self.auto_pair_button.pack(side=tk.RIGHT, padx=5)
 
         # 导出按钮
         self.export_button = tk.Button(toolbar, text="导出配对", command=self.export_pairs,
@@ -800,6 +807,8 @@ class ImagePairToolGUI:
         rotate_var = tk.BooleanVar(value=False)
         custom_w_var = tk.StringVar(value="1024")
         custom_h_var = tk.StringVar(value="1024")
+        export_format = get_export_format(self.config)
+        format_var = tk.StringVar(value=export_format["format"])
 
         body = tk.Frame(dialog, bg=bg)
         body.pack(padx=24, pady=16)
@@ -861,13 +870,18 @@ class ImagePairToolGUI:
         size_mode.trace_add("write", on_mode_change)
 
         label("文件命名方式", bold=True)
-        radio("保留原始文件名（统一导出为 .png）", rename_mode, 0)
-        radio("按序号重命名（pair_001.png, pair_002.png...）", rename_mode, 1)
+        radio("保留原始文件名（扩展名按输出格式）", rename_mode, 0)
+        radio("按序号重命名（pair_001, pair_002...）", rename_mode, 1)
         checkbox("随机打乱顺序", shuffle_var)
 
         label("数据增强", bold=True)
         checkbox("每个图片对导出4个旋转版本（0°/90°/180°/270°）", rotate_var)
 
+        label("输出格式", bold=True)
+        radio(f"PNG（压缩级别 {export_format['png_compress_level']}）", format_var, "png")
+        radio("WebP（无损）", format_var, "webp")
+        radio(f"JPEG（质量 {export_format['jpeg_quality']}）", format_var, "jpeg")
+
         tk.Label(body, text=f"共 {self._pending_export_count} 对同名文件",
                  bg=bg, fg=DARK_HIGHLIGHT if self.dark_mode else "#0078d4",
                  font=("", 10, "bold")).pack(pady=(12, 8), anchor="w")
@@ -898,6 +912,7 @@ class ImagePairToolGUI:
             result["enable_rename"] = rename_mode.get() == 1
             result["shuffle_order"] = shuffle_var.get() if rename_mode.get() == 1 else False
             result["rotate"] = rotate_var.get()
+            result["export_format"] = dict(export_format, format=format_var.get())
             dialog.destroy()
 
         def on_cancel():
@@ -910,7 +925,7 @@ class ImagePairToolGUI:
         return result if result["ok"] else None
 
     def auto_pair_all(self):
-        """一键自动配对所有同名文件并导出 (多线程优化版)"""
+        """一键自动配对所有同名文件并导出（进程池导出，界面不阻塞）"""
         export_folder = self.export_folder.get()
 
         if not export_folder:
@@ -928,289 +943,93 @@ class ImagePairToolGUI:
             messagebox.showerror("错误", "右侧面板未选择有效文件夹")
             return
 
-        # 获取左右两侧的图片文件列表
-        left_files = set(f for f in os.listdir(left_folder)
-                        if Path(f).suffix.lower() in ['.jpg', '.jpeg', '.png', '.webp', '.bmp'])
-        right_files = set(f for f in os.listdir(right_folder)
-                         if Path(f).suffix.lower() in ['.jpg', '.jpeg', '.png', '.webp', '.bmp'])
-
         # 找出同名文件
-        common_files = left_files & right_files
+        common_files = find_common_files(left_folder, right_folder)
 
         if not common_files:
             messagebox.showinfo("提示", "没有找到同名文件")
             return
 
-        from utils import crop_to_square
-
         # 显示导出配置对话框
         self._pending_export_count = len(common_files)
         cfg = self._show_export_config_dialog()
         if not cfg:
             return
+        cfg["preview"] = self.preview_var.get()
 
-        fill_ratio = cfg["fill_ratio"]
-        crop_style = cfg["crop_style"]
-        size_mode = cfg.get("size_mode", 0)
-        custom_size = cfg.get("custom_size", None)
-        enable_rename = cfg["enable_rename"]
-        shuffle_order = cfg["shuffle_order"]
-        do_rotate = cfg["rotate"]
-        do_preview = self.preview_var.get()
-
-        ROTATION_ANGLES = [0, 90, 180, 270] if do_rotate else [0]
-        ROT_SUFFIX = {0: "", 90: "_r90", 180: "_r180", 270: "_r270"}
-
-        # 创建导出子文件夹
-        control_folder = os.path.join(export_folder, "control")
-        target_folder = os.path.join(export_folder, "target")
-        os.makedirs(control_folder, exist_ok=True)
-        os.makedirs(target_folder, exist_ok=True)
-        preview_folder = os.path.join(export_folder, "配对预览") if do_preview else None
-        if preview_folder:
-            os.makedirs(preview_folder, exist_ok=True)
-
-        # 先展开旋转版本，再打乱
-        task_list = []
-        for f in sorted(common_files):
-            for angle in ROTATION_ANGLES:
-                task_list.append((f, angle))
-        if shuffle_order:
-            random.shuffle(task_list)
-        total_count = len(task_list)
-
-        # 如果启用重命名，先扫描已存在的文件，获取已使用的序号和文件
-        used_indices = set()
-        existing_files = []  # 已存在的文件列表
-        if enable_rename:
-            image_extensions = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
-            for folder in [control_folder, target_folder]:
-                for f in os.listdir(folder):
-                    if f.startswith("pair_") and f.lower().endswith(image_extensions):
-                        try:
-                            num = int(f[5:8])
-                            used_indices.add(num)
-                            existing_files.append(f)
-                        except ValueError:
-                            pass
-
-        # 为每个任务分配序号
-        file_index_map = {}
-        existing_index_map = {}  # 已存在文件的序号映射：旧序号 -> 新序号
-        if enable_rename and shuffle_order:
-            # 彻底打乱模式：所有文件（已存在 + 新导出）一起分配随机序号
-            total_files = len(used_indices) + total_count  # 总文件数
-            all_indices = list(range(1, total_files + 1))  # 连续序号 1 到总数
-            random.shuffle(all_indices)  # 打乱序号
-
-            # 先为已存在的文件分配序号
-            used_indices_list = sorted(list(used_indices))  # 排序保证一致性
-            for i, old_idx in enumerate(used_indices_list):
-                existing_index_map[old_idx] = all_indices[i]
-
-            # 再为新任务分配剩余的序号
-            remaining_indices = all_indices[len(used_indices_list):]
-            for i, (filename, angle) in enumerate(task_list):
-                file_index_map[(filename, angle)] = remaining_indices[i]
-        else:
-            # 顺序模式：从 1 开始依次分配，跳过已使用的
-            next_index = 1
-            for filename, angle in task_list:
-                while next_index in used_indices:
-                    next_index += 1
-                file_index_map[(filename, angle)] = next_index
-                next_index += 1
-
-        # 如果启用打乱，先重命名已存在的文件（包括图片和 TXT，含旋转后缀）
-        if enable_rename and shuffle_order and existing_index_map:
-            image_extensions = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
-            for folder in [control_folder, target_folder]:
-                # 第一步：将所有文件重命名为临时名称（包括 TXT）
-                temp_map = {}  # 旧序号 -> [(临时名称，新序号, rotation_suffix)]
-                for f in os.listdir(folder):
-                    if f.startswith("pair_") and f.lower().endswith(image_extensions):
-                        try:
-                            old_idx = int(f[5:8])
-                            if old_idx in existing_index_map:
-                                new_idx = existing_index_map[old_idx]
-                                ext = Path(f).suffix
-                                # 提取旋转后缀（如 _r90, _r180, _r270 或无）
-                                rot_part = ""
-                                if len(f) > 11 and f[8] == '_':
-                                    rot_part = f[8:Path(f).stem.rfind('_')] if f[8:].startswith('_r') else ""
-                                    # simpler: extract everything between index and ext
-                                    stem = f[:-len(ext)]  # e.g. "pair_001_r90"
-                                    rot_part = stem[8:]   # e.g. "_r90" or ""
-                                temp_name = f"_temp_{old_idx:03d}{rot_part}{ext}"
-                                old_path = os.path.join(folder, f)
-                                temp_path = os.path.join(folder, temp_name)
-                                os.rename(old_path, temp_path)
-                                if old_idx not in temp_map:
-                                    temp_map[old_idx] = []
-                                temp_map[old_idx].append((temp_name, new_idx, rot_part))
-                        except ValueError:
-                            pass
-
-                # 同时处理 TXT 文件
-                txt_temp_map = {}
-                for f in os.listdir(folder):
-                    if f.startswith("pair_") and f.lower().endswith('.txt'):
-                        try:
-                            old_idx = int(f[5:8])
-                            if old_idx in existing_index_map:
-                                new_idx = existing_index_map[old_idx]
-                                stem = f[:-4]  # e.g. "pair_001" or "pair_001_r90"
-                                rot_part = stem[8:] if len(stem) > 8 else ""
-                                temp_name = f"_temp_{old_idx:03d}{rot_part}.txt"
-                                old_path = os.path.join(folder, f)
-                                temp_path = os.path.join(folder, temp_name)
-                                os.rename(old_path, temp_path)
-                                if old_idx not in txt_temp_map:
-                                    txt_temp_map[old_idx] = []
-                                txt_temp_map[old_idx].append((temp_name, new_idx, rot_part))
-                        except ValueError:
-                            pass
-
-                # 第二步：将临时文件重命名为最终名称（包括 TXT）
-                for old_idx, items in temp_map.items():
-                    for temp_name, new_idx, rot_part in items:
-                        ext = Path(temp_name).suffix
-                        temp_path = os.path.join(folder, temp_name)
-                        new_path = os.path.join(folder, f"pair_{new_idx:03d}{rot_part}{ext}")
-                        os.rename(temp_path, new_path)
-
-                # 重命名 TXT 文件
-                for old_idx, items in txt_temp_map.items():
-                    for temp_name, new_idx, rot_part in items:
-                        temp_path = os.path.join(folder, temp_name)
-                        new_path = os.path.join(folder, f"pair_{new_idx:03d}{rot_part}.txt")
-                        os.rename(temp_path, new_path)
-
-            self.status_label.config(text=f"已重命名已存在的文件，正在导出新文件...")
-            self.root.update()
-
-        # 重置进度条和状态
         self.progress_var.set(0)
-        self.status_label.config(text=f"正在初始化线程池...")
+        self.status_label.config(text="正在规划导出任务...")
         self.root.update()
 
-        success_count = 0
-        error_count = 0
-        errors = []
-        paired_files = set()
+        jobs, settings = plan_export(left_folder, right_folder, export_folder, cfg, common_files)
+        workers = self.config.getint('EXPORT', 'workers', fallback=0) if self.config else 0
+        engine = PairExportEngine(jobs, settings, export_folder, max_workers=workers or None)
+        self._export_engine = engine
 
-        def process_task(task):
-            filename, angle = task
-            left_path = os.path.join(left_folder, filename)
-            right_path = os.path.join(right_folder, filename)
+        # 导出期间按钮变为取消按钮
+        self.auto_pair_button.config(text="取消导出", command=self._cancel_auto_pair)
+        self.status_label.config(text="正在启动导出进程...")
+        engine.start()
 
+        def poll():
+            done_summary = None
             try:
-                img_left_raw = Image.open(left_path)
-                img_right_raw = Image.open(right_path)
-
-                w1, h1 = img_left_raw.size
-                w2, h2 = img_right_raw.size
-
-                target_w = min(w1, w2)
-                target_h = min(h1, h2)
-
-                # 旋转
-                img_left = img_left_raw.rotate(angle, expand=True)
-                img_right = img_right_raw.rotate(angle, expand=True)
-
-                # 处理尺寸
-                if size_mode == 3:
-                    target_w, target_h = custom_size
-                    img_left_processed = img_left.resize((target_w, target_h), Image.LANCZOS)
-                    img_right_processed = img_right.resize((target_w, target_h), Image.LANCZOS)
-                elif fill_ratio:
-                    target_square_size = max(target_w, target_h)
-                    if crop_style:
-                        img_left_cropped = crop_to_square(img_left, crop_style)
-                        img_right_cropped = crop_to_square(img_right, crop_style)
-                        img_left_processed = img_left_cropped.resize((target_square_size, target_square_size), Image.LANCZOS)
-                        img_right_processed = img_right_cropped.resize((target_square_size, target_square_size), Image.LANCZOS)
-                    else:
-                        img_left_processed = fill_image_with_background(img_left, (target_square_size, target_square_size))
-                        img_right_processed = fill_image_with_background(img_right, (target_square_size, target_square_size))
-                else:
-                    img_left_processed = img_left.resize((target_w, target_h), Image.LANCZOS)
-                    img_right_processed = img_right.resize((target_w, target_h), Image.LANCZOS)
-
-                # 生成导出文件名
-                suffix = ROT_SUFFIX[angle]
-                if enable_rename:
-                    file_index = file_index_map[(filename, angle)]
-                    export_name = f"pair_{file_index:03d}{suffix}.png"
-                else:
-                    export_name = f"{Path(filename).stem}{suffix}.png"
-
-                img_left_processed.save(os.path.join(control_folder, export_name))
-                img_right_processed.save(os.path.join(target_folder, export_name))
-
-                # 导出同名 TXT 标注文件
-                txt_name = Path(filename).stem + '.txt'
-                left_txt = os.path.join(left_folder, txt_name)
-                right_txt = os.path.join(right_folder, txt_name)
-
-                if os.path.exists(left_txt):
-                    if enable_rename:
-                        txt_export_name = f"pair_{file_index:03d}{suffix}.txt"
-                    else:
-                        txt_export_name = f"{Path(filename).stem}{suffix}.txt"
-                    shutil.copy2(left_txt, os.path.join(control_folder, txt_export_name))
-
-                if os.path.exists(right_txt):
-                    if enable_rename:
-                        txt_export_name = f"pair_{file_index:03d}{suffix}.txt"
-                    else:
-                        txt_export_name = f"{Path(filename).stem}{suffix}.txt"
-                    shutil.copy2(right_txt, os.path.join(target_folder, txt_export_name))
-
-                # 生成配对预览拼接图
-                if preview_folder:
-                    stitched = stitch_pair_preview(img_left_processed, img_right_processed)
-                    stitched.save(os.path.join(preview_folder, export_name))
-
-                return (filename, True, None)
-
-            except Exception as e:
-                return (filename, False, str(e))
-
-        with ThreadPoolExecutor() as executor:
-            future_to_task = {executor.submit(process_task, task): task for task in task_list}
-
-            completed = 0
-            for future in as_completed(future_to_task):
-                filename, success, error_msg = future.result()
-                completed += 1
-
-                if success:
-                    success_count += 1
-                    paired_files.add(filename)
-                else:
-                    error_count += 1
-                    errors.append(f"{filename}: {error_msg}")
-
-                progress_percent = (completed / total_count) * 100
-                self.progress_var.set(progress_percent)
-                self.status_label.config(text=f"正在处理 {completed}/{total_count}... 成功:{success_count} 失败:{error_count}")
-                self.root.update_idletasks()
+                while True:
+                    event = engine.progress_queue.get_nowait()
+                    if event[0] == "progress":
+                        _, completed, total, success, error = event
+                        self.progress_var.set(completed / total * 100 if total else 100)
+                        self.status_label.config(text=f"正在处理 {completed}/{total}... 成功:{success} 失败:{error}")
+                    elif event[0] == "done":
+                        done_summary = event[1]
+            except queue.Empty:
+                pass
+
+            if done_summary is None:
+                self.root.after(100, poll)
+            else:
+                self._on_auto_pair_done(done_summary, cfg, settings)
+
+        self.root.after(100, poll)
+
+    def _cancel_auto_pair(self):
+        """取消正在进行的一键自动配对导出"""
+        if self._export_engine:
+            self._export_engine.cancel()
+            self.auto_pair_button.config(state=tk.DISABLED)
+            self.status_label.config(text="正在取消导出，等待进行中的图片对完成...")
+
+    def _on_auto_pair_done(self, summary, cfg, settings):
+        """一键自动配对导出完成后的结果展示"""
+        self._export_engine = None
+        self.auto_pair_button.config(text="一键自动配对", command=self.auto_pair_all, state=tk.NORMAL)
+
+        success_count = summary["success_count"]
+        error_count = summary["error_count"]
+        errors = summary["errors"]
+        control_folder = settings["control_folder"]
+        target_folder = settings["target_folder"]
+        preview_folder = settings["preview_folder"]
+        manifest_line = f"\n清单: {summary['manifest_path']}" if summary["manifest_path"] else ""
 
         # 显示结果
-        rotate_info = "（4旋转版本）" if do_rotate else ""
-        if error_count == 0:
+        rotate_info = "（4旋转版本）" if cfg["rotate"] else ""
+        if summary["cancelled"]:
+            messagebox.showinfo("已取消", f"导出已取消，已完成 {success_count}/{summary['total']} 对图片。{manifest_line}")
+        elif error_count == 0:
+            size_mode = cfg.get("size_mode", 0)
             if size_mode == 3:
+                custom_size = cfg["custom_size"]
                 fill_info = f"（已统一调整为 {custom_size[0]}x{custom_size[1]}）"
-            elif fill_ratio:
-                if crop_style:
+            elif cfg["fill_ratio"]:
+                if cfg["crop_style"]:
                     fill_info = "（已裁剪为 1:1）"
                 else:
                     fill_info = "（已填充为 1:1 白色背景）"
             else:
                 fill_info = ""
             preview_line = f"\n- {preview_folder}" if preview_folder else ""
-            messagebox.showinfo("完成", f"成功导出 {success_count} 对图片！{fill_info}{rotate_info}\n所有文件保存到:\n- {control_folder}\n- {target_folder}{preview_line}")
+            messagebox.showinfo("完成", f"成功导出 {success_count} 对图片！{fill_info}{rotate_info}\n所有文件保存到:\n- {control_folder}\n- {target_folder}{preview_line}{manifest_line}")
         else:
             error_details = "\n".join(errors[:5])
             if error_count > 5:
@@ -1218,10 +1037,11 @@ class ImagePairToolGUI:
             messagebox.showwarning("部分完成",
                                    f"成功导出 {success_count} 对图片，失败 {error_count} 对。\n{rotate_info}\n\n错误详情:\n{error_details}")
 
+        status = "已取消" if summary["cancelled"] else "自动配对完成"
         preview_note = " | 预览图已生成" if preview_folder else ""
-        self.status_label.config(text=f"✓ 自动配对完成 | 成功:{success_count} | 失败:{error_count}{preview_note}")
+        self.status_label.config(text=f"✓ {status} | 成功:{success_count} | 失败:{error_count}{preview_note}")
 
-        for fname in paired_files:
+        for fname in summary["paired_files"]:
             self.left_panel.mark_as_paired(fname)
             self.right_panel.mark_as_paired(fname)
 
@@ -1258,6 +1078,7 @@ class ImagePairToolGUI:
             size_mode = cfg.get("size_mode", 0)
             custom_size = cfg.get("custom_size", None)
             do_rotate = cfg.get("rotate", False)
+            export_format = cfg["export_format"]
             do_preview = self.preview_var.get()
         else:
             fill_ratio = False
@@ -1265,8 +1086,11 @@ class ImagePairToolGUI:
             size_mode = 0
             custom_size = None
             do_rotate = False
+            export_format = get_export_format(self.config)
             do_preview = self.preview_var.get()
 
+        export_ext = EXPORT_FORMAT_EXTENSIONS[export_format["format"]]
+
         control_folder = os.path.join(export_folder, "control")
         target_folder = os.path.join(export_folder, "target")
         os.makedirs(control_folder, exist_ok=True)
@@ -1285,17 +1109,18 @@ class ImagePairToolGUI:
 
         # 分配不重复的文件名
         def alloc_name(suffix):
-            name = f"{base_name}{suffix}.png"
+            name = f"{base_name}{suffix}{export_ext}"
             counter = 1
             while (os.path.exists(os.path.join(control_folder, name)) or
                    os.path.exists(os.path.join(target_folder, name))):
-                name = f"{base_name}_{counter}{suffix}.png"
+                name = f"{base_name}_{counter}{suffix}{export_ext}"
                 counter += 1
             return name
 
         ROTATIONS = [0, 90, 180, 270] if do_rotate else [0]
         ROT_SUFFIX = {0: "", 90: "_r90", 180: "_r180", 270: "_r270"}
         exported = []
+        previews = []
 
         try:
             img_left_raw = Image.open(left_path).copy()
@@ -1337,9 +1162,11 @@ class ImagePairToolGUI:
                 suffix = ROT_SUFFIX[angle]
                 export_name = alloc_name(suffix)
 
-                img_left_processed.save(os.path.join(control_folder, export_name))
-                img_right_processed.save(os.path.join(target_folder, export_name))
+                save_export_image(img_left_processed, os.path.join(control_folder, export_name), export_format)
+                save_export_image(img_right_processed, os.path.join(target_folder, export_name), export_format)
                 exported.append(export_name)
+                if do_preview:
+                    previews.append((export_name, stitch_pair_preview(img_left_processed, img_right_processed)))
 
             # 导出 TXT 标注文件（每份旋转副本都复制一份）
             for export_name in exported:
@@ -1353,13 +1180,8 @@ class ImagePairToolGUI:
             if do_preview:
                 preview_folder = os.path.join(export_folder, "配对预览")
                 os.makedirs(preview_folder, exist_ok=True)
-                for export_name in exported:
-                    ctrl_path = os.path.join(control_folder, export_name)
-                    tgt_path = os.path.join(target_folder, export_name)
-                    img_left = Image.open(ctrl_path)
-                    img_right = Image.open(tgt_path)
-                    stitched = stitch_pair_preview(img_left, img_right)
-                    stitched.save(os.path.join(preview_folder, export_name))
+                for export_name, stitched in previews:
+                    save_export_image(stitched, os.path.join(preview_folder, export_name), export_format)
                 self.status_label.config(text=self.status_label.cget("text") + f" | 预览图已保存至 配对预览/")
 
             if size_mode == 3:
@@ -1646,6 +1468,10 @@ class ImagePairToolGUI:
                     cache_info = ""
                     if results.get("cached", 0) > 0:
                         cache_info = f"\n缓存命中（跳过重复对比）: {results['cached']} 次"
+                    if results.get("resumed", 0) > 0:
+                        cache_info += f"\n断点恢复（沿用上次结果）: {results['resumed']} 次"
+                    if results.get("prefiltered", 0) > 0:
+                        cache_info += f"\n预筛选排除（节省 AI 调用）: {results['prefiltered']} 次"
                     skip_info = ""
                     if results.get("skipped_self", 0) > 0:
                         skip_info = f"\n跳过自身对比: {results['skipped_self']} 次"
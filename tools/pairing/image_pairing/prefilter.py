@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+双面板图片配对工具 - AI 人物判断前的感知相似度预筛选
+使用 similarity_pairing 中的 dHash + 颜色直方图特征为右侧候选图排序，
+只有排名靠前或分数达到阈值的配对才交给视觉大模型判断
+"""
+
+import os
+import importlib.util
+import logging
+
+logger = logging.getLogger(__name__)
+
+# similarity_pairing 工具中的特征计算模块
+SIMILARITY_MODULE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "similarity_pairing", "similarity.py"
+)
+
+# 被预筛选排除的配对统一归入的结果
+SCREENED_OUT_LABEL = "完全不是"
+
+_similarity_module = None
+
+
+def load_similarity_module():
+    """按文件路径加载 similarity_pairing/similarity.py（避免与本工具的 config 模块重名冲突）"""
+    global _similarity_module
+    if _similarity_module is None:
+        spec = importlib.util.spec_from_file_location("_similarity_pairing", SIMILARITY_MODULE_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _similarity_module = module
+    return _similarity_module
+
+
+class PerceptualPrefilter:
+    """基于本地图像特征的候选预筛选器
+
+    默认使用 similarity_pairing 的 compute_features / similarity_score，
+    也可以传入自定义的 extract_fn(path) 与 score_fn(features_a, features_b)
+    接入其他本地特征提取器（分数越高越相似）。
+    """
+
+    def __init__(self, top_k=0, min_score=0.0, extract_fn=None, score_fn=None):
+        """初始化预筛选器
+
+        Args:
+            top_k: 每张参照图保留相似度最高的前 K 个候选，0 表示不按排名保留
+            min_score: 相似度达到该值的候选始终保留，0 表示不按阈值保留
+            extract_fn: 特征提取函数，默认使用 similarity.compute_features
+            score_fn: 相似度函数，默认使用 similarity.similarity_score
+        """
+        if extract_fn is None or score_fn is None:
+            similarity = load_similarity_module()
+            extract_fn = extract_fn or similarity.compute_features
+            score_fn = score_fn or similarity.similarity_score
+        self.top_k = top_k
+        self.min_score = min_score
+        self.extract_fn = extract_fn
+        self.score_fn = score_fn
+        self._features = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 [AI_MATCH] 配置创建预筛选器，未启用时返回 None"""
+        if not config.getboolean('AI_MATCH', 'prefilter_enabled', fallback=False):
+            return None
+        top_k = config.getint('AI_MATCH', 'prefilter_top_k', fallback=20)
+        min_score = config.getfloat('AI_MATCH', 'prefilter_min_score', fallback=0.0)
+        if top_k <= 0 and min_score <= 0:
+            return None
+        return cls(top_k=top_k, min_score=min_score)
+
+    def get_features(self, image_path):
+        """获取图片特征（本次运行内缓存），提取失败返回 None"""
+        if image_path not in self._features:
+            try:
+                self._features[image_path] = self.extract_fn(image_path)
+            except Exception as e:
+                logger.warning(f"预筛选特征提取失败 {os.path.basename(image_path)}: {str(e)}")
+                self._features[image_path] = None
+        return self._features[image_path]
+
+    def screen(self, left_path, right_paths):
+        """为一张参照图筛选右侧候选
+
+        Args:
+            left_path: 参照图路径
+            right_paths: 右侧候选图路径列表
+
+        Returns:
+            dict: {被排除的右图路径: 排除原因}，特征提取失败的图片不会被排除
+        """
+        left_features = self.get_features(left_path)
+        if left_features is None:
+            return {}
+
+        scored = []
+        for right_path in right_paths:
+            if right_path == left_path:
+                continue
+            right_features = self.get_features(right_path)
+            if right_features is None:
+                continue
+            scored.append((self.score_fn(left_features, right_features), right_path))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+
+        screened_out = {}
+        for rank, (score, right_path) in enumerate(scored):
+            if self.top_k > 0 and rank < self.top_k:
+                continue
+            if self.min_score > 0 and score >= self.min_score:
+                continue
+            reason = f"感知相似度 {score:.3f}，排名 {rank + 1}/{len(scored)}"
+            if self.top_k > 0:
+                reason += f"，未进入前 {self.top_k}"
+            if self.min_score > 0:
+                reason += f"，低于阈值 {self.min_score}"
+            screened_out[right_path] = reason
+        return screened_out
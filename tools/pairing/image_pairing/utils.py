@@ -124,6 +124,55 @@ def stitch_pair_preview(img_left, img_right, bg_color=(255, 255, 255)):
     return result
 
 
+# 导出格式 -> 文件扩展名
+EXPORT_FORMAT_EXTENSIONS = {
+    "png": ".png",
+    "webp": ".webp",
+    "jpeg": ".jpg",
+}
+
+
+def get_export_format(config):
+    """从 [EXPORT] 配置读取导出格式参数
+
+    Returns:
+        dict: {"format": str, "png_compress_level": int, "jpeg_quality": int, "webp_method": int}
+    """
+    import configparser
+
+    if config is None:
+        config = configparser.ConfigParser()
+
+    fmt = config.get('EXPORT', 'format', fallback='png').lower()
+    if fmt not in EXPORT_FORMAT_EXTENSIONS:
+        fmt = 'png'
+    return {
+        "format": fmt,
+        "png_compress_level": config.getint('EXPORT', 'png_compress_level', fallback=1),
+        "jpeg_quality": config.getint('EXPORT', 'jpeg_quality', fallback=95),
+        "webp_method": config.getint('EXPORT', 'webp_method', fallback=4),
+    }
+
+
+def save_export_image(img, path, export_format):
+    """按导出格式保存图片
+
+    Args:
+        img: PIL Image 对象
+        path: 保存路径（扩展名应与格式对应）
+        export_format: get_export_format 返回的参数字典
+    """
+    fmt = export_format["format"]
+    if fmt == "jpeg":
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.save(path, format="JPEG", quality=export_format["jpeg_quality"])
+    elif fmt == "webp":
+        img.save(path, format="WEBP", lossless=True, method=export_format["webp_method"])
+    else:
+        img.save(path, format="PNG", compress_level=export_format["png_compress_level"])
+
+
 def get_image_files(folder_path):
     """获取文件夹中的所有图片文件"""
     from pathlib import Path
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+双面板图片配对工具 - AI 判断结果持久化缓存
+将 AI 人物判断结果保存到输出目录下的 SQLite 文件，中断后重新运行可跳过已判断的配对
+"""
+
+import os
+import hashlib
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 缓存文件名（保存在输出根目录下）
+VERDICT_DB_NAME = ".ai_match_verdicts.sqlite3"
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """计算文件内容的 SHA-1 摘要
+
+    Args:
+        file_path: 文件路径
+        chunk_size: 每次读取的字节数
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class VerdictStore:
+    """AI 判断结果的 SQLite 持久化存储
+
+    键为 (两张图片内容摘要（对称排序）, 模型名, 提示词摘要, 图像最大边长)，
+    图片内容或判断参数变化后旧结果自动失效。
+    """
+
+    def __init__(self, output_base_folder, model_name, prompt_text, image_max_size):
+        """打开（或创建）输出目录下的缓存文件
+
+        Args:
+            output_base_folder: 输出根目录
+            model_name: 模型名称
+            prompt_text: 实际使用的提示词
+            image_max_size: 发送给 AI 的图像最大边长
+        """
+        os.makedirs(output_base_folder, exist_ok=True)
+        self.db_path = os.path.join(output_base_folder, VERDICT_DB_NAME)
+        self.model_name = model_name
+        self.prompt_hash = hashlib.sha1(prompt_text.encode('utf-8')).hexdigest()
+        self.image_max_size = image_max_size
+
+        self._hash_cache = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " hash_a TEXT NOT NULL,"
+            " hash_b TEXT NOT NULL,"
+            " model_name TEXT NOT NULL,"
+            " prompt_hash TEXT NOT NULL,"
+            " image_max_size INTEGER NOT NULL,"
+            " result TEXT NOT NULL,"
+            " PRIMARY KEY (hash_a, hash_b, model_name, prompt_hash, image_max_size))"
+        )
+        self._conn.commit()
+
+    def content_hash(self, image_path):
+        """获取图片内容摘要（按路径、mtime 与大小在本次运行内缓存）"""
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+        digest = self._hash_cache.get(key)
+        if digest is None:
+            digest = hash_file(image_path)
+            self._hash_cache[key] = digest
+        return digest
+
+    def _make_key(self, path_a, path_b):
+        hash_a = self.content_hash(path_a)
+        hash_b = self.content_hash(path_b)
+        if hash_b < hash_a:
+            hash_a, hash_b = hash_b, hash_a
+        return (hash_a, hash_b, self.model_name, self.prompt_hash, self.image_max_size)
+
+    def get(self, path_a, path_b):
+        """查询一对图片的已保存结果，没有记录时返回 None"""
+        key = self._make_key(path_a, path_b)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM verdicts WHERE hash_a=? AND hash_b=? AND model_name=?"
+                " AND prompt_hash=? AND image_max_size=?",
+                key
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, path_a, path_b, result_label):
+        """保存一对图片的判断结果（立即提交，保证中断后可恢复）"""
+        key = self._make_key(path_a, path_b)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts"
+                " (hash_a, hash_b, model_name, prompt_hash, image_max_size, result)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                key + (result_label,)
+            )
+            self._conn.commit()
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
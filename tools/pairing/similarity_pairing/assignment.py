@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似度配对工具 - 一对一最优配对
+
+将左右两组图片的相似度视为二分图权重，求总相似度最大的一对一匹配：
+- 规模较小时使用匈牙利算法精确求解（安装了 SciPy 时使用 linear_sum_assignment）
+- 规模很大时分块计算每行的前 K 个候选，再按分数从高到低贪心分配
+低于最低分数线的配对不会被采用，对应图片报告为未配对。
+"""
+
+import numpy as np
+
+from similarity import rowwise_scores, score_matrix, SCORE_BLOCK_ROWS
+
+try:
+    from scipy.optimize import linear_sum_assignment
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+# 精确求解的规模上限（左右数量乘积）
+EXACT_MAX_CELLS_SCIPY = 4000 * 4000
+EXACT_MAX_CELLS_NUMPY = 1000 * 1000
+
+# 贪心模式下每行保留的候选数量
+GREEDY_TOP_K = 32
+
+
+def _hungarian_min(cost):
+    """匈牙利算法（最短增广路，按列向量化），要求行数 <= 列数
+
+    Returns:
+        np.ndarray: 每行分配到的列下标
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)      # p[j]: 第 j 列分配的行（1 起始，0 表示未分配）
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            used_cols = np.nonzero(used)[0]
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    row_to_col = np.empty(n, dtype=np.int64)
+    for j in range(1, m + 1):
+        if p[j]:
+            row_to_col[p[j] - 1] = j - 1
+    return row_to_col
+
+
+def _exact_assign(scores, min_score):
+    """精确求解总分最大的一对一匹配，低于分数线的边权重视为 0（等同于不配对）"""
+    weights = np.where(scores >= min_score, scores, 0.0)
+    n, m = weights.shape
+
+    if SCIPY_AVAILABLE:
+        rows, cols = linear_sum_assignment(weights, maximize=True)
+    elif n <= m:
+        rows = np.arange(n)
+        cols = _hungarian_min(-weights)
+    else:
+        cols = np.arange(m)
+        rows = _hungarian_min(-weights.T)
+
+    left_to_right = np.full(n, -1, dtype=np.int64)
+    for r, c in zip(rows, cols):
+        if scores[r, c] >= min_score:
+            left_to_right[r] = c
+    return left_to_right
+
+
+def _greedy_assign(stacked_left, stacked_right, min_score, top_k=GREEDY_TOP_K,
+                   block_rows=SCORE_BLOCK_ROWS, progress_callback=None):
+    """分块贪心匹配：每轮为未配对的左图计算剩余右图中的前 K 个候选，按分数从高到低分配"""
+    left_hashes, left_hists = stacked_left
+    right_hashes, right_hists = stacked_right
+    n_left, n_right = len(left_hashes), len(right_hashes)
+
+    left_to_right = np.full(n_left, -1, dtype=np.int64)
+    right_taken = np.zeros(n_right, dtype=bool)
+    pending = np.arange(n_left)
+
+    while pending.size and not right_taken.all():
+        free_right = np.nonzero(~right_taken)[0]
+        k = min(top_k, free_right.size)
+        sub_right = (right_hashes[free_right], right_hists[free_right])
+
+        edge_scores, edge_left, edge_right = [], [], []
+        for start in range(0, pending.size, block_rows):
+            rows = pending[start:start + block_rows]
+            block = score_matrix((left_hashes[rows], left_hists[rows]), sub_right, block_rows)
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            keep = top_scores >= min_score
+            edge_scores.append(top_scores[keep])
+            edge_left.append(np.broadcast_to(rows[:, None], top.shape)[keep])
+            edge_right.append(free_right[top][keep])
+            if progress_callback:
+                progress_callback(min(start + block_rows, pending.size), pending.size)
+
+        edge_scores = np.concatenate(edge_scores)
+        if edge_scores.size == 0:
+            break
+        edge_left = np.concatenate(edge_left)
+        edge_right = np.concatenate(edge_right)
+
+        assigned = 0
+        for e in np.argsort(-edge_scores, kind='stable'):
+            li, ri = edge_left[e], edge_right[e]
+            if left_to_right[li] < 0 and not right_taken[ri]:
+                left_to_right[li] = ri
+                right_taken[ri] = True
+                assigned += 1
+
+        # 仍有候选（分数达标）但被别人抢走的左图进入下一轮；没有达标候选的不再尝试
+        has_candidate = np.zeros(n_left, dtype=bool)
+        has_candidate[edge_left] = True
+        pending = pending[(left_to_right[pending] < 0) & has_candidate[pending]]
+        if assigned == 0:
+            break
+
+    return left_to_right
+
+
+def assign_pairs(stacked_left, stacked_right, min_score=0.0, method="auto", progress_callback=None):
+    """求左右两组图片的一对一配对
+
+    Args:
+        stacked_left: 左侧 stack_features 特征矩阵
+        stacked_right: 右侧 stack_features 特征矩阵
+        min_score: 最低相似度，低于该值的配对不采用
+        method: "exact" 精确求解，"greedy" 分块贪心，"auto" 按规模自动选择
+        progress_callback: 贪心模式下的进度回调 (current: int, total: int)
+
+    Returns:
+        tuple: (left_to_right: 每个左图配对的右图下标，未配对为 -1,
+                pair_scores: 每个左图配对的相似度，未配对为 nan)
+    """
+    n_left, n_right = len(stacked_left[0]), len(stacked_right[0])
+    if n_left == 0 or n_right == 0:
+        return np.full(n_left, -1, dtype=np.int64), np.full(n_left, np.nan)
+
+    if method == "auto":
+        limit = EXACT_MAX_CELLS_SCIPY if SCIPY_AVAILABLE else EXACT_MAX_CELLS_NUMPY
+        method = "exact" if n_left * n_right <= limit else "greedy"
+
+    if method == "exact":
+        scores = score_matrix(stacked_left, stacked_right)
+        left_to_right = _exact_assign(scores, min_score)
+        matched = left_to_right >= 0
+        pair_scores = np.full(n_left, np.nan)
+        pair_scores[matched] = scores[np.nonzero(matched)[0], left_to_right[matched]]
+        return left_to_right, pair_scores
+
+    left_to_right = _greedy_assign(stacked_left, stacked_right, min_score,
+                                   progress_callback=progress_callback)
+    pair_scores = np.full(n_left, np.nan)
+    matched = np.nonzero(left_to_right >= 0)[0]
+    if matched.size:
+        rights = left_to_right[matched]
+        pair_scores[matched] = rowwise_scores(
+            (stacked_left[0][matched], stacked_left[1][matched]),
+            (stacked_right[0][rights], stacked_right[1][rights]),
+        )
+    return left_to_right, pair_scores
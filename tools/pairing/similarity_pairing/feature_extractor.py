@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似度配对工具 - 并行特征提取
+
+PIL 缩放与特征计算受 GIL 限制，多线程几乎没有加速，因此默认在进程池中提取特征。
+子进程只返回 pack_features 打包后的字节串，由主进程还原。
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from similarity import compute_features, pack_features, unpack_features
+
+# 每个任务处理的图片数量（减少进程间通信次数）
+CHUNK_SIZE = 32
+
+
+def _extract_chunk(paths):
+    """子进程任务：计算一组图片的特征，返回打包后的字节串（失败为 None）"""
+    packed = []
+    for path in paths:
+        try:
+            packed.append(pack_features(compute_features(path)))
+        except Exception:
+            packed.append(None)
+    return packed
+
+
+def extract_features_parallel(paths, progress_callback=None, mode="process", max_workers=None):
+    """并行计算多张图片的特征
+
+    Args:
+        paths: 图片路径列表
+        progress_callback: 进度回调 (current: int, total: int)，在调用线程中触发
+        mode: "process" 使用进程池，"thread" 使用线程池
+        max_workers: 并发数，默认等于 CPU 核心数
+
+    Returns:
+        list: 与 paths 一一对应的特征，提取失败为 None
+    """
+    total = len(paths)
+    if total == 0:
+        return []
+
+    max_workers = max_workers or os.cpu_count() or 1
+    executor_cls = ProcessPoolExecutor if mode == "process" else ThreadPoolExecutor
+
+    chunks = [paths[i:i + CHUNK_SIZE] for i in range(0, total, CHUNK_SIZE)]
+    results = [None] * total
+    completed = 0
+
+    # 图片很少时直接在当前线程计算，省去启动进程池的开销
+    if len(chunks) == 1:
+        for j, packed in enumerate(_extract_chunk(paths)):
+            if packed is not None:
+                results[j] = unpack_features(packed)
+        if progress_callback:
+            progress_callback(total, total)
+        return results
+
+    with executor_cls(max_workers=min(max_workers, len(chunks))) as executor:
+        futures = {
+            executor.submit(_extract_chunk, chunk): i * CHUNK_SIZE
+            for i, chunk in enumerate(chunks)
+        }
+        for future in as_completed(futures):
+            offset = futures[future]
+            for j, packed in enumerate(future.result()):
+                if packed is not None:
+                    results[offset + j] = unpack_features(packed)
+            completed += len(chunks[offset // CHUNK_SIZE])
+            if progress_callback:
+                progress_callback(completed, total)
+
+    return results
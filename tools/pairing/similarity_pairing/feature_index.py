@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似度配对工具 - 文件夹特征索引
+
+每个图片文件夹保存一个 sidecar 索引文件（.similarity_index.npz），记录每张图片的
+mtime、大小和特征。再次配对时只为新增或修改过的图片重新计算特征，已删除的图片从索引中移除。
+无法读取的图片同样按 mtime、大小记录下来，文件未变化时不再重复解码。
+"""
+
+import os
+import logging
+import numpy as np
+
+from config import IMAGE_EXTENSIONS
+from similarity import DHASH_WORDS, HIST_LENGTH, stack_features
+from feature_extractor import extract_features_parallel
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = ".similarity_index.npz"
+INDEX_VERSION = 1
+
+
+def list_images(folder):
+    """列出文件夹中的图片文件名（排序）"""
+    return sorted(
+        f for f in os.listdir(folder)
+        if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS
+    )
+
+
+class FeatureIndex:
+    """单个文件夹的持久化特征索引"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.index_path = os.path.join(folder, INDEX_FILENAME)
+        # name -> (mtime_ns, size, phash, hist)
+        self._entries = {}
+        # 提取失败的图片：name -> (mtime_ns, size)
+        self._failed = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        """读取 sidecar 索引，文件缺失或版本不符时从空索引开始"""
+        if not os.path.isfile(self.index_path):
+            return
+        try:
+            with np.load(self.index_path, allow_pickle=False) as data:
+                if int(data['version']) != INDEX_VERSION:
+                    return
+                hashes = data['hashes']
+                hists = data['hists']
+                if hashes.shape[1:] != (DHASH_WORDS,) or hists.shape[1:] != (HIST_LENGTH,):
+                    return
+                for i, name in enumerate(data['names']):
+                    self._entries[str(name)] = (
+                        int(data['mtimes'][i]), int(data['sizes'][i]), hashes[i], hists[i]
+                    )
+                # 旧索引文件没有失败记录
+                if 'failed_names' in data.files:
+                    for i, name in enumerate(data['failed_names']):
+                        self._failed[str(name)] = (
+                            int(data['failed_mtimes'][i]), int(data['failed_sizes'][i])
+                        )
+        except Exception as e:
+            logger.warning(f"特征索引读取失败，将重新建立 {self.index_path}: {e}")
+            self._entries = {}
+            self._failed = {}
+
+    def refresh(self, extract_fn=None, progress_callback=None):
+        """按 mtime / 大小增量更新索引
+
+        Args:
+            extract_fn: 批量特征提取函数，接收 (路径列表, progress_callback)，
+                        返回与路径一一对应的特征（失败为 None）；默认使用进程池并行提取
+            progress_callback: 进度回调 (current: int, total: int)
+
+        Returns:
+            int: 重新计算特征的图片数量
+        """
+        names = list_images(self.folder)
+        current = set(names)
+
+        removed = [name for name in self._entries if name not in current]
+        for name in removed:
+            del self._entries[name]
+        removed_failed = [name for name in self._failed if name not in current]
+        for name in removed_failed:
+            del self._failed[name]
+
+        stale = []
+        stats = {}
+        for name in names:
+            try:
+                st = os.stat(os.path.join(self.folder, name))
+            except OSError:
+                continue
+            stats[name] = (st.st_mtime_ns, st.st_size)
+            entry = self._entries.get(name)
+            if entry is not None and (entry[0], entry[1]) == stats[name]:
+                continue
+            if self._failed.get(name) == stats[name]:
+                # 上次提取失败且文件未变化，跳过
+                continue
+            stale.append(name)
+
+        if stale:
+            paths = [os.path.join(self.folder, name) for name in stale]
+            extract_fn = extract_fn or extract_features_parallel
+            features = extract_fn(paths, progress_callback)
+            for name, feat in zip(stale, features):
+                mtime_ns, size = stats[name]
+                if feat is None:
+                    self._entries.pop(name, None)
+                    self._failed[name] = (mtime_ns, size)
+                    continue
+                self._failed.pop(name, None)
+                self._entries[name] = (mtime_ns, size, feat[0], feat[1])
+
+        if stale or removed or removed_failed:
+            self._dirty = True
+        return len(stale)
+
+    def save(self):
+        """将索引原子写入 sidecar 文件（文件夹不可写时仅记录警告）"""
+        if not self._dirty:
+            return
+        names = sorted(self._entries)
+        hashes, hists = stack_features([self._entries[n][2:] for n in names])
+        failed_names = sorted(self._failed)
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    version=np.array(INDEX_VERSION),
+                    names=np.array(names, dtype=str),
+                    mtimes=np.array([self._entries[n][0] for n in names], dtype=np.int64),
+                    sizes=np.array([self._entries[n][1] for n in names], dtype=np.int64),
+                    hashes=hashes,
+                    hists=hists,
+                    failed_names=np.array(failed_names, dtype=str),
+                    failed_mtimes=np.array([self._failed[n][0] for n in failed_names], dtype=np.int64),
+                    failed_sizes=np.array([self._failed[n][1] for n in failed_names], dtype=np.int64),
+                )
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+        except OSError as e:
+            logger.warning(f"特征索引保存失败 {self.index_path}: {e}")
+
+    def paths_and_features(self):
+        """返回 (图片路径列表, stack_features 格式的特征矩阵)，按文件名排序"""
+        names = sorted(self._entries)
+        paths = [os.path.join(self.folder, n) for n in names]
+        return paths, stack_features([self._entries[n][2:] for n in names])
+
+
+def load_folder_features(folder, extract_fn=None, progress_callback=None):
+    """读取并增量更新文件夹的特征索引
+
+    Returns:
+        tuple: (图片路径列表, stack_features 格式的特征矩阵)
+    """
+    index = FeatureIndex(folder)
+    recomputed = index.refresh(extract_fn=extract_fn, progress_callback=progress_callback)
+    index.save()
+    if recomputed:
+        logger.info(f"特征索引已更新 {folder}: 重新计算 {recomputed} 张")
+    return index.paths_and_features()
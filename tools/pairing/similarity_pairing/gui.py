@@ -5,9 +5,10 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
+import queue
 import shutil
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageTk
 
 from config import (
@@ -15,7 +16,9 @@ from config import (
     DARK_CONTAINER_BG, DARK_HIGHLIGHT, WINDOW_WIDTH, WINDOW_HEIGHT,
     IMAGE_AREA_HEIGHT, IMAGE_AREA_WIDTH, IMAGE_EXTENSIONS
 )
-from similarity import compute_features, find_best_match, similarity_score
+from similarity import find_best_match, score_matrix
+from feature_index import load_folder_features
+from assignment import assign_pairs
 
 
 def _fit_image(img, max_w, max_h):
@@ -154,6 +157,8 @@ class GUI:
         self.root.config(bg=DARK_BG)
 
         self.export_folder = tk.StringVar()
+        self.one_to_one = tk.BooleanVar(value=False)
+        self.min_score = tk.StringVar(value="0.0")
         self._executor = ThreadPoolExecutor(max_workers=4)
 
         # 面板共享文件夹变量（toolbar 和 ImagePanel 共用同一个 StringVar）
@@ -197,6 +202,15 @@ class GUI:
                                            bg="#d98e04", fg="white", font=("", 10, "bold"))
         self.btn_auto_pair_all.pack(side=tk.LEFT, padx=4)
 
+        tk.Checkbutton(toolbar, text="一对一", variable=self.one_to_one,
+                       bg=DARK_BG, fg=DARK_FG, selectcolor=DARK_ENTRY_BG,
+                       activebackground=DARK_BG, activeforeground=DARK_FG
+                       ).pack(side=tk.LEFT, padx=(4, 0))
+        tk.Label(toolbar, text="最低分:", bg=DARK_BG, fg=DARK_FG).pack(side=tk.LEFT)
+        tk.Entry(toolbar, textvariable=self.min_score, width=5,
+                 bg=DARK_ENTRY_BG, fg=DARK_FG, insertbackground=DARK_FG
+                 ).pack(side=tk.LEFT, padx=3)
+
         self.btn_export = tk.Button(toolbar, text="导出配对",
                                     command=self.export_pairs, width=10,
                                     bg="#2d7a3e", fg="white", font=("", 10, "bold"))
@@ -297,51 +311,100 @@ class GUI:
             messagebox.showinfo("提示", "源文件夹 A 中没有图片")
             return
 
+        try:
+            min_score = float(self.min_score.get() or 0)
+        except ValueError:
+            messagebox.showwarning("提示", "最低分必须是数字")
+            return
+        one_to_one = self.one_to_one.get()
+
         self.btn_auto_pair.config(state=tk.DISABLED)
+        self.btn_auto_pair_all.config(state=tk.DISABLED)
         self._status.config(text=f"正在批量配对 {len(left_files)} 张图片...")
-        self.root.update_idletasks()
-
-        # 预计算右侧所有图片的特征
-        right_files_map = {}
-        for rf in os.listdir(right_folder):
-            if os.path.splitext(rf)[1].lower() in IMAGE_EXTENSIONS:
-                rp = os.path.join(right_folder, rf)
-                try:
-                    right_files_map[rp] = compute_features(rp)
-                except Exception:
-                    pass
 
         total = len(left_files)
-        results = {}
+        progress_queue = queue.Queue()
+
+        def _progress(label):
+            def update(current, count):
+                progress_queue.put((label, current, count))
+            return update
+
+        def _do():
+            # 读取两侧文件夹的特征索引，只为新增或修改过的图片计算特征（进程池并行）
+            right_paths, right_stacked = load_folder_features(
+                right_folder, progress_callback=_progress("提取右侧特征"))
+            left_paths, left_stacked = load_folder_features(
+                left_folder, progress_callback=_progress("提取左侧特征"))
+            left_names = [os.path.basename(p) for p in left_paths]
+
+            results = {fname: (None, 0) for fname in left_files}
+
+            if not left_names or not right_paths:
+                return results
+
+            # 一对一模式：全局求解总相似度最大的匹配，每张右图最多被配对一次
+            if one_to_one:
+                progress_queue.put(("求解一对一配对", 0, 0))
+                left_to_right, pair_scores = assign_pairs(
+                    left_stacked, right_stacked, min_score=min_score,
+                    progress_callback=_progress("求解一对一配对"))
+                for row, fname in enumerate(left_names):
+                    ri = left_to_right[row]
+                    if ri >= 0:
+                        results[fname] = (right_paths[ri], float(pair_scores[row]))
+                return results
+
+            # 全部特征就绪后，一次矩阵运算计算全部左右配对的相似度
+            progress_queue.put(("计算相似度矩阵", 0, 0))
+            scores = score_matrix(left_stacked, right_stacked)
+            best_indices = scores.argmax(axis=1)
+            for row, fname in enumerate(left_names):
+                best = best_indices[row]
+                if scores[row, best] >= min_score:
+                    results[fname] = (right_paths[best], float(scores[row, best]))
+            return results
 
-        def _pair(fname):
-            lp = os.path.join(left_folder, fname)
+        future = self._executor.submit(_do)
+
+        def _poll():
+            latest = None
+            while not progress_queue.empty():
+                latest = progress_queue.get_nowait()
+            if latest:
+                label, current, count = latest
+                if count:
+                    self._progress_var.set(current / count * 100)
+                    self._status.config(text=f"{label} {current}/{count}...")
+                else:
+                    self._status.config(text=f"{label}...")
+
+            if not future.done():
+                self.root.after(100, _poll)
+                return
+
+            self.btn_auto_pair.config(state=tk.NORMAL)
+            self.btn_auto_pair_all.config(state=tk.NORMAL)
             try:
-                left_feat = compute_features(lp)
-            except Exception:
-                return fname, None, 0
-            best_rpath, best_score = None, -1
-            for rp, rfeat in right_files_map.items():
-                s = similarity_score(left_feat, rfeat)
-                if s > best_score:
-                    best_score = s
-                    best_rpath = rp
-            return fname, best_rpath, best_score
-
-        completed = 0
-        with ThreadPoolExecutor(max_workers=4) as ex:
-            futs = {ex.submit(_pair, f): f for f in left_files}
-            for fut in as_completed(futs):
-                fname, rpath, score = fut.result()
-                results[fname] = (rpath, score)
-                completed += 1
-                self._progress_var.set(completed / total * 100)
-                self._status.config(text=f"配对中 {completed}/{total}...")
-                self.root.update_idletasks()
-
-        self.left_panel._pair_results = results
-        self.btn_auto_pair.config(state=tk.NORMAL)
-        self._status.config(text=f"批量配对完成，共 {total} 张")
+                results = future.result()
+            except Exception as e:
+                self._status.config(text=f"批量配对失败: {e}")
+                messagebox.showerror("错误", f"批量配对失败: {e}")
+                return
+            self.left_panel._pair_results = results
+            self._progress_var.set(100)
+            unmatched = sorted(f for f, (rpath, _) in results.items() if rpath is None)
+            info = f"批量配对完成，共 {total} 张"
+            if unmatched:
+                info += f"，未配对 {len(unmatched)} 张"
+            self._status.config(text=info)
+            if unmatched:
+                preview = "\n".join(unmatched[:10])
+                if len(unmatched) > 10:
+                    preview += f"\n... 还有 {len(unmatched) - 10} 张"
+                messagebox.showinfo("未配对图片", f"以下图片没有达到最低分的配对，导出时将跳过：\n{preview}")
+
+        self.root.after(100, _poll)
 
     # ─── 导出 ────────────────────────────────────────────────
     def export_pairs(self):
@@ -393,12 +456,17 @@ class GUI:
         total = len(results)
         success = 0
         errors = []
+        skipped = 0
 
         for i, (lname, (rpath, score)) in enumerate(results.items()):
+            if not rpath:
+                # 未配对的图片不导出
+                skipped += 1
+                continue
             try:
                 shutil.copy2(os.path.join(left_folder, lname),
                              os.path.join(folder_a, lname))
-                if rpath and os.path.isfile(rpath):
+                if os.path.isfile(rpath):
                     shutil.copy2(rpath, os.path.join(folder_b, os.path.basename(rpath)))
                 success += 1
             except Exception as e:
@@ -408,6 +476,8 @@ class GUI:
             self.root.update_idletasks()
 
         info = f"成功导出 {success}/{total} 对"
+        if skipped:
+            info += f"，跳过未配对 {skipped} 张"
         if errors:
             info += f"\n\n{len(errors)} 个错误:" + "\n".join(errors[:5])
         self._status.config(text=info)
@@ -2,48 +2,71 @@
 # -*- coding: utf-8 -*-
 """
 图像相似度匹配 - 基于感知哈希 + 颜色直方图
+
+特征使用 NumPy 表示：dHash 按位打包为 uint64 数组，颜色直方图为 float32 向量。
+batch_scores / score_matrix 以矩阵运算一次计算一对多 / 多对多的相似度。
 """
 
-import os
+import numpy as np
 from PIL import Image
 
+# dHash 尺寸：每行 DHASH_WIDTH 个像素，相邻比较得到 DHASH_WIDTH - 1 位
+DHASH_WIDTH = 18
+DHASH_HEIGHT = 8
+DHASH_BITS = (DHASH_WIDTH - 1) * DHASH_HEIGHT
+DHASH_WORDS = (DHASH_BITS + 63) // 64
+
+HIST_BINS = (8, 8, 4)
+HIST_LENGTH = sum(HIST_BINS)
+
+# 相似度权重
+PHASH_WEIGHT = 0.65
+COLOR_WEIGHT = 0.35
+
+# score_matrix 分块计算时每块的左侧行数（控制中间数组的内存占用）
+SCORE_BLOCK_ROWS = 256
+
+# 字节 popcount 查找表（NumPy < 2.0 没有 bitwise_count 时使用）
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(words):
+    """逐元素统计 uint64 数组中置位的比特数，并在最后一维求和"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int32)
+    as_bytes = words.view(np.uint8).reshape(words.shape[:-1] + (-1,))
+    return _POPCOUNT_TABLE[as_bytes].sum(axis=-1, dtype=np.int32)
+
 
 def _compute_phash(img):
-    """计算感知哈希 (dHash)"""
-    img = img.convert('L').resize((18, 8), Image.LANCZOS)
-    pixels = list(img.getdata())
-    pixels = [pixels[i:i + 18] for i in range(0, len(pixels), 18)]
-    diff = []
-    for row in pixels:
-        for i in range(len(row) - 1):
-            diff.append(row[i] > row[i + 1])
-    return diff
-
-
-def _compute_color_hist(img, bins=(8, 8, 4)):
-    """计算归一化颜色直方图"""
+    """计算感知哈希 (dHash)，返回打包后的 uint64 数组"""
+    img = img.convert('L').resize((DHASH_WIDTH, DHASH_HEIGHT), Image.LANCZOS)
+    pixels = np.asarray(img, dtype=np.int16)
+    diff = (pixels[:, :-1] > pixels[:, 1:]).ravel()
+    padded = np.zeros(DHASH_WORDS * 64, dtype=np.uint8)
+    padded[:DHASH_BITS] = diff
+    return np.packbits(padded).view('>u8').astype(np.uint64)
+
+
+def _compute_color_hist(img, bins=HIST_BINS):
+    """计算归一化颜色直方图（各通道分别归一化后拼接为 float32 向量）"""
     img = img.convert('RGB').resize((64, 64))
+    pixels = np.asarray(img)
     hist = []
-    for channel in range(3):
-        c = img.split()[channel]
-        pixels = list(c.getdata())
-        bin_counts = [0] * bins[channel]
-        for p in pixels:
-            idx = min(p // (256 // bins[channel]), bins[channel] - 1)
-            bin_counts[idx] += 1
-        total = sum(bin_counts) or 1
-        hist.append([c / total for c in bin_counts])
-    return hist
+    for channel, n_bins in enumerate(bins):
+        idx = np.minimum(pixels[..., channel] // (256 // n_bins), n_bins - 1)
+        counts = np.bincount(idx.ravel(), minlength=n_bins).astype(np.float32)
+        hist.append(counts / (counts.sum() or 1))
+    return np.concatenate(hist)
 
 
 def _hist_chisquare(h1, h2):
-    """计算两个直方图之间的卡方距离"""
-    distance = 0.0
-    for b1, b2 in zip(h1, h2):
-        for v1, v2 in zip(b1, b2):
-            if v1 + v2 > 0:
-                distance += (v1 - v2) ** 2 / (v1 + v2)
-    return distance
+    """计算直方图之间的卡方距离（支持广播，在最后一维求和）"""
+    total = h1 + h2
+    diff = h1 - h2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(total > 0, diff * diff / total, 0.0)
+    return terms.sum(axis=-1)
 
 
 def compute_features(img_or_path):
@@ -55,43 +78,114 @@ def compute_features(img_or_path):
     return _compute_phash(img), _compute_color_hist(img)
 
 
+def pack_features(features):
+    """将特征打包为紧凑的字节串（便于进程间传输）"""
+    phash, hist = features
+    return phash.astype('<u8').tobytes() + hist.astype('<f4').tobytes()
+
+
+def unpack_features(data):
+    """从 pack_features 的字节串还原特征"""
+    hash_bytes = DHASH_WORDS * 8
+    phash = np.frombuffer(data[:hash_bytes], dtype='<u8').astype(np.uint64)
+    hist = np.frombuffer(data[hash_bytes:], dtype='<f4').astype(np.float32)
+    return phash, hist
+
+
+def stack_features(features_list):
+    """将多组特征堆叠为矩阵
+
+    Returns:
+        tuple: (hashes: uint64[N, DHASH_WORDS], hists: float32[N, HIST_LENGTH])
+    """
+    if not features_list:
+        return (np.zeros((0, DHASH_WORDS), dtype=np.uint64),
+                np.zeros((0, HIST_LENGTH), dtype=np.float32))
+    hashes = np.stack([f[0] for f in features_list])
+    hists = np.stack([f[1] for f in features_list])
+    return hashes, hists
+
+
+def _combine(hamming, chi2):
+    phash_sim = 1.0 - hamming / DHASH_BITS
+    color_sim = 1.0 / (1.0 + chi2)
+    return PHASH_WEIGHT * phash_sim + COLOR_WEIGHT * color_sim
+
+
 def similarity_score(features_a, features_b):
     """计算两张图片的相似度分数（0-1，越高越相似）"""
     phash_a, hist_a = features_a
     phash_b, hist_b = features_b
 
     # dHash 汉明距离 (0-1, 越小越相似)
-    hamming = sum(a != b for a, b in zip(phash_a, phash_b))
-    phash_sim = 1.0 - hamming / len(phash_a)
+    hamming = _popcount(np.bitwise_xor(phash_a, phash_b))
 
     # 颜色直方图卡方距离 → 归一化相似度
     chi2 = _hist_chisquare(hist_a, hist_b)
-    color_sim = 1.0 / (1.0 + chi2)
 
-    return 0.65 * phash_sim + 0.35 * color_sim
+    return float(_combine(hamming, chi2))
 
 
-def find_best_match(left_img_path, right_folder):
-    """在右侧文件夹中找到与左图最相似的图片路径"""
-    from config import IMAGE_EXTENSIONS
+def batch_scores(query_features, stacked_candidates):
+    """计算一张图片与全部候选图片的相似度
+
+    Args:
+        query_features: compute_features 的返回值
+        stacked_candidates: stack_features 的返回值
+
+    Returns:
+        np.ndarray: float 数组，长度等于候选数量
+    """
+    phash, hist = query_features
+    hashes, hists = stacked_candidates
+    hamming = _popcount(np.bitwise_xor(hashes, phash[None, :]))
+    chi2 = _hist_chisquare(hists, hist[None, :])
+    return _combine(hamming, chi2)
+
+
+def rowwise_scores(stacked_a, stacked_b):
+    """计算两组等长特征中逐行对应图片的相似度
+
+    Returns:
+        np.ndarray: float 数组，第 i 项为 a[i] 与 b[i] 的相似度
+    """
+    hashes_a, hists_a = stacked_a
+    hashes_b, hists_b = stacked_b
+    hamming = _popcount(np.bitwise_xor(hashes_a, hashes_b))
+    chi2 = _hist_chisquare(hists_a, hists_b)
+    return _combine(hamming, chi2)
 
-    best_path = None
-    best_score = -1
+
+def score_matrix(stacked_left, stacked_right, block_rows=SCORE_BLOCK_ROWS):
+    """计算多对多相似度矩阵，按左侧行分块以限制内存占用
+
+    Returns:
+        np.ndarray: float32[N_left, N_right]
+    """
+    left_hashes, left_hists = stacked_left
+    right_hashes, right_hists = stacked_right
+    n_left, n_right = len(left_hashes), len(right_hashes)
+    scores = np.empty((n_left, n_right), dtype=np.float32)
+
+    for start in range(0, n_left, block_rows):
+        end = min(start + block_rows, n_left)
+        hamming = _popcount(np.bitwise_xor(left_hashes[start:end, None, :], right_hashes[None, :, :]))
+        chi2 = _hist_chisquare(left_hists[start:end, None, :], right_hists[None, :, :])
+        scores[start:end] = _combine(hamming, chi2)
+
+    return scores
+
+
+def find_best_match(left_img_path, right_folder):
+    """在右侧文件夹中找到与左图最相似的图片路径（右侧特征读取自文件夹索引）"""
+    from feature_index import load_folder_features
 
     left_features = compute_features(left_img_path)
+    right_paths, right_stacked = load_folder_features(right_folder)
+
+    if not right_paths:
+        return None, -1
 
-    for fname in os.listdir(right_folder):
-        ext = os.path.splitext(fname)[1].lower()
-        if ext not in IMAGE_EXTENSIONS:
-            continue
-        fpath = os.path.join(right_folder, fname)
-        try:
-            right_features = compute_features(fpath)
-            score = similarity_score(left_features, right_features)
-            if score > best_score:
-                best_score = score
-                best_path = fpath
-        except Exception:
-            continue
-
-    return best_path, best_score
+    scores = batch_scores(left_features, right_stacked)
+    best = int(np.argmax(scores))
+    return right_paths[best], float(scores[best])
@@ -26,6 +26,7 @@ def append_folder(self):
         try:
             # 保存当前图片数量
             old_count = len(self.image_processor.images)
+            added_names = []
             
             # 支持的图片格式
             image_extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
@@ -52,7 +53,10 @@ def append_folder(self):
                         'image_path': image_path,
                         'tag_path': tag_path
                     }
+                    added_names.append(image_name)
             
+            # 读取新增图片的标签文件加入标签索引
+            self.image_processor.build_tag_index(added_names)
             self.update_file_list()
             self.update_statistics()  # 更新统计信息
             new_count = len(self.image_processor.images) - old_count
@@ -219,6 +223,7 @@ def delete_selected_images(self):
             
             # 从数据结构中移除
             del self.image_processor.images[image_name]
+            self.image_processor.remove_from_tag_index(image_name)
             if image_name in self.thumbnail_items:
                 del self.thumbnail_items[image_name]
             if image_name in self.image_processor.thumbnail_cache:
@@ -202,6 +202,8 @@ def shuffle_current_folder_files(self):
             
         # 更新image_processor的数据
         self.image_processor.images = new_images_dict
+        # 文件名已全部改变，重建标签索引
+        self.image_processor.build_tag_index()
         
         # 更新thumbnail_items映射
         new_thumbnail_items = {}
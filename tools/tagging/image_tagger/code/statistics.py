@@ -1,20 +1,14 @@
 # 统计功能
-import os
 from PyQt5.QtWidgets import (QTreeWidgetItem)
-import re
 
 
 # 更新标签统计信息
 def update_tag_statistics(self):
     self.tag_statistics = {}
     
-    # 统计每个标签出现的频率
+    # 统计每个标签出现的频率（标签来自image_processor的标签索引，不再读取文件）
     for image_name in self.selected_images:
-        tag_content = self.image_processor.get_tag_content(image_name)
-        # 修改: 使用逗号分隔标签，支持中英文逗号
-        tags = [tag.strip() for tag in re.split('[,，]', tag_content) if tag.strip()]
-        
-        for tag in tags:
+        for tag in self.image_processor.get_tags(image_name):
             if tag in self.tag_statistics:
                 self.tag_statistics[tag] += 1
             else:
@@ -40,25 +34,9 @@ def update_statistics(self):
     """
     total_images = len(self.image_processor.images)
     
-    # 统计已打标和未打标的图片数量
-    tagged_count = 0
-    untagged_count = 0
-    
-    for image_name in self.image_processor.images:
-        tag_path = self.image_processor.images[image_name]['tag_path']
-        if os.path.exists(tag_path):
-            # 检查标签文件是否为空
-            try:
-                with open(tag_path, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if content:
-                        tagged_count += 1
-                    else:
-                        untagged_count += 1
-            except Exception:
-                untagged_count += 1
-        else:
-            untagged_count += 1
+    # 统计已打标和未打标的图片数量（标签索引中记录了标签文件非空的图片）
+    tagged_count = len(self.image_processor.tagged_images)
+    untagged_count = total_images - tagged_count
             
     # 更新统计标签显示
     stats_text = f"总图片数: {total_images} | 已打标: {tagged_count} | 未打标: {untagged_count}"
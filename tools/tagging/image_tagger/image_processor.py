@@ -1,4 +1,6 @@
 import os
+import re
+from collections import Counter
 from PyQt5.QtGui import QPixmap, QImage
 from PyQt5.QtCore import Qt, QObject, pyqtSignal, QThread
 from concurrent.futures import ThreadPoolExecutor
@@ -31,6 +33,12 @@ class ImageProcessor(QObject):
         # 添加文件监视器
         self.observer = None
         self.event_handler = None
+        # 标签索引：导入时并行读取一次，之后由保存和文件监视增量更新，统计时不再逐个读取标签文件
+        self.tag_contents = {}  # {image_name: 标签文件内容}
+        self.tag_index = {}  # {image_name: [tag, ...]}
+        self.tag_counts = Counter()  # 全部图片中每个标签出现的次数
+        self.tagged_images = set()  # 标签文件存在且非空的图片
+        self.tag_index_lock = threading.Lock()
         
     def convert_image_to_png(self, filename, folder_path):
         """将单个图片文件转换为PNG格式"""
@@ -99,6 +107,9 @@ class ImageProcessor(QObject):
             # 发送进度信号
             self.import_progress.emit(i + 1, total_files)
             
+        # 并行读取全部标签文件，建立标签索引
+        self.build_tag_index()
+        
         # 启动文件监视器
         self.start_monitoring()
         self.import_finished.emit()
@@ -146,17 +157,127 @@ class ImageProcessor(QObject):
                     'image_path': image_path,
                     'tag_path': tag_path
                 }
+                # 标签文件可能先于图片出现
+                self.update_tag_index(image_name)
                 
                 # 发送文件变化信号
                 self.file_changed.emit('created', image_name)
                 
         elif filename.lower().endswith('.txt'):
             # 处理标签文件的变化
-            image_name = os.path.splitext(filename)[0]
-            if image_name in self.images:
-                # 发送文件变化信号
+            self.handle_tag_file_changed(file_path)
+
+    def handle_tag_file_changed(self, file_path):
+        """处理标签文件的创建、修改、删除和移动：重新读取该文件并更新索引"""
+        image_name = os.path.splitext(os.path.basename(file_path))[0]
+        if image_name in self.images:
+            # 以磁盘上的当前内容为准，事件顺序不影响结果；内容没变（例如本程序自己保存）时不发送信号
+            if self.update_tag_index(image_name):
                 self.file_changed.emit('tag_updated', image_name)
 
+    # 标签索引
+    @staticmethod
+    def parse_tags(content):
+        """将标签文件内容拆分为标签列表，支持中英文逗号"""
+        return [tag.strip() for tag in re.split('[,，]', content) if tag.strip()]
+
+    def _read_tag_file(self, tag_path):
+        if os.path.exists(tag_path):
+            try:
+                with open(tag_path, 'r', encoding='utf-8') as f:
+                    return f.read().strip()
+            except Exception:
+                return ""
+        return ""
+
+    def _set_tag_entry(self, image_name, content):
+        """更新单张图片的索引项（调用方持有锁），返回内容是否变化"""
+        if self.tag_contents.get(image_name) == content:
+            return False
+        self._discount_tags(self.tag_index.get(image_name, []))
+        tags = self.parse_tags(content)
+        self.tag_contents[image_name] = content
+        self.tag_index[image_name] = tags
+        self.tag_counts.update(tags)
+        was_tagged = image_name in self.tagged_images
+        if content:
+            self.tagged_images.add(image_name)
+        else:
+            self.tagged_images.discard(image_name)
+        # 打标状态变化时缩略图上的“未打标”标识也要更新
+        if was_tagged != bool(content):
+            self.thumbnail_cache.pop(image_name, None)
+        return True
+
+    def _discount_tags(self, tags):
+        """从标签计数中减去一组标签，并去掉计数为0的标签"""
+        for tag in tags:
+            self.tag_counts[tag] -= 1
+            if self.tag_counts[tag] <= 0:
+                del self.tag_counts[tag]
+
+    def build_tag_index(self, image_names=None):
+        """
+        并行读取标签文件建立索引
+        
+        Args:
+            image_names: 要（重新）读取的图片名称，None表示重建全部图片的索引
+        """
+        if image_names is None:
+            with self.tag_index_lock:
+                self.tag_contents = {}
+                self.tag_index = {}
+                self.tag_counts = Counter()
+                self.tagged_images = set()
+            image_names = list(self.images)
+        else:
+            image_names = [name for name in image_names if name in self.images]
+        
+        tag_paths = [self.images[name]['tag_path'] for name in image_names]
+        contents = list(self.thread_pool.map(self._read_tag_file, tag_paths))
+        with self.tag_index_lock:
+            for image_name, content in zip(image_names, contents):
+                self._set_tag_entry(image_name, content)
+
+    def update_tag_index(self, image_name, tags=None):
+        """
+        更新单张图片的索引
+        
+        Args:
+            image_name: 图片名称
+            tags: 已写入文件的标签列表，None表示从文件重新读取
+            
+        Returns:
+            bool: 索引内容是否发生变化
+        """
+        if image_name not in self.images:
+            return False
+        if tags is None:
+            content = self._read_tag_file(self.images[image_name]['tag_path'])
+        else:
+            content = ", ".join(tags).strip()
+        with self.tag_index_lock:
+            return self._set_tag_entry(image_name, content)
+
+    def remove_from_tag_index(self, image_name):
+        """图片被移除时从索引中删除"""
+        with self.tag_index_lock:
+            self._discount_tags(self.tag_index.pop(image_name, []))
+            self.tag_contents.pop(image_name, None)
+            self.tagged_images.discard(image_name)
+
+    def get_tags(self, image_name):
+        """返回图片的标签列表（来自索引）"""
+        if image_name not in self.tag_index:
+            self.update_tag_index(image_name)
+        return list(self.tag_index.get(image_name, []))
+
+    def is_tagged(self, image_name):
+        """图片是否已打标（标签文件存在且非空）"""
+        if image_name not in self.tag_contents:
+            self.update_tag_index(image_name)
+        return image_name in self.tagged_images
+
     def get_pixmap(self, image_name):
         if image_name in self.images:
             image_path = self.images[image_name]['image_path']
@@ -165,14 +286,12 @@ class ImageProcessor(QObject):
         return None
         
     def get_tag_content(self, image_name):
+        # 编辑标签前读取：始终以磁盘内容为准（追加文件夹中的图片不在监视范围内），并顺带刷新索引
         if image_name in self.images:
-            tag_path = self.images[image_name]['tag_path']
-            if os.path.exists(tag_path):
-                try:
-                    with open(tag_path, 'r', encoding='utf-8') as f:
-                        return f.read().strip()
-                except Exception:
-                    return ""
+            content = self._read_tag_file(self.images[image_name]['tag_path'])
+            with self.tag_index_lock:
+                self._set_tag_entry(image_name, content)
+            return content
         return ""
         
     # 添加获取缩略图的方法
@@ -183,7 +302,6 @@ class ImageProcessor(QObject):
             
         if image_name in self.images:
             image_path = self.images[image_name]['image_path']
-            tag_path = self.images[image_name]['tag_path']
             if os.path.exists(image_path):
                 # 使用QImage直接加载并缩放，性能更好
                 image = QImage(image_path)
@@ -194,18 +312,8 @@ class ImageProcessor(QObject):
                                               Qt.SmoothTransformation)
                     thumbnail = QPixmap.fromImage(scaled_image)
                     
-                    # 检查是否已打标（标签文件是否存在且非空）
-                    is_tagged = False
-                    if os.path.exists(tag_path):
-                        try:
-                            with open(tag_path, 'r', encoding='utf-8') as f:
-                                if f.read().strip():
-                                    is_tagged = True
-                        except Exception:
-                            pass
-                    
-                    # 如果未打标，在缩略图上添加标识
-                    if not is_tagged:
+                    # 如果未打标（标签文件不存在或为空），在缩略图上添加标识
+                    if not self.is_tagged(image_name):
                         from PyQt5.QtGui import QPainter, QPen, QFont
                         painter = QPainter(thumbnail)
                         painter.setPen(QPen(Qt.red, 3))
@@ -241,6 +349,7 @@ class ImageProcessor(QObject):
         try:
             with open(tag_path, 'w', encoding='utf-8') as f:
                 f.write(content)
+            self.update_tag_index(image_name, tags)
             return True
         except Exception:
             return False
@@ -261,4 +370,19 @@ class FileChangeHandler(FileSystemEventHandler):
     def on_created(self, event):
         if not event.is_directory:
             # 在主线程中处理文件创建事件
-            self.image_processor.handle_file_created(event.src_path)
\ No newline at end of file
+            self.image_processor.handle_file_created(event.src_path)
+    
+    # 标签文件被修改、删除或重命名时增量更新标签索引
+    def on_modified(self, event):
+        if not event.is_directory and event.src_path.lower().endswith('.txt'):
+            self.image_processor.handle_tag_file_changed(event.src_path)
+    
+    def on_deleted(self, event):
+        if not event.is_directory and event.src_path.lower().endswith('.txt'):
+            self.image_processor.handle_tag_file_changed(event.src_path)
+    
+    def on_moved(self, event):
+        if not event.is_directory:
+            for path in (event.src_path, event.dest_path):
+                if path.lower().endswith('.txt'):
+                    self.image_processor.handle_tag_file_changed(path)
\ No newline at end of file
@@ -620,6 +620,9 @@ class TaggerUI(QMainWindow):
             # 标签文件更新，刷新当前显示的图片（如果是当前选中的）
             if self.current_image_name == image_name:
                 self.refresh_current_view()
+            elif image_name not in self.image_processor.thumbnail_cache:
+                # 打标状态变化时标签索引已清除旧缩略图，重新生成
+                self.image_processor.load_thumbnail_async(image_name)
             self.update_statistics()
 
     def add_image_to_list(self, image_name):
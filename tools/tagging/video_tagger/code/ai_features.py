@@ -6,17 +6,26 @@ from tkinter import messagebox
 from PIL import Image
 import numpy as np
 import io
+import math
 import base64
 from openai import OpenAI
 import logging
 import threading
 import time
 import cv2
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from frame_store import LazyFrameStore, compute_frame_interval
+from tag_management import write_tag_segments, get_export_options
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 请求图像载荷格式对应的 MIME 类型
+PAYLOAD_MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
 
 class LLMClient:
     """LLM API 客户端封装类，通过 OpenAI 兼容 API 格式调用 AI 服务"""
@@ -72,7 +81,7 @@ class LLMClient:
         """从处理后的帧中提取采样帧
 
         Args:
-            processed_frames: 已处理的帧列表（numpy array）
+            processed_frames: 已处理的帧序列（numpy array 列表或 LazyFrameStore）
             start_frame: 起始帧索引
             end_frame: 结束帧索引
 
@@ -90,8 +99,12 @@ class LLMClient:
         else:
             indices = np.linspace(start_frame, end_frame, sample_count, dtype=int)
 
-        for i in indices:
-            if i < len(processed_frames):
+        indices = [i for i in indices if i < len(processed_frames)]
+        if hasattr(processed_frames, 'get_frames'):
+            # 按需解码的帧存储：只解码采样帧，按视频位置顺序读取
+            frames = [Image.fromarray(frame_rgb) for frame_rgb in processed_frames.get_frames(indices)]
+        else:
+            for i in indices:
                 frame_rgb = processed_frames[i]
                 pil_frame = Image.fromarray(frame_rgb)
                 frames.append(pil_frame)
@@ -102,25 +115,105 @@ class LLMClient:
 
         return frames
 
-    def convert_image_to_base64(self, image):
+    def get_payload_config(self):
+        """获取请求图像载荷的编码配置
+
+        Returns:
+            tuple: (payload_format, payload_quality, mosaic_tiles, payload_max_bytes)
+        """
+        payload_format = self.config.get('PROCESSING', 'payload_format', fallback='jpeg').lower()
+        if payload_format not in PAYLOAD_MIME_TYPES:
+            payload_format = 'jpeg'
+        payload_quality = self.config.getint('PROCESSING', 'payload_quality', fallback=85)
+        mosaic_tiles = max(1, self.config.getint('PROCESSING', 'mosaic_tiles', fallback=1))
+        payload_max_mb = self.config.getfloat('PROCESSING', 'payload_max_mb', fallback=0)
+        return payload_format, payload_quality, mosaic_tiles, int(payload_max_mb * 1024 * 1024)
+
+    def convert_image_to_base64(self, image, scale=1.0):
         """将 PIL 图像转换为 base64 编码
 
         Args:
             image: PIL Image 对象
+            scale: 在 image_max_size 基础上的额外缩放比例（超出载荷预算时缩小）
 
         Returns:
             str: base64 编码的 data URL
         """
-        max_size = self.config.getint('PROCESSING', 'image_max_size', fallback=720)
+        max_size = max(1, int(self.config.getint('PROCESSING', 'image_max_size', fallback=720) * scale))
+        payload_format, payload_quality, _, _ = self.get_payload_config()
         image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
 
         buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
+        if payload_format == 'png':
+            image.save(buffered, format="PNG")
+        elif payload_format == 'webp':
+            image.save(buffered, format="WEBP", quality=payload_quality)
+        else:
+            image.convert("RGB").save(buffered, format="JPEG", quality=payload_quality)
         encoded = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        data_url = f"data:image/png;base64,{encoded}"
+        data_url = f"data:{PAYLOAD_MIME_TYPES[payload_format]};base64,{encoded}"
 
         return data_url
 
+    def _build_mosaics(self, frames, tiles, scale=1.0):
+        """将每 tiles 帧拼成一张网格图（按时间顺序从左到右、从上到下）"""
+        max_size = max(1, int(self.config.getint('PROCESSING', 'image_max_size', fallback=720) * scale))
+        cols = math.ceil(math.sqrt(tiles))
+        cell = max(1, max_size // cols)
+
+        mosaics = []
+        for start in range(0, len(frames), tiles):
+            group = [frame.copy() for frame in frames[start:start + tiles]]
+            for frame in group:
+                frame.thumbnail((cell, cell), Image.Resampling.LANCZOS)
+            rows = math.ceil(len(group) / cols)
+            cell_w = max(frame.width for frame in group)
+            cell_h = max(frame.height for frame in group)
+            mosaic = Image.new("RGB", (cell_w * min(cols, len(group)), cell_h * rows))
+            for k, frame in enumerate(group):
+                mosaic.paste(frame.convert("RGB"), ((k % cols) * cell_w, (k // cols) * cell_h))
+            mosaics.append(mosaic)
+        return mosaics
+
+    def encode_frames(self, frames):
+        """按载荷配置编码一次请求的所有帧
+
+        超出 payload_max_mb 预算时先逐步降低分辨率（最低一半），再均匀减少帧数。
+
+        Args:
+            frames: PIL Image 对象列表
+
+        Returns:
+            list: base64 data URL 列表
+        """
+        payload_format, _, mosaic_tiles, max_bytes = self.get_payload_config()
+        started = time.perf_counter()
+        scale = 1.0
+        used = list(frames)
+
+        while True:
+            if mosaic_tiles > 1:
+                images = self._build_mosaics(used, mosaic_tiles, scale)
+            else:
+                images = [frame.copy() for frame in used]
+            image_data_urls = [self.convert_image_to_base64(image, scale) for image in images]
+            total_bytes = sum(len(url) for url in image_data_urls)
+
+            if not max_bytes or total_bytes <= max_bytes or len(used) <= 2 and scale <= 0.5:
+                break
+            if scale > 0.5:
+                scale = max(0.5, scale * 0.8)
+            else:
+                keep = max(2, int(len(used) * 0.75))
+                used = [used[i] for i in np.linspace(0, len(used) - 1, keep, dtype=int)]
+
+        logger.info(
+            f"请求图像载荷: {len(frames)} 帧 -> {len(used)} 帧 / {len(image_data_urls)} 张图, "
+            f"{payload_format}, 缩放 {scale:.2f}, {total_bytes / 1024 / 1024:.2f} MB, "
+            f"编码耗时 {time.perf_counter() - started:.2f} 秒"
+        )
+        return image_data_urls
+
     def generate_caption(self, frames, prompt_text=None, max_attempts=10, min_length=50):
         """通过 OpenAI 兼容 API 为多个帧生成统一描述
 
@@ -134,8 +227,21 @@ class LLMClient:
             str: 生成的标签文本
         """
         # 转换所有帧为 base64
-        image_data_urls = [self.convert_image_to_base64(frame) for frame in frames]
-        
+        image_data_urls = self.encode_frames(frames)
+        return self.generate_caption_from_urls(image_data_urls, prompt_text, max_attempts, min_length)
+
+    def generate_caption_from_urls(self, image_data_urls, prompt_text=None, max_attempts=10, min_length=50):
+        """使用已编码的 base64 图像生成描述（批量流水线中编码与请求分开执行）
+
+        Args:
+            image_data_urls: encode_frames 生成的 data URL 列表
+            prompt_text: 用户自定义提示词，默认为 None
+            max_attempts: 最大重试次数
+            min_length: 最小生成长度
+
+        Returns:
+            str: 生成的标签文本
+        """
         # 使用传入的提示词或者默认提示词
         if prompt_text is None or prompt_text.strip() == "":
             prompt_text = '你是一名专业的图片内容描述大师，请放心使用最大胆直白的语言和明确清晰的句子描述，禁止隐瞒，暗示或者用笼统和词义不单一的词汇。详细全面描述画面里的所有元素。只输出内容本身，不要重复和输出其他内容，中文回答。'
@@ -268,8 +374,101 @@ def auto_segment_and_recognize(self):
         progress_label.config(text="正在停止，等待当前视频处理完成...")
         self._cancel_batch = True
 
+    # 在主线程读取界面参数，后台线程只使用这些快照
+    user_prompt = self.ai_prompt_entry.get("1.0", tk.END).strip()
+    export_fps_text = self.fps_entry.get()
+
+    def prepare_video(llm_client, video_path):
+        """流水线第一阶段：读取视频元数据，只解码 AI 采样帧并编码为 base64"""
+        cap = cv2.VideoCapture(video_path)
+        source_fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+
+        target_fps = self.config.getint('PROCESSING', 'target_frame_rate', fallback=24)
+        frame_interval, effective_fps = compute_frame_interval(source_fps, target_fps)
+        cache_size = self.config.getint('PROCESSING', 'frame_cache_size', fallback=240)
+        store = LazyFrameStore(video_path, frame_interval, resize_fn=self.resize_to_720p, cache_size=cache_size)
+
+        frames = llm_client.extract_frames(store, 0, len(store) - 1)
+        image_data_urls = llm_client.encode_frames(frames)
+        # 释放解码器，导出阶段再按需重新打开
+        store.close()
+        return {"video_path": video_path, "store": store, "fps": effective_fps,
+                "image_data_urls": image_data_urls}
+
+    def caption_video(llm_client, prepare_future):
+        """流水线第二阶段：等待采样帧就绪后请求 AI 生成描述"""
+        item = prepare_future.result()
+        try:
+            item["caption"] = llm_client.generate_caption_from_urls(item["image_data_urls"], user_prompt)
+        except Exception as ai_err:
+            item["caption"] = None
+            item["error"] = ai_err
+        item["image_data_urls"] = None
+        return item
+
+    def write_video(item):
+        """流水线第三阶段：导出标签片段，并在主界面显示该视频"""
+        store = item["store"]
+        caption = item["caption"]
+        end_frame = len(store) - 1
+        tags = [{"start": 0, "end": end_frame, "tag": caption}] if caption else []
+
+        if caption:
+            print(f"已添加新标签：{caption}")
+            export_dir = self.export_dir or self.config.get('VIDEO', 'export_path', fallback=None)
+            if export_dir:
+                self.export_dir = export_dir
+                try:
+                    export_fps = item["fps"] if export_fps_text == "原始帧率" else float(export_fps_text)
+                except ValueError:
+                    export_fps = item["fps"]
+                if not write_tag_segments(store, tags, export_fps, export_dir, **get_export_options(self.config)):
+                    print(f"标记片段导出失败: {item['video_path']}")
+        else:
+            print(f"AI 生成失败 for {item['video_path']}: {item.get('error')}")
+
+        # 切换主界面到刚完成的视频（与双击加载后的状态一致）
+        if hasattr(self, 'cap') and self.cap:
+            self.cap.release()
+            self.cap = None
+        self._release_frame_store()
+        self.video_path = item["video_path"]
+        self.processed_frames = store
+        self.total_frames = len(store)
+        self.fps = item["fps"]
+        self.frames_loaded = True
+        self.tags = tags
+        self.excluded_segments = []
+        self.current_frame = 0
+        self.start_frame = 0
+        self.end_frame = end_frame
+
+        self.root.after(0, lambda: self.progress.config(to=self.total_frames-1))
+        self.root.after(0, lambda: self.export_fps.set(f"{self.fps:.2f}"))
+        self.root.after(0, self.show_frame)
+        self.root.after(0, self.draw_tag_markers)
+
+        # 更新列表框中的显示
+        def update_listbox(e=end_frame, c=caption):
+            self.tag_listbox.delete(0, tk.END)
+            if c:
+                self.tag_listbox.insert(tk.END, f"帧 0-{e}: {c}")
+        self.root.after(0, update_listbox)
+
+        # 启动视频循环播放（主线程的 play_video 会自动循环）
+        # 播放会逐帧解码整个视频，默认关闭，批量处理时只解码 AI 采样帧
+        if preview_playback and not self.playing:
+            self.playing = True
+            self.root.after(int(1000 / max(self.fps, 1)), self.play_video)
+
+    preview_playback = self.config.getboolean('PROCESSING', 'batch_preview_playback', fallback=False)
+
     def batch_process_videos():
-        """批量处理视频文件列表中的所有视频"""
+        """批量处理视频文件列表中的所有视频
+
+        三段流水线：采样解码/编码线程池 -> 限制并发数的 AI 请求线程池 -> 本线程按顺序导出结果
+        """
         if not hasattr(self, 'video_list') or not self.video_list:
             self.root.after(0, lambda: messagebox.showwarning("警告", "没有找到视频文件列表"))
             self.root.after(0, lambda: method_window.destroy())
@@ -288,6 +487,8 @@ def auto_segment_and_recognize(self):
 
         # 初始化 LLM API 客户端
         llm_client = LLMClient(self.config)
+        prepare_workers = max(1, self.config.getint('PROCESSING', 'batch_prepare_workers', fallback=2))
+        max_inflight = max(1, self.config.getint('PROCESSING', 'batch_max_inflight', fallback=2))
 
         # 初始化取消标志
         self._cancel_batch = False
@@ -295,108 +496,70 @@ def auto_segment_and_recognize(self):
 
         # 从当前视频位置开始循环（支持跨末尾续接）
         video_paths = self.video_list[start_idx:] + self.video_list[:start_idx]
-        for offset, video_path in enumerate(video_paths):
-            idx = start_idx + offset
-            if idx >= total_videos:
-                idx -= total_videos
-            # 检查是否已取消
-            if getattr(self, '_cancel_batch', False):
-                cancelled = True
-                result_msg = f"已取消批量处理\n共处理 {processed_count}/{total_videos} 个视频"
-                print(result_msg)
-                self.root.after(0, lambda m=result_msg: messagebox.showinfo("已取消", m))
-                self.root.after(0, method_window.destroy)
-                break
-            try:
+        prepare_pool = ThreadPoolExecutor(max_workers=prepare_workers)
+        caption_pool = ThreadPoolExecutor(max_workers=max_inflight)
+        # 同时在流水线中的视频数：正在请求的 + 预先准备好的
+        window = max_inflight + prepare_workers
+        pending = deque()  # (offset, prepare_future, caption_future)
+        next_offset = 0
+
+        def submit_next():
+            nonlocal next_offset
+            video_path = video_paths[next_offset]
+            prepare_future = prepare_pool.submit(prepare_video, llm_client, video_path)
+            caption_future = caption_pool.submit(caption_video, llm_client, prepare_future)
+            pending.append((next_offset, prepare_future, caption_future))
+            next_offset += 1
+
+        try:
+            while pending or next_offset < len(video_paths):
+                # 检查是否已取消：未开始的视频不再处理，已在请求中的视频完成后导出
+                if getattr(self, '_cancel_batch', False) and not cancelled:
+                    cancelled = True
+                    for _, prepare_future, caption_future in reversed(pending):
+                        if caption_future.cancel():
+                            prepare_future.cancel()
+                    next_offset = len(video_paths)
+
+                while not cancelled and next_offset < len(video_paths) and len(pending) < window:
+                    submit_next()
+                if not pending:
+                    break
+
+                offset, _, caption_future = pending.popleft()
+                if caption_future.cancelled():
+                    continue
+                video_path = video_paths[offset]
+                idx = (start_idx + offset) % total_videos
+
                 # 更新进度信息
                 progress_info = f"正在处理第 {idx + 1}/{total_videos} 个视频：{video_path}"
                 # 在 GUI 窗口中更新进度信息
                 self.root.after(0, lambda info=progress_info: safe_update_label(info))
                 print(progress_info)
-                
-                # 释放之前的视频捕获对象
-                if hasattr(self, 'cap') and self.cap:
-                    self.cap.release()
-
-                # 清空之前处理的帧
-                self.processed_frames = []
-                self.frames_loaded = False
-                self.tags = []  # 清空标记
-                self.excluded_segments = []  # 清空排除片段
-                self.current_frame_idx = 0
-
-                # 加载当前视频（与双击加载逻辑一致：先打开视频读取属性，再预处理采样）
-                self.video_path = video_path
-                self.cap = cv2.VideoCapture(self.video_path)
-                self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                self.fps = self.cap.get(cv2.CAP_PROP_FPS)
-
-                # 预处理所有帧（静默模式，按 target_frame_rate 配置采样）
-                self.preprocess_frames(silent=True)
-
-                # 刷新主界面显示
-                self.current_frame = 0
-                self.root.after(0, lambda: self.progress.config(to=self.total_frames-1))
-                self.root.after(0, lambda: self.export_fps.set(f"{self.fps:.2f}"))
-                self.root.after(0, self.show_frame)
-                self.root.after(0, self.draw_tag_markers)
-
-                # 启动视频循环播放（在后台线程中设置标志，主线程的 play_video 会自动循环）
-                self.playing = True
-                self.root.after(int(1000 / max(self.fps, 1)), self.play_video)
-
-                # 设置起始和结束帧为整个视频 (模拟单个标签覆盖全片的场景)
-                self.start_frame = 0
-                self.end_frame = self.total_frames - 1
-
-                # 【核心修改】复用 _generate_ai_caption_local_thread 中的 AI 调用逻辑
-                # 这里直接调用其内部使用的核心步骤，确保调用方式一致
+
                 try:
-                    # 1. 提取帧
-                    frames = llm_client.extract_frames(self.processed_frames, self.start_frame, self.end_frame)
-
-                    # 2. 获取用户提示词
-                    user_prompt = self.ai_prompt_entry.get("1.0", tk.END).strip()
-                    
-                    # 3. 生成描述 (复用 generate_caption)
-                    new_caption = llm_client.generate_caption(frames, user_prompt)
-
-                    if new_caption:  # 如果成功生成了新标签
-                        # 创建新的标签信息并添加到标签列表
-                        new_tag_info = {
-                            "start": self.start_frame,
-                            "end": self.end_frame,
-                            "tag": new_caption
-                        }
-                        self.tags = []
-                        self.tags.append(new_tag_info)
-                        print(f"已添加新标签：{new_caption}")
-                        # 更新列表框中的显示
-                        self.root.after(0, lambda s=self.start_frame, e=self.end_frame, c=new_caption:
-                                       self.tag_listbox.delete(0, tk.END) or 
-                                       self.tag_listbox.insert(tk.END, f"帧 {s}-{e}: {c}"))
-
-                    self.export_tags(batch_mode=True)  # 导出当前视频的标签（批量模式，无弹窗）
-
-                    # 停止播放，准备处理下一个视频
-                    self.playing = False
-
-                except Exception as ai_err:
-                    print(f"AI 生成失败 for {video_path}: {str(ai_err)}")
-                    # 继续处理下一个视频
-                
-                # 等待片刻，避免界面卡顿或资源竞争
-                time.sleep(0.5)  
-                
-                processed_count += 1
-                print(f"已完成处理：{video_path}")
-                
-            except Exception as e:
-                print(f"处理视频 {video_path} 时出错：{str(e)}")
-                continue
+                    item = caption_future.result()
+                    write_video(item)
+                    processed_count += 1
+                    print(f"已完成处理：{video_path}")
+                except Exception as e:
+                    print(f"处理视频 {video_path} 时出错：{str(e)}")
+                    continue
+        finally:
+            prepare_pool.shutdown(wait=False, cancel_futures=True)
+            caption_pool.shutdown(wait=False, cancel_futures=True)
+
+        # 停止预览播放
+        self.playing = False
 
-        # 处理完成后显示统计信息
-        if not cancelled:
+        if cancelled:
+            result_msg = f"已取消批量处理\n共处理 {processed_count}/{total_videos} 个视频"
+            print(result_msg)
+            self.root.after(0, lambda m=result_msg: messagebox.showinfo("已取消", m))
+            self.root.after(0, method_window.destroy)
+        else:
+            # 处理完成后显示统计信息
             elapsed_time = time.time() - start_time
             result_msg = f"批量处理完成!\n共处理 {processed_count}/{total_videos} 个视频\n总耗时：{elapsed_time:.2f} 秒"
             print(result_msg)
@@ -508,19 +671,31 @@ def _generate_ai_caption_local_thread(self):
         self.root.after(0, close_loading_window)
 
 
-def _generate_single_tag_caption(self):
-    """为单个标签生成 AI 描述"""
+def _generate_single_tag_caption(self, start_frame=None, end_frame=None, llm_client=None, user_prompt=None):
+    """为单个标签生成 AI 描述
+
+    Args:
+        start_frame / end_frame: 片段帧范围，默认使用当前选中的开始帧和结束帧
+        llm_client: 复用的 LLMClient，默认新建
+        user_prompt: 提示词，默认读取界面输入框（只能在主线程读取）
+    """
+    if start_frame is None:
+        start_frame = self.start_frame
+    if end_frame is None:
+        end_frame = self.end_frame
     try:
         # 获取选中的视频片段帧
-        if self.start_frame < len(self.processed_frames) and self.end_frame < len(self.processed_frames):
+        if start_frame < len(self.processed_frames) and end_frame < len(self.processed_frames):
             # 初始化 LLM API 客户端
-            llm_client = LLMClient(self.config)
+            if llm_client is None:
+                llm_client = LLMClient(self.config)
 
             # 从处理后的帧中提取视频片段
-            frames = llm_client.extract_frames(self.processed_frames, self.start_frame, self.end_frame)
+            frames = llm_client.extract_frames(self.processed_frames, start_frame, end_frame)
 
             # 获取用户自定义的提示词
-            user_prompt = self.ai_prompt_entry.get("1.0", tk.END).strip()
+            if user_prompt is None:
+                user_prompt = self.ai_prompt_entry.get("1.0", tk.END).strip()
 
             # 生成描述
             caption = llm_client.generate_caption(frames, user_prompt)
@@ -533,11 +708,49 @@ def _generate_single_tag_caption(self):
         return None
 
 
+def regenerate_segment_captions(self, ranges, user_prompt, on_result=None, max_workers=None):
+    """以有限并发为多个片段重新生成描述，结果按原顺序回调
+
+    Args:
+        ranges: [(start_frame, end_frame), ...]
+        user_prompt: 提示词（在主线程读取后传入）
+        on_result: 回调 (index, caption)，严格按 ranges 顺序调用，生成失败时 caption 为 None
+        max_workers: 同时进行的 AI 请求数，默认读取 [PROCESSING] regenerate_workers
+
+    Returns:
+        list: 与 ranges 一一对应的描述
+    """
+    if max_workers is None:
+        max_workers = self.config.getint('PROCESSING', 'regenerate_workers', fallback=4)
+    llm_client = LLMClient(self.config)
+    captions = [None] * len(ranges)
+    ready = [False] * len(ranges)
+    next_index = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(self._generate_single_tag_caption, start, end, llm_client, user_prompt): i
+            for i, (start, end) in enumerate(ranges)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            captions[i] = future.result()
+            ready[i] = True
+            # 按原顺序应用已完成的结果
+            while next_index < len(ranges) and ready[next_index]:
+                if on_result:
+                    on_result(next_index, captions[next_index])
+                next_index += 1
+
+    return captions
+
+
 __all__ = [
     'auto_segment_and_recognize',
     'generate_ai_caption',
     '_generate_ai_caption_local',
     '_generate_ai_caption_local_thread',
     '_generate_single_tag_caption',
+    'regenerate_segment_captions',
     'LLMClient'
 ]
@@ -23,13 +23,25 @@ class ConfigWindow:
         'top_p': 'top-p 参数',
         'default_export_fps': '默认导出帧率',
         'export_path': '导出路径',
+        'export_mode': '片段导出方式',
+        'export_workers': '并行导出数',
+        'export_crf': '导出编码质量(CRF)',
         'window_width': '窗口宽度',
         'window_height': '窗口高度',
         'target_max_edge': '目标最长边',
         'max_sample_frames': '最大采样帧数',
         'target_frame_rate': '目标帧率',
+        'frame_cache_size': '解码帧缓存数量',
+        'batch_preview_playback': '批量生成时预览播放',
+        'batch_prepare_workers': '批量解码并发数',
+        'batch_max_inflight': '批量 AI 请求并发数',
+        'regenerate_workers': '重新生成并发数',
         'segment_duration': '自动分段时长(秒)',
         'image_max_size': 'AI 图像最大边长',
+        'payload_format': 'AI 图像编码格式',
+        'payload_quality': 'AI 图像编码质量',
+        'mosaic_tiles': '每张图拼接帧数',
+        'payload_max_mb': '单次请求图像上限(MB)',
         'api_base_url': 'API 地址',
         'api_key': 'API Key',
         'video_prompt': '视频提示词',
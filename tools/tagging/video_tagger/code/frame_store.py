@@ -0,0 +1,182 @@
+# Frame Store Module - 帧存储模块
+# 按需解码的采样帧存储，替代预先解码全部帧的列表
+
+import threading
+import logging
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 向前跳转不超过该帧数时用 grab() 顺序跳过，否则直接定位
+SEQUENTIAL_GRAB_LIMIT = 48
+
+
+def compute_sample_positions(source_frame_count, frame_interval):
+    """计算采样帧在原视频中的帧号（与逐帧读取时 i % frame_interval < 1 的采样规则一致）"""
+    positions = np.arange(max(source_frame_count, 0), dtype=np.int64)
+    return positions[(positions % frame_interval) < 1]
+
+
+def compute_frame_interval(source_fps, target_fps):
+    """按目标帧率计算采样间隔
+
+    Returns:
+        tuple: (frame_interval, effective_fps)
+    """
+    if source_fps > target_fps:
+        return source_fps / target_fps, target_fps
+    return 1, source_fps
+
+
+def count_video_frames(video_path):
+    """逐帧 grab() 统计视频真实帧数（不做颜色转换），用于元数据缺失的视频"""
+    cap = cv2.VideoCapture(video_path)
+    count = 0
+    while cap.grab():
+        count += 1
+    cap.release()
+    return count
+
+
+class LazyFrameStore:
+    """按需解码的采样帧序列
+
+    行为与原来的 processed_frames 列表一致：支持 len()、下标访问和迭代，
+    返回 RGB、按最长边缩放后的 numpy 数组。只记录采样帧在原视频中的位置，
+    访问时才解码，最近使用的帧保存在 LRU 缓存中。
+    """
+
+    def __init__(self, video_path, frame_interval=1, resize_fn=None, cache_size=240):
+        """
+        Args:
+            video_path: 视频文件路径
+            frame_interval: 采样间隔（原视频帧数 / 采样帧数，可为小数）
+            resize_fn: 对 RGB 帧进行缩放的函数，默认不缩放
+            cache_size: LRU 缓存的最大帧数
+        """
+        self.video_path = video_path
+        self.frame_interval = frame_interval
+        self.resize_fn = resize_fn
+        self.cache_size = max(1, cache_size)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._cap = cv2.VideoCapture(video_path)
+        if not self._cap.isOpened():
+            raise IOError(f"无法打开视频文件：{video_path}")
+
+        self.source_fps = self._cap.get(cv2.CAP_PROP_FPS)
+        source_frame_count = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if source_frame_count <= 0:
+            source_frame_count = count_video_frames(video_path)
+        self.positions = compute_sample_positions(source_frame_count, frame_interval)
+        self._next_pos = 0  # 解码器下一次 read() 返回的原视频帧号
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        n = len(self.positions)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("frame index out of range")
+
+        with self._lock:
+            frame = self._cache.get(index)
+            if frame is not None:
+                self._cache.move_to_end(index)
+                return frame
+
+            frame = self._decode(int(self.positions[index]))
+            self._cache[index] = frame
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return frame
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def source_time(self, index):
+        """采样帧在原视频中的时间戳（秒）"""
+        if self.source_fps <= 0:
+            return 0.0
+        return float(self.positions[index]) / self.source_fps
+
+    def segment_end_time(self, index):
+        """采样帧 index 结束的时间戳（秒），即下一个采样帧的开始时间"""
+        if self.source_fps <= 0:
+            return 0.0
+        if index + 1 < len(self.positions):
+            return float(self.positions[index + 1]) / self.source_fps
+        return (float(self.positions[index]) + self.frame_interval) / self.source_fps
+
+    def get_frames(self, indices):
+        """批量读取采样帧：按原视频位置升序解码（顺序 grab 跳过或定位），结果按传入顺序返回
+
+        只解码 indices 对应的帧，读取结果不放入 LRU 缓存，适合批量 AI 采样。
+        """
+        n = len(self.positions)
+        indices = [i + n if i < 0 else i for i in (int(i) for i in indices)]
+        for i in indices:
+            if not 0 <= i < n:
+                raise IndexError("frame index out of range")
+
+        decoded = {}
+        with self._lock:
+            for i in sorted(set(indices)):
+                frame = self._cache.get(i)
+                decoded[i] = frame if frame is not None else self._decode(int(self.positions[i]))
+        return [decoded[i] for i in indices]
+
+    def _read_at(self, pos):
+        """将解码器移动到原视频第 pos 帧并读取（BGR），失败返回 None"""
+        if self._cap is None:
+            self._cap = cv2.VideoCapture(self.video_path)
+            self._next_pos = 0
+
+        gap = pos - self._next_pos
+        if 0 <= gap <= SEQUENTIAL_GRAB_LIMIT:
+            # 顺序访问（播放 / 导出）：只 grab 跳过中间帧，不做解码后的转换
+            for _ in range(gap):
+                if not self._cap.grab():
+                    self._next_pos = -1
+                    return None
+        else:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, pos)
+
+        ret, frame = self._cap.read()
+        self._next_pos = pos + 1 if ret else -1
+        return frame if ret else None
+
+    def _decode(self, pos):
+        """解码原视频第 pos 帧并转换为 RGB、缩放"""
+        frame = self._read_at(pos)
+        if frame is None:
+            # 元数据帧数可能略多于实际帧数，末尾读取失败时向前回退
+            for back in range(1, SEQUENTIAL_GRAB_LIMIT + 1):
+                if pos - back < 0:
+                    break
+                frame = self._read_at(pos - back)
+                if frame is not None:
+                    logger.warning(f"读取第 {pos} 帧失败，使用第 {pos - back} 帧代替：{self.video_path}")
+                    break
+        if frame is None:
+            raise IOError(f"无法解码第 {pos} 帧：{self.video_path}")
+
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if self.resize_fn is not None:
+            frame = self.resize_fn(frame)
+        return frame
+
+    def close(self):
+        """释放解码器并清空缓存"""
+        with self._lock:
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
+            self._cache.clear()
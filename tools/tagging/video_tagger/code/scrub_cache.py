@@ -0,0 +1,206 @@
+# Scrub Cache Module - 拖动预览缓存模块
+# 为视频剪辑器提供拖动进度条时的快速预览：
+#   - 加载时建立关键帧索引（需要 ffprobe）
+#   - 后台顺序解码一遍视频，生成低分辨率代理帧（JPEG 压缩后保存在内存中）
+#   - 拖动时直接返回代理帧，停下后才解码全分辨率帧
+
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+
+import cv2
+
+import smart_cut
+
+logger = logging.getLogger(__name__)
+
+# 代理帧最长边像素和 JPEG 质量
+PROXY_MAX_SIDE = 320
+PROXY_JPEG_QUALITY = 80
+# 代理帧数量上限，超过时按间隔采样（拖动时取最近的代理帧）
+MAX_PROXY_FRAMES = 20000
+# 全分辨率帧 LRU 缓存大小（定位解码时顺带缓存目标帧之前的若干帧，方便逐帧后退）
+FULL_CACHE_SIZE = 24
+# 没有关键帧索引时，向前跳转不超过该帧数用 grab() 顺序跳过，否则直接定位
+SEQUENTIAL_GRAB_LIMIT = 48
+
+
+def build_keyframe_index(video_path, stop_event=None):
+    """用 ffprobe 读取关键帧所在的帧号（升序），不可用或被 stop_event 中断时返回 None"""
+    if not smart_cut.is_ffmpeg_available():
+        return None
+    try:
+        info = smart_cut.probe_video(video_path, stop_event)
+    except smart_cut.ProbeCancelled:
+        return None
+    except Exception as e:
+        logger.warning(f"建立关键帧索引失败：{e}")
+        return None
+    frame_times = info["frame_times"]
+    tolerance = 0.5 / info["fps"] if info["fps"] else 0.02
+    return sorted({bisect.bisect_left(frame_times, t - tolerance) for t in info["keyframe_times"]})
+
+
+class ScrubFrameCache:
+    """视频剪辑器的帧缓存
+
+    get_proxy() 从内存返回低分辨率代理帧（拖动时使用），
+    get_frame() 解码全分辨率帧（停下后使用），两者使用各自独立的解码器。
+    返回的帧均为 RGB numpy 数组。
+    后台线程不回调界面，代理帧生成进度由界面定时读取 proxy_progress / proxy_ready。
+    """
+
+    def __init__(self, video_path, total_frames):
+        """
+        Args:
+            video_path: 视频文件路径
+            total_frames: 视频总帧数
+        """
+        self.video_path = video_path
+        self.total_frames = max(total_frames, 0)
+        self.proxy_step = max(1, -(-self.total_frames // MAX_PROXY_FRAMES))
+        self.keyframes = None
+
+        self._proxies = [None] * (-(-self.total_frames // self.proxy_step))
+        self._proxy_count = 0
+        self._full_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+        self._cap = cv2.VideoCapture(video_path)
+        if not self._cap.isOpened():
+            raise IOError(f"无法打开视频文件：{video_path}")
+        self._next_pos = 0  # 解码器下一次 read() 返回的帧号
+
+        self._proxy_thread = threading.Thread(target=self._build_proxies, daemon=True)
+        self._proxy_thread.start()
+
+    @property
+    def proxy_ready(self):
+        """代理帧是否已全部生成"""
+        return self._proxy_count >= len(self._proxies)
+
+    @property
+    def proxy_progress(self):
+        """代理帧生成进度（0~1）"""
+        return self._proxy_count / len(self._proxies) if self._proxies else 1.0
+
+    def _build_proxies(self):
+        """后台线程：建立关键帧索引，然后顺序解码生成代理帧"""
+        self.keyframes = build_keyframe_index(self.video_path, self._stop_event)
+
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            for frame_num in range(self.total_frames):
+                if self._stop_event.is_set():
+                    return
+                if frame_num % self.proxy_step:
+                    if not cap.grab():
+                        break
+                    continue
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                height, width = frame.shape[:2]
+                scale = min(1.0, PROXY_MAX_SIDE / max(height, width))
+                if scale < 1.0:
+                    frame = cv2.resize(frame, (int(width * scale), int(height * scale)),
+                                       interpolation=cv2.INTER_AREA)
+                ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, PROXY_JPEG_QUALITY])
+                if ok:
+                    self._proxies[frame_num // self.proxy_step] = data
+
+                self._proxy_count = frame_num // self.proxy_step + 1
+        finally:
+            cap.release()
+            # 实际帧数可能少于元数据帧数，提前结束时也视为完成
+            self._proxy_count = len(self._proxies)
+
+    def get_proxy(self, frame_num):
+        """返回最接近 frame_num 的已生成代理帧（RGB），还没有生成时返回 None"""
+        # 不加锁：后台可能正在长时间解码全分辨率帧，拖动时不能等待（dict 读取本身是原子的）
+        full = self._full_cache.get(frame_num)
+        if full is not None:
+            return full
+
+        index = min(frame_num // self.proxy_step, len(self._proxies) - 1)
+        if index < 0:
+            return None
+        data = self._proxies[index]
+        if data is None:
+            return None
+        frame = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if frame is not None else None
+
+    def get_frame(self, frame_num):
+        """解码全分辨率帧（RGB），失败返回 None"""
+        with self._lock:
+            frame = self._full_cache.get(frame_num)
+            if frame is not None:
+                self._full_cache.move_to_end(frame_num)
+                return frame
+            if self._cap is None:
+                return None
+
+            start = self._decode_start(frame_num)
+            if start != self._next_pos:
+                self._cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+                self._next_pos = start
+
+            # 从关键帧顺序解码到目标帧，只对最后 FULL_CACHE_SIZE 帧做颜色转换并缓存
+            frame = None
+            while self._next_pos <= frame_num:
+                if frame_num - self._next_pos >= FULL_CACHE_SIZE:
+                    ret = self._cap.grab()
+                    bgr = None
+                else:
+                    ret, bgr = self._cap.read()
+                if not ret:
+                    self._next_pos = -1
+                    break
+                if bgr is not None:
+                    frame = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+                    self._full_cache[self._next_pos] = frame
+                    self._full_cache.move_to_end(self._next_pos)
+                    while len(self._full_cache) > FULL_CACHE_SIZE:
+                        self._full_cache.popitem(last=False)
+                self._next_pos += 1
+            return frame if self._next_pos == frame_num + 1 else None
+
+    def _decode_start(self, frame_num):
+        """选择解码起点：能从当前位置顺序解码就不定位，否则定位到目标帧所在 GOP 的关键帧"""
+        if self.keyframes:
+            keyframe = self.keyframes[max(0, bisect.bisect_right(self.keyframes, frame_num) - 1)]
+            if 0 <= keyframe <= self._next_pos <= frame_num:
+                return self._next_pos
+            return keyframe
+        if 0 <= frame_num - self._next_pos <= SEQUENTIAL_GRAB_LIMIT:
+            return self._next_pos
+        return frame_num
+
+    def close(self):
+        """停止后台解码并释放解码器（替换视频文件前必须调用，之后还要在后台线程中调用 wait_closed）
+
+        不等待后台线程：它会在当前帧解码完成（或 ffprobe 被结束）后自行退出并释放自己的解码器，
+        因此可以在界面线程中直接调用。
+        """
+        self._stop_event.set()
+        with self._lock:
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
+            self._full_cache.clear()
+        self._proxies = [None] * len(self._proxies)
+
+    def wait_closed(self, timeout=None):
+        """等待代理帧线程退出（它持有自己的解码器，Windows 下退出前无法替换视频文件）
+
+        不要在界面线程中调用。
+
+        Returns:
+            bool: 线程是否已退出
+        """
+        self._proxy_thread.join(timeout)
+        return not self._proxy_thread.is_alive()
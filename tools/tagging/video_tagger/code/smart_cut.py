@@ -0,0 +1,270 @@
+# Smart Cut Module - 快速剪辑模块
+# 使用 ffmpeg 按帧号剪辑视频片段（保留音频）：
+#   - 起止点正好是关键帧：直接流复制
+#   - 否则：只重新编码首尾不完整的 GOP，中间部分流复制后拼接
+#   - 编码格式或 profile 不支持拼接、片段过短：整段重新编码
+#   - 智能剪辑时音频按片段起止时间重新编码为 AAC（流复制只能在音频包边界截断）
+
+import os
+import json
+import shutil
+import bisect
+import tempfile
+import subprocess
+
+# 可中断的 ffprobe 检查停止信号的间隔（秒）
+PROBE_POLL_INTERVAL = 0.2
+
+
+class ProbeCancelled(Exception):
+    """ffprobe 被 stop_event 中断"""
+
+# 支持智能拼接的编码格式：编码器与转换为 Annex B 的比特流过滤器
+SMART_CUT_ENCODERS = {
+    "h264": ("libx264", "h264_mp4toannexb"),
+    "hevc": ("libx265", "hevc_mp4toannexb"),
+}
+
+# ffprobe 输出的 profile 名称 -> 编码器的 -profile:v 参数
+# 重新编码的首尾片段必须与流复制部分的 profile / level 一致，否则拼接后的 mp4 只有一份
+# 参数集（avcC / hvcC），播放器会花屏；不在表中的 profile 改为整段重新编码
+SMART_CUT_PROFILES = {
+    "h264": {
+        "Constrained Baseline": "baseline",
+        "Baseline": "baseline",
+        "Main": "main",
+        "High": "high",
+        "High 10": "high10",
+        "High 4:2:2": "high422",
+        "High 4:4:4 Predictive": "high444",
+    },
+    "hevc": {
+        "Main": "main",
+        "Main 10": "main10",
+    },
+}
+
+
+def is_ffmpeg_available():
+    """检查 ffmpeg 和 ffprobe 是否可用"""
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def _parse_rate(rate):
+    """解析 "30000/1001" 形式的帧率"""
+    try:
+        num, den = rate.split("/")
+        return float(num) / float(den) if float(den) else 0.0
+    except (ValueError, AttributeError):
+        return 0.0
+
+
+def _run_probe(cmd, stop_event=None):
+    """运行 ffprobe 并返回 (退出码, 标准输出, 错误输出)；stop_event 被设置时结束进程并抛出 ProbeCancelled"""
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               encoding='utf-8', errors='ignore')
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=PROBE_POLL_INTERVAL if stop_event else None)
+            return process.returncode, stdout, stderr
+        except subprocess.TimeoutExpired:
+            if stop_event.is_set():
+                process.kill()
+                process.communicate()
+                raise ProbeCancelled()
+
+
+def probe_video(video_path, stop_event=None):
+    """读取视频流参数和每帧时间戳（只读取数据包，不解码）
+
+    Args:
+        stop_event: threading.Event，设置后立即结束 ffprobe（长视频的数据包扫描可能需要数秒）
+
+    Returns:
+        dict: {"codec", "profile", "level", "pix_fmt", "fps", "has_audio", "frame_times", "keyframe_times"}
+              时间戳均已减去文件起始时间，与 ffmpeg -ss 的时间轴一致
+    """
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "stream=codec_name,profile,level,pix_fmt,avg_frame_rate,r_frame_rate",
+           "-show_entries", "packet=pts_time,flags",
+           "-show_entries", "format=start_time",
+           "-of", "json", video_path]
+    returncode, stdout, stderr = _run_probe(cmd, stop_event)
+    if returncode != 0:
+        raise RuntimeError(stderr.strip() or "ffprobe 读取失败")
+    info = json.loads(stdout)
+
+    stream = info["streams"][0]
+    fps = _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate"))
+    try:
+        start_time = float(info.get("format", {}).get("start_time", 0))
+    except ValueError:
+        start_time = 0.0
+
+    packets = info.get("packets", [])
+    if all(p.get("pts_time") not in (None, "N/A") for p in packets):
+        times = [float(p["pts_time"]) - start_time for p in packets]
+    else:
+        # 部分容器（如 AVI）没有 pts，按包顺序和帧率推算
+        times = [i / fps for i in range(len(packets))] if fps else []
+    keyframe_times = sorted(t for t, p in zip(times, packets) if "K" in p.get("flags", ""))
+
+    _, audio_streams, _ = _run_probe(["ffprobe", "-v", "error", "-select_streams", "a",
+                                      "-show_entries", "stream=index", "-of", "csv=p=0", video_path],
+                                     stop_event)
+
+    return {
+        "codec": stream.get("codec_name"),
+        "profile": stream.get("profile"),
+        "level": stream.get("level"),
+        "pix_fmt": stream.get("pix_fmt") or "yuv420p",
+        "fps": fps,
+        "has_audio": bool(audio_streams.strip()),
+        "frame_times": sorted(times),
+        "keyframe_times": keyframe_times,
+    }
+
+
+def _run_ffmpeg(cmd, duration, on_progress=None, base=0.0, weight=1.0):
+    """运行 ffmpeg，解析 -progress 输出并按 base + weight * 完成比例回调进度"""
+    cmd = cmd[:1] + ["-y", "-v", "error", "-nostats", "-progress", "pipe:1"] + cmd[1:]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               encoding='utf-8', errors='ignore')
+    for line in process.stdout:
+        key, _, value = line.strip().partition("=")
+        if key == "out_time_us" and on_progress and duration > 0:
+            try:
+                done = min(1.0, int(value) / 1e6 / duration)
+            except ValueError:
+                continue
+            on_progress(base + weight * done)
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise RuntimeError(stderr.strip() or f"ffmpeg 退出码 {process.returncode}")
+    if on_progress:
+        on_progress(base + weight)
+
+
+def _count_frames(frame_times, start_time, end_time, tolerance):
+    """统计时间范围 [start_time, end_time) 内的帧数"""
+    lo = bisect.bisect_left(frame_times, start_time - tolerance)
+    hi = bisect.bisect_left(frame_times, end_time - tolerance)
+    return max(0, hi - lo)
+
+
+def _matching_encoder_args(info):
+    """返回使重新编码部分与源视频 profile / level 一致的编码参数，无法匹配时返回 None"""
+    profile = SMART_CUT_PROFILES.get(info["codec"], {}).get(info.get("profile"))
+    try:
+        level = int(info.get("level"))
+    except (TypeError, ValueError):
+        return None
+    if profile is None or level <= 0:
+        return None
+    if info["codec"] == "h264":
+        # ffprobe 的 H.264 level 为 level * 10（1b 为 9）
+        level_text = "1b" if level == 9 else f"{level / 10:.1f}"
+        return ["-profile:v", profile, "-level", level_text]
+    # HEVC 的 level 为 level * 30
+    return ["-profile:v", profile, "-x265-params", f"level-idc={level / 30:.1f}"]
+
+
+def cut_clip(video_path, start_frame, end_frame, output_path, on_progress=None, crf=16):
+    """剪辑第 start_frame 到 end_frame 帧（含）到 output_path
+
+    只有编码格式和 profile 能与重新编码部分匹配时才使用智能剪辑，否则整段重新编码。
+    整段流复制时音频也流复制；智能剪辑和整段重新编码时音频重新编码为 AAC。
+
+    Args:
+        on_progress: 进度回调 (fraction: 0~1)
+        crf: 需要重新编码部分的质量参数
+
+    Returns:
+        str: 使用的方式 "copy" / "smart" / "reencode"
+    """
+    info = probe_video(video_path)
+    frame_times = info["frame_times"]
+    if not frame_times:
+        raise RuntimeError("无法读取视频帧时间戳")
+
+    end_frame = min(end_frame, len(frame_times) - 1)
+    start_time = frame_times[start_frame]
+    frame_duration = 1.0 / info["fps"] if info["fps"] else 0.04
+    at_video_end = end_frame + 1 >= len(frame_times)
+    end_time = frame_times[end_frame] + frame_duration if at_video_end else frame_times[end_frame + 1]
+    duration = end_time - start_time
+    tolerance = frame_duration / 2
+
+    audio_map = ["-map", "0:a?"] if info["has_audio"] else []
+    keyframes = info["keyframe_times"]
+    # 片段内的关键帧：第一个之前和最后一个之后的画面需要重新编码，中间可以流复制
+    inner = keyframes[bisect.bisect_left(keyframes, start_time - tolerance):
+                      bisect.bisect_left(keyframes, end_time - tolerance)]
+    start_aligned = bool(inner) and abs(inner[0] - start_time) <= tolerance
+    end_aligned = at_video_end or any(abs(k - end_time) <= tolerance for k in keyframes)
+
+    # 起止点都在关键帧上：整段流复制
+    if start_aligned and end_aligned:
+        _run_ffmpeg(["ffmpeg", "-ss", f"{start_time:.6f}", "-i", video_path, "-t", f"{duration:.6f}",
+                     "-map", "0:v:0", *audio_map, "-c", "copy", "-avoid_negative_ts", "make_zero",
+                     "-frames:v", str(end_frame - start_frame + 1), output_path], duration, on_progress)
+        return "copy"
+
+    encoder = SMART_CUT_ENCODERS.get(info["codec"])
+    profile_args = _matching_encoder_args(info) if encoder else None
+    if profile_args is None or not inner:
+        # 不支持拼接的编码 / profile，或片段内没有关键帧：整段重新编码
+        _run_ffmpeg(["ffmpeg", "-ss", f"{start_time:.6f}", "-i", video_path, "-t", f"{duration:.6f}",
+                     "-map", "0:v:0", *audio_map, "-c:v", "libx264", "-preset", "veryfast",
+                     "-crf", str(crf), "-pix_fmt", "yuv420p", "-c:a", "aac", "-b:a", "192k",
+                     "-frames:v", str(end_frame - start_frame + 1), output_path], duration, on_progress)
+        return "reencode"
+
+    # 智能剪辑：首尾不完整的 GOP 重新编码，中间整 GOP 流复制，拼接后重新截取音频
+    codec_lib, annexb_filter = encoder
+    parts = []  # (是否重新编码, 开始时间, 结束时间)
+    if not start_aligned:
+        parts.append((True, start_time, inner[0]))
+    copy_end = end_time if end_aligned else inner[-1]
+    if copy_end - inner[0] > tolerance:
+        parts.append((False, inner[0], copy_end))
+    if not end_aligned:
+        parts.append((True, inner[-1], end_time))
+    # 重新编码比流复制慢得多，进度按估算耗时分配，最后 10% 留给拼接
+    costs = [(t1 - t0) * (1.0 if encode else 0.1) for encode, t0, t1 in parts]
+    total_cost = sum(costs) or 1.0
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_path))) as work_dir:
+        part_paths = []
+        base = 0.0
+        for index, ((encode, t0, t1), cost) in enumerate(zip(parts, costs)):
+            part_path = os.path.join(work_dir, f"part_{index}.ts")
+            # 流复制按解码顺序截断，-t 会多带入下一个 GOP 的数据包，用帧数精确限定
+            cmd = ["ffmpeg", "-ss", f"{t0:.6f}", "-i", video_path, "-t", f"{t1 - t0:.6f}", "-map", "0:v:0", "-an",
+                   "-frames:v", str(_count_frames(frame_times, t0, t1, tolerance))]
+            if encode:
+                cmd += ["-c:v", codec_lib, "-preset", "veryfast", "-crf", str(crf), "-pix_fmt", info["pix_fmt"],
+                        *profile_args]
+            else:
+                cmd += ["-c:v", "copy", "-bsf:v", annexb_filter]
+            weight = 0.9 * cost / total_cost
+            _run_ffmpeg(cmd + [part_path], t1 - t0, on_progress, base, weight)
+            base += weight
+            part_paths.append(part_path)
+
+        # 列表中写相对路径（相对列表文件所在目录），输出目录名中含引号等字符也不影响解析
+        list_path = os.path.join(work_dir, "list.txt")
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for part_path in part_paths:
+                f.write(f"file '{os.path.basename(part_path)}'\n")
+
+        cmd = ["ffmpeg", "-f", "concat", "-i", list_path]
+        if info["has_audio"]:
+            cmd += ["-ss", f"{start_time:.6f}", "-t", f"{duration:.6f}", "-i", video_path,
+                    "-map", "0:v:0", "-map", "1:a?", "-c:a", "aac", "-b:a", "192k"]
+        else:
+            cmd += ["-map", "0:v:0"]
+        cmd += ["-c:v", "copy", "-t", f"{duration:.6f}", output_path]
+        _run_ffmpeg(cmd, duration, on_progress, base, 1.0 - base)
+
+    return "smart"
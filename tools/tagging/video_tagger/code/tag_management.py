@@ -3,10 +3,18 @@
 
 import os
 import tkinter as tk
-from tkinter import messagebox, filedialog, simpledialog
+from tkinter import messagebox, filedialog, simpledialog, ttk
 import json
 import cv2
+import shutil
+import logging
 import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from frame_store import LazyFrameStore
+
+logger = logging.getLogger(__name__)
 
 def add_tag(self):
     # 修改获取标签文本的方式
@@ -83,6 +91,170 @@ def set_export_path(self):
         messagebox.showinfo("导出路径设置", f"已设置导出路径为：{self.export_dir}")
 
 
+def is_ffmpeg_available():
+    """检查 FFmpeg 是否可用"""
+    return shutil.which("ffmpeg") is not None
+
+
+def get_export_options(config):
+    """从 [VIDEO] 配置读取片段导出方式
+
+    Returns:
+        dict: {"mode": "ffmpeg" / "copy" / "opencv", "workers": int, "crf": int}
+    """
+    mode = config.get('VIDEO', 'export_mode', fallback='ffmpeg').lower()
+    if mode not in ('ffmpeg', 'copy', 'opencv'):
+        mode = 'ffmpeg'
+    return {
+        "mode": mode,
+        "workers": max(1, config.getint('VIDEO', 'export_workers', fallback=4)),
+        "crf": config.getint('VIDEO', 'export_crf', fallback=18),
+    }
+
+
+def _segment_output_paths(main_folder, i, tag_text):
+    """生成片段的视频与文本文件路径（已存在时追加序号）"""
+    # 生成安全的文件名，移除或替换非法字符
+    safe_tag_text = "".join(c for c in tag_text if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    # 限制文件名长度
+    safe_tag_text = safe_tag_text[:10] if len(safe_tag_text) > 10 else safe_tag_text
+    # 替换空格为下划线
+    safe_tag_text = safe_tag_text.replace(" ", "_")
+
+    # 如果处理后的标签为空，则使用默认名称
+    if not safe_tag_text:
+        safe_tag_text = "untitled"
+
+    # 生成文件名
+    filename = f"video_{i+1:03d}_{safe_tag_text}"
+    video_path = os.path.join(main_folder, f"{filename}.mp4")
+    txt_path = os.path.join(main_folder, f"{filename}.txt")
+
+    # 检查文件是否已存在，如果存在则添加序号
+    counter = 1
+    while os.path.exists(video_path) or os.path.exists(txt_path):
+        filename = f"video_{i+1:03d}_{safe_tag_text}_{counter}"
+        video_path = os.path.join(main_folder, f"{filename}.mp4")
+        txt_path = os.path.join(main_folder, f"{filename}.txt")
+        counter += 1
+    return video_path, txt_path
+
+
+def _write_segment_opencv(frames, start_frame, end_frame, export_fps, video_path):
+    """逐帧写出片段（使用预处理后的帧重新编码）"""
+    # 获取第一帧来确定尺寸
+    first_frame = frames[start_frame]
+    height, width = first_frame.shape[:2]
+
+    # 视频写入器参数：优先 H.264，不可用时回退 mp4v
+    for codec_name in ('avc1', 'mp4v'):
+        fourcc = cv2.VideoWriter_fourcc(*codec_name)
+        out = cv2.VideoWriter(video_path, fourcc, export_fps, (width, height))
+        if out.isOpened():
+            break
+        out.release()
+
+    # 写入视频帧
+    for frame_num in range(start_frame, min(end_frame + 1, len(frames))):
+        # 将 RGB 转换回 BGR
+        frame_bgr = cv2.cvtColor(frames[frame_num], cv2.COLOR_RGB2BGR)
+        out.write(frame_bgr)
+
+    out.release()
+
+
+def _write_segment_ffmpeg(store, start_frame, end_frame, export_fps, video_path, mode, crf):
+    """直接从原视频截取片段
+
+    mode 为 "copy" 时流复制（无损，起点对齐到关键帧，保持原帧率和分辨率）；
+    否则一次解码+编码，按导出帧率和预处理分辨率输出。
+    """
+    end_frame = min(end_frame, len(store) - 1)
+    start_time = store.source_time(start_frame)
+    end_time = store.segment_end_time(end_frame)
+    duration = max(end_time - start_time, 1.0 / store.source_fps)
+
+    cmd = ["ffmpeg", "-y", "-v", "error", "-ss", f"{start_time:.6f}", "-i", store.video_path,
+           "-t", f"{duration:.6f}", "-map", "0:v:0", "-an"]
+    if mode == "copy":
+        cmd += ["-c", "copy", "-avoid_negative_ts", "make_zero"]
+    else:
+        # 与预处理帧相同的分辨率（宽高取偶数以满足 yuv420p）
+        height, width = store[start_frame].shape[:2]
+        width -= width % 2
+        height -= height % 2
+        cmd += ["-vf", f"fps={export_fps},scale={width}:{height}",
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", str(crf), "-pix_fmt", "yuv420p"]
+    cmd.append(video_path)
+
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            encoding='utf-8', errors='ignore')
+    if result.returncode != 0:
+        if os.path.exists(video_path):
+            os.remove(video_path)
+        raise RuntimeError(result.stderr.strip() or f"ffmpeg 退出码 {result.returncode}")
+
+
+def write_tag_segments(frames, tags, export_fps, main_folder, mode="opencv", workers=1, crf=18):
+    """将标记片段写出为视频文件和同名文本文件
+
+    Args:
+        frames: 采样帧序列（RGB numpy array 列表或 LazyFrameStore）
+        tags: 标记列表 [{start, end, tag}]
+        export_fps: 导出帧率
+        main_folder: 导出目录
+        mode: "ffmpeg" 从原视频截取并重新编码 / "copy" 流复制 / "opencv" 逐帧写出预处理帧
+        workers: ffmpeg 模式下并行导出的片段数
+        crf: ffmpeg 重新编码的质量参数
+
+    Returns:
+        int: 成功导出的片段数
+    """
+    # 先按顺序确定所有输出文件名，再并行导出
+    segments = []
+    for i, tag in enumerate(tags):
+        if tag["start"] < len(frames):
+            video_path, txt_path = _segment_output_paths(main_folder, i, tag["tag"])
+            segments.append((tag, video_path, txt_path))
+
+    use_ffmpeg = (mode in ("ffmpeg", "copy") and isinstance(frames, LazyFrameStore)
+                  and frames.source_fps > 0 and is_ffmpeg_available())
+
+    def export_segment(segment):
+        tag, video_path, txt_path = segment
+        if use_ffmpeg:
+            try:
+                _write_segment_ffmpeg(frames, tag["start"], tag["end"], export_fps, video_path, mode, crf)
+            except Exception as e:
+                logger.warning(f"ffmpeg 导出失败，改用逐帧写出 {video_path}: {e}")
+                _write_segment_opencv(frames, tag["start"], tag["end"], export_fps, video_path)
+        else:
+            _write_segment_opencv(frames, tag["start"], tag["end"], export_fps, video_path)
+
+        # 创建标签文件
+        with open(txt_path, 'w', encoding='utf-8') as f:
+            f.write(tag["tag"])
+
+    exported = 0
+    if use_ffmpeg and workers > 1 and len(segments) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(export_segment, segment): segment for segment in segments}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    exported += 1
+                except Exception as e:
+                    logger.error(f"导出片段失败 {futures[future][1]}: {e}")
+    else:
+        for segment in segments:
+            try:
+                export_segment(segment)
+                exported += 1
+            except Exception as e:
+                logger.error(f"导出片段失败 {segment[1]}: {e}")
+    return exported
+
+
 def export_tags(self, batch_mode=False):
     """导出标签为视频片段和文本文件
 
@@ -126,67 +298,22 @@ def export_tags(self, batch_mode=False):
             messagebox.showerror("错误", "请输入有效的帧率数值")
         return
         
-    # 创建主文件夹
-    
-    # 导出每个标记片段
-    for i, tag in enumerate(self.tags):
-        start_frame = tag["start"]
-        end_frame = tag["end"]
-        tag_text = tag["tag"]
-        
-        # 获取第一帧来确定尺寸
-        if start_frame < len(self.processed_frames):
-            first_frame = self.processed_frames[start_frame]
-            height, width = first_frame.shape[:2]
-            
-            # 生成安全的文件名，移除或替换非法字符
-            safe_tag_text = "".join(c for c in tag_text if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            # 限制文件名长度
-            safe_tag_text = safe_tag_text[:10] if len(safe_tag_text) > 10 else safe_tag_text
-            # 替换空格为下划线
-            safe_tag_text = safe_tag_text.replace(" ", "_")
-            
-            # 如果处理后的标签为空，则使用默认名称
-            if not safe_tag_text:
-                safe_tag_text = "untitled"
-            
-            # 生成文件名
-            filename = f"video_{i+1:03d}_{safe_tag_text}"
-            video_path = os.path.join(main_folder, f"{filename}.mp4")
-            txt_path = os.path.join(main_folder, f"{filename}.txt")
-            
-            # 检查文件是否已存在，如果存在则添加序号
-            counter = 1
-            original_video_path = video_path
-            original_txt_path = txt_path
-            while os.path.exists(video_path) or os.path.exists(txt_path):
-                filename = f"video_{i+1:03d}_{safe_tag_text}_{counter}"
-                video_path = os.path.join(main_folder, f"{filename}.mp4")
-                txt_path = os.path.join(main_folder, f"{filename}.txt")
-                counter += 1
-            
-            # 视频写入器参数：优先 H.264，不可用时回退 mp4v
-            for codec_name in ('avc1', 'mp4v'):
-                fourcc = cv2.VideoWriter_fourcc(*codec_name)
-                out = cv2.VideoWriter(video_path, fourcc, export_fps, (width, height))
-                if out.isOpened():
-                    break
-                out.release()
-            
-            # 写入视频帧
-            for frame_num in range(start_frame, min(end_frame + 1, len(self.processed_frames))):
-                # 将 RGB 转换回 BGR
-                frame_bgr = cv2.cvtColor(self.processed_frames[frame_num], cv2.COLOR_RGB2BGR)
-                out.write(frame_bgr)
-                    
-            out.release()
-            
-            # 创建标签文件
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                f.write(tag_text)
-    
+    # 起始帧超出视频范围的标记不会导出
+    expected = sum(1 for tag in self.tags if tag["start"] < len(self.processed_frames))
+    exported = write_tag_segments(self.processed_frames, self.tags, export_fps, main_folder,
+                                  **get_export_options(self.config))
+    if exported < expected:
+        logger.warning(f"{expected - exported} 个标记片段导出失败")
+
     if not batch_mode:
-        messagebox.showinfo("完成", f"已导出 {len(self.tags)} 个标记片段到：{main_folder}")
+        if exported == 0 and expected > 0:
+            messagebox.showerror("错误", f"全部 {expected} 个标记片段导出失败，详情见日志")
+        elif exported < expected:
+            messagebox.showwarning("部分完成",
+                                   f"已导出 {exported}/{expected} 个标记片段到：{main_folder}\n"
+                                   f"{expected - exported} 个片段导出失败，详情见日志")
+        else:
+            messagebox.showinfo("完成", f"已导出 {exported} 个标记片段到：{main_folder}")
 
 
 def load_tag_records(self):
@@ -252,70 +379,75 @@ def regenerate_all_tags(self):
         messagebox.showinfo("提示", "没有标签需要重新生成")
         return
 
-    # 启动新线程执行重新生成任务
-    thread = threading.Thread(target=self._regenerate_all_tags_thread)
-    thread.daemon = True
-    thread.start()
-
-
-def _regenerate_all_tags_thread(self):
-    """在新线程中执行重新生成所有标签的任务"""
-    # 显示进度窗口
+    # 显示进度窗口（在主线程创建）
     progress_window = tk.Toplevel(self.root)
     progress_window.title("重新生成标签")
-    progress_window.geometry("400x100")
+    progress_window.geometry("400x120")
     progress_window.transient(self.root)
-    
+
     # 将窗口居中显示
     progress_window.update_idletasks()
     x = (progress_window.winfo_screenwidth() // 2) - (400 // 2)
-    y = (progress_window.winfo_screenheight() // 2) - (100 // 2)
-    progress_window.geometry(f"400x100+{x}+{y}")
-    
-    tk.Label(progress_window, text="正在重新生成所有标签...", font=self.font).pack(pady=20)
-    
-    success = False
+    y = (progress_window.winfo_screenheight() // 2) - (120 // 2)
+    progress_window.geometry(f"400x120+{x}+{y}")
+
+    progress_label = tk.Label(progress_window, text="正在重新生成所有标签...", font=self.font)
+    progress_label.pack(pady=15)
+    progress_bar = ttk.Progressbar(progress_window, mode='determinate', length=300, maximum=len(self.tags))
+    progress_bar.pack()
+
+    # 提示词只能在主线程读取
+    user_prompt = self.ai_prompt_entry.get("1.0", tk.END).strip()
+
+    # 启动新线程执行重新生成任务
+    thread = threading.Thread(target=self._regenerate_all_tags_thread,
+                              args=(progress_window, progress_label, progress_bar, user_prompt))
+    thread.daemon = True
+    thread.start()
+
+
+def _regenerate_all_tags_thread(self, progress_window, progress_label, progress_bar, user_prompt):
+    """在后台线程中并发重新生成所有标签，按原顺序逐个更新列表"""
     try:
         original_tags = self.tags.copy()  # 保存原始标签
-        
+        total = len(original_tags)
+        ranges = [(tag_info["start"], tag_info["end"]) for tag_info in original_tags]
+
         # 清空原标签列表和列表框显示
         self.tags.clear()
         self.root.after(0, lambda: self.tag_listbox.delete(0, tk.END))
-        
-        for idx, tag_info in enumerate(original_tags):
-            start_frame = tag_info["start"]
-            end_frame = tag_info["end"]
-            print(f"正在处理帧 {start_frame}-{end_frame}")
-            # 设置当前帧范围
-            self.start_frame = start_frame
-            self.end_frame = end_frame
-            
-            # 调用 AI 生成新标签
-            new_caption = self._generate_single_tag_caption()
-            
+
+        def on_result(idx, new_caption):
+            start_frame, end_frame = ranges[idx]
             if new_caption:  # 如果成功生成了新标签
-                # 创建新的标签信息并添加到标签列表
-                new_tag_info = {
-                    "start": start_frame,
-                    "end": end_frame,
-                    "tag": new_caption
-                }
-                self.tags.append(new_tag_info)
                 print(f"已添加新标签：{new_caption}")
-                # 更新列表框中的显示
-                self.root.after(0, lambda s=start_frame, e=end_frame, c=new_caption: 
-                               self.tag_listbox.insert(tk.END, f"帧 {s}-{e}: {c}"))
-                # 清空已选中的开始和结束点
-                self.start_frame = 0
-                self.end_frame = 0
-        
+                caption = new_caption
+            else:
+                # 生成失败时保留原标签
+                print(f"帧 {start_frame}-{end_frame} 重新生成失败，保留原标签")
+                caption = original_tags[idx]["tag"]
+            self.tags.append({"start": start_frame, "end": end_frame, "tag": caption})
+
+            # 更新列表框和进度显示
+            def update(s=start_frame, e=end_frame, c=caption, done=idx + 1):
+                self.tag_listbox.insert(tk.END, f"帧 {s}-{e}: {c}")
+                if progress_window.winfo_exists():
+                    progress_bar['value'] = done
+                    progress_label.config(text=f"正在重新生成标签 {done}/{total}...")
+            self.root.after(0, update)
+
+        self.regenerate_segment_captions(ranges, user_prompt, on_result=on_result)
+
+        # 清空已选中的开始和结束点
+        self.start_frame = 0
+        self.end_frame = 0
+
         # 完成后更新 UI
         def finish_regeneration():
             messagebox.showinfo("完成", "所有标签重新生成完成")
             progress_window.destroy()
-        
+
         self.root.after(0, finish_regeneration)
-        success = True
 
     except Exception as e:
         error_msg = str(e)
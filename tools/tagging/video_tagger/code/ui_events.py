@@ -43,6 +43,7 @@ def show_tag_context_menu(self, event):
 def on_closing(self):
     if self.cap:
         self.cap.release()
+    self._release_frame_store()
     self.root.destroy()
 
 
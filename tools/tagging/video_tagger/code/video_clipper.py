@@ -6,6 +6,27 @@ from PIL import Image, ImageTk
 import threading
 import numpy as np
 import time
+import logging
+
+import smart_cut
+from scrub_cache import ScrubFrameCache
+
+logger = logging.getLogger(__name__)
+
+# 导出方式说明
+EXPORT_METHOD_LABELS = {
+    "copy": "关键帧流复制",
+    "smart": "边界 GOP 重新编码 + 流复制",
+    "reencode": "ffmpeg 重新编码",
+    "opencv": "逐帧重新编码，无音频",
+}
+
+# 拖动进度条停下多久后解码全分辨率帧（毫秒）
+SCRUB_SETTLE_DELAY_MS = 120
+# 代理帧生成进度的刷新间隔（毫秒）
+PROXY_POLL_INTERVAL_MS = 200
+# 替换原文件前等待预览解码线程退出的最长时间（秒）
+CACHE_CLOSE_TIMEOUT = 10
 
 class VideoClipper:
     def __init__(self, root):
@@ -23,7 +44,6 @@ class VideoClipper:
         
         # 视频相关变量
         self.video_path = ""
-        self.cap = None
         self.total_frames = 0
         self.fps = 0
         self.current_frame = 0
@@ -34,8 +54,11 @@ class VideoClipper:
         self.start_frame = 0
         self.end_frame = 0
         
-        # 帧缓存（预加载所有帧）
-        self.frames_cache = []
+        # 帧缓存（拖动时使用低分辨率代理帧，停下后解码全分辨率帧）
+        self.frame_cache = None
+        self._settle_job = None
+        self._settle_generation = 0
+        self._proxy_poll_job = None
         
         # 字体设置
         self.font = ("Microsoft YaHei", 10)
@@ -121,60 +144,39 @@ class VideoClipper:
         self.root.bind('<Key-Right>', self.next_frame)
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
-    def load_video(self):
-        """加载视频文件"""
-        file_path = filedialog.askopenfilename(
-            title="选择视频文件",
-            filetypes=[("视频文件", "*.mp4 *.avi *.mov *.mkv"), ("所有文件", "*.*")]
-        )
+    def load_video(self, file_path=None, show_message=True):
+        """加载视频文件（不预加载帧，后台生成拖动用的代理帧）"""
+        if file_path is None:
+            file_path = filedialog.askopenfilename(
+                title="选择视频文件",
+                filetypes=[("视频文件", "*.mp4 *.avi *.mov *.mkv"), ("所有文件", "*.*")]
+            )
         if not file_path:
             return
         
-        self.video_path = file_path
-        self.cap = cv2.VideoCapture(self.video_path)
-        
-        if not self.cap.isOpened():
+        cap = cv2.VideoCapture(file_path)
+        if not cap.isOpened():
             messagebox.showerror("错误", "无法打开视频文件")
             return
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        cap.release()
         
-        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.fps = int(self.cap.get(cv2.CAP_PROP_FPS))
+        self.playing = False
+        self._release_frame_cache()
+        self.video_path = file_path
+        self.total_frames = total_frames
+        self.fps = fps
         self.current_frame = 0
         self.start_frame = 0
         self.end_frame = self.total_frames - 1
         
-        # 创建加载进度窗口
-        progress_window = tk.Toplevel(self.root)
-        progress_window.title("加载视频中...")
-        progress_window.geometry("300x100")
-        progress_window.transient(self.root)
-        progress_window.grab_set()
-        
-        progress_label = tk.Label(progress_window, text=f"加载进度：0/{self.total_frames}", font=self.font)
-        progress_label.pack(pady=10)
-        progress_bar = ttk.Progressbar(progress_window, length=250, mode='determinate')
-        progress_bar.pack(pady=5)
-        progress_bar["maximum"] = self.total_frames
-        
-        # 预加载所有帧到缓存（带进度显示）
-        self.frames_cache = []
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        
-        for i in range(self.total_frames):
-            ret, frame = self.cap.read()
-            if ret:
-                self.frames_cache.append(frame)
-            else:
-                self.frames_cache.append(None)
-            
-            # 更新进度
-            progress_label.config(text=f"加载进度：{i+1}/{self.total_frames}")
-            progress_bar["value"] = i + 1
-            if i % 10 == 0:
-                self.root.update_idletasks()
-        
-        # 关闭进度窗口
-        progress_window.destroy()
+        try:
+            self.frame_cache = ScrubFrameCache(self.video_path, self.total_frames)
+        except IOError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        self._proxy_poll_job = self.root.after(PROXY_POLL_INTERVAL_MS, self._poll_proxy_progress)
         
         # 更新 UI 状态
         self.play_btn.config(state=tk.NORMAL)
@@ -184,12 +186,13 @@ class VideoClipper:
         self.set_end_btn.config(state=tk.NORMAL)
         self.export_btn.config(state=tk.NORMAL)
         self.progress.config(state=tk.NORMAL, to=self.total_frames - 1)
-        self.frame_label.config(text=f"帧：0/{self.total_frames - 1}")
         
         # 更新起止帧标记
         self.update_markers()
         
         self.show_frame(0)
+        if not show_message:
+            return
         messagebox.showinfo("成功", f"视频加载成功\n总帧数：{self.total_frames}\n帧率：{self.fps} FPS")
 
     def update_markers(self):
@@ -227,18 +230,54 @@ class VideoClipper:
         # 绑定 Canvas 大小变化事件
         self.marker_canvas.bind("<Configure>", lambda e: self.update_markers())
 
-    def show_frame(self, frame_num):
-        """显示指定帧"""
-        if not self.frames_cache or frame_num >= len(self.frames_cache):
+    def show_frame(self, frame_num, scrub=False):
+        """显示指定帧
+        
+        scrub=True 时（拖动进度条、逐帧后退）先显示内存中的代理帧，
+        停下 SCRUB_SETTLE_DELAY_MS 毫秒后再在后台解码全分辨率帧替换
+        """
+        if self.frame_cache is None or not 0 <= frame_num < self.total_frames:
             return
         
-        frame = self.frames_cache[frame_num]
+        self.current_frame = frame_num
+        self._settle_generation += 1
+        if self._settle_job is not None:
+            self.root.after_cancel(self._settle_job)
+            self._settle_job = None
+        
+        frame = self.frame_cache.get_proxy(frame_num) if scrub else None
         if frame is None:
-            return
+            # 非拖动或代理帧尚未生成：直接解码全分辨率帧
+            frame = self.frame_cache.get_frame(frame_num)
+        else:
+            generation = self._settle_generation
+            self._settle_job = self.root.after(SCRUB_SETTLE_DELAY_MS,
+                                               lambda: self._settle_frame(frame_num, generation))
+        
+        if frame is not None:
+            self._display_frame(frame)
+        self._update_frame_label()
+        self.progress.set(frame_num)
+
+    def _settle_frame(self, frame_num, generation):
+        """拖动停止后，在后台线程解码全分辨率帧"""
+        self._settle_job = None
+        frame_cache = self.frame_cache
         
-        # 转换颜色空间
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        def decode():
+            frame = frame_cache.get_frame(frame_num)
+            if frame is not None:
+                self.root.after(0, lambda: self._show_settled_frame(frame, generation))
         
+        threading.Thread(target=decode, daemon=True).start()
+
+    def _show_settled_frame(self, frame, generation):
+        """显示后台解码完成的全分辨率帧（期间又移动过进度条则丢弃）"""
+        if generation == self._settle_generation:
+            self._display_frame(frame)
+
+    def _display_frame(self, frame):
+        """将 RGB 帧缩放后显示在画布中央"""
         # 获取画布尺寸
         canvas_width = self.video_canvas.winfo_width()
         canvas_height = self.video_canvas.winfo_height()
@@ -264,11 +303,37 @@ class VideoClipper:
         y = (canvas_height - new_height) // 2
         self.video_canvas.create_image(x, y, anchor=tk.NW, image=imgtk)
         self.video_canvas.image = imgtk
-        
-        # 更新帧号显示
-        self.current_frame = frame_num
-        self.frame_label.config(text=f"帧：{frame_num}/{self.total_frames - 1}")
-        self.progress.set(frame_num)
+
+    def _update_frame_label(self):
+        """更新帧号显示（代理帧未生成完时附带进度）"""
+        if self.frame_cache is None:
+            return
+        text = f"帧：{self.current_frame}/{self.total_frames - 1}"
+        if not self.frame_cache.proxy_ready:
+            text += f"（预览生成中 {self.frame_cache.proxy_progress:.0%}）"
+        self.frame_label.config(text=text)
+
+    def _poll_proxy_progress(self):
+        """定时读取代理帧生成进度（后台线程不直接调用 Tk）"""
+        self._proxy_poll_job = None
+        if self.frame_cache is None:
+            return
+        self._update_frame_label()
+        if not self.frame_cache.proxy_ready:
+            self._proxy_poll_job = self.root.after(PROXY_POLL_INTERVAL_MS, self._poll_proxy_progress)
+
+    def _release_frame_cache(self):
+        """停止后台解码并释放视频文件占用"""
+        self._settle_generation += 1
+        if self._settle_job is not None:
+            self.root.after_cancel(self._settle_job)
+            self._settle_job = None
+        if self._proxy_poll_job is not None:
+            self.root.after_cancel(self._proxy_poll_job)
+            self._proxy_poll_job = None
+        if self.frame_cache is not None:
+            self.frame_cache.close()
+            self.frame_cache = None
 
     def toggle_play(self):
         """播放/暂停视频"""
@@ -284,7 +349,7 @@ class VideoClipper:
     def _play_video_thread(self):
         """播放视频线程"""
         while self.playing and self.current_frame < self.total_frames:
-            if not self.frames_cache:
+            if self.frame_cache is None:
                 break
             
             self.current_frame += 1
@@ -304,14 +369,14 @@ class VideoClipper:
 
     def prev_frame(self, event=None):
         """上一帧"""
-        if not self.frames_cache:
+        if self.frame_cache is None:
             return
         if self.current_frame > 0:
-            self.show_frame(self.current_frame - 1)
+            self.show_frame(self.current_frame - 1, scrub=True)
 
     def next_frame(self, event=None):
         """下一帧"""
-        if not self.frames_cache:
+        if self.frame_cache is None:
             return
         if self.current_frame < self.total_frames - 1:
             self.show_frame(self.current_frame + 1)
@@ -340,14 +405,15 @@ class VideoClipper:
 
     def on_progress_change(self, value):
         """进度条改变事件"""
-        if not self.frames_cache:
+        if self.frame_cache is None:
             return
         frame_num = int(float(value))
-        self.show_frame(frame_num)
+        if frame_num != self.current_frame:
+            self.show_frame(frame_num, scrub=True)
 
     def export_clip(self):
         """导出剪辑片段（替换原文件）"""
-        if not self.frames_cache:
+        if self.frame_cache is None:
             messagebox.showerror("错误", "请先加载视频")
             return
         
@@ -363,21 +429,82 @@ class VideoClipper:
         if not confirm:
             return
         
+        # 进度窗口在主线程创建，导出线程通过 root.after 更新
+        total_frames = self.end_frame - self.start_frame + 1
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title("保存视频中...")
+        progress_window.geometry("300x100")
+        progress_window.transient(self.root)
+        progress_window.grab_set()
+        
+        progress_label = tk.Label(progress_window, text=f"进度：0/{total_frames}", font=self.font)
+        progress_label.pack(pady=10)
+        progress_bar = ttk.Progressbar(progress_window, length=250, mode='determinate')
+        progress_bar.pack(pady=5)
+        progress_bar["maximum"] = total_frames
+        
+        # 释放原视频文件占用（停止播放和后台预览解码）
+        self.playing = False
+        closed_cache = self.frame_cache
+        self._release_frame_cache()
+        
         # 创建导出线程
-        export_thread = threading.Thread(target=self._export_clip_thread, daemon=True)
+        export_thread = threading.Thread(target=self._export_clip_thread,
+                                         args=(progress_window, progress_label, progress_bar, closed_cache),
+                                         daemon=True)
         export_thread.start()
 
-    def _export_clip_thread(self):
-        """导出剪辑片段线程（替换原文件）"""
-        progress_window = None
+    def _update_export_progress(self, progress_window, progress_label, progress_bar, done, total):
+        """在主线程中更新导出进度窗口"""
+        if not progress_window.winfo_exists():
+            return
+        progress_label.config(text=f"进度：{done}/{total}")
+        progress_bar["value"] = done
+
+    def _write_clip_opencv(self, temp_path, report_progress):
+        """从原视频顺序读取剪辑区间并写入 mp4v 视频（无音频），返回写入帧数"""
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            raise RuntimeError("无法获取视频参数！")
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        
+        # 创建视频写入器
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        out = cv2.VideoWriter(temp_path, fourcc, self.fps, (frame_width, frame_height))
+        if not out.isOpened():
+            cap.release()
+            raise RuntimeError("无法创建输出视频文件！")
+        
+        # 定位到开始帧后顺序写入指定帧区间
+        frames_written = 0
+        cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+        for _ in range(self.start_frame, self.end_frame + 1):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            out.write(frame)
+            frames_written += 1
+            if frames_written % 10 == 0:
+                report_progress(frames_written)
+        out.release()
+        cap.release()
+        return frames_written
+
+    def _export_clip_thread(self, progress_window, progress_label, progress_bar, closed_cache=None):
+        """导出剪辑片段线程（替换原文件）
+        
+        ffmpeg 可用时按关键帧快速剪辑（保留音频），否则用 OpenCV 逐帧重新编码。
+        closed_cache 为导出前关闭的帧缓存，替换原文件前等待其后台线程释放文件。
+        """
         temp_path = None
+        total_frames = self.end_frame - self.start_frame + 1
+        
+        def report_progress(done):
+            self.root.after(0, lambda d=done: self._update_export_progress(
+                progress_window, progress_label, progress_bar, d, total_frames))
         
         try:
-            # 释放原视频文件占用
-            if self.cap is not None:
-                self.cap.release()
-                self.cap = None
-            
             # 获取视频目录和文件名
             video_dir = os.path.dirname(self.video_path)
             video_name = os.path.basename(self.video_path)
@@ -385,60 +512,21 @@ class VideoClipper:
             # 创建临时文件名
             temp_path = os.path.join(video_dir, f"_temp_{video_name}")
             
-            # 获取视频参数（从缓存中获取第一帧）
-            if self.frames_cache and self.frames_cache[0] is not None:
-                frame_height, frame_width = self.frames_cache[0].shape[:2]
-            else:
-                self.root.after(0, lambda: messagebox.showerror("错误", "无法获取视频参数！"))
-                return
-            
-            fps = self.fps
-            
-            # 创建视频写入器
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(temp_path, fourcc, fps, (frame_width, frame_height))
-            
-            if not out.isOpened():
-                self.root.after(0, lambda: messagebox.showerror("错误", "无法创建输出视频文件！"))
-                return
-            
-            # 计算总帧数
-            total_frames = self.end_frame - self.start_frame + 1
-            
-            # 创建进度窗口
-            progress_window = tk.Toplevel(self.root)
-            progress_window.title("保存视频中...")
-            progress_window.geometry("300x100")
-            progress_window.transient(self.root)
-            progress_window.grab_set()
-            
-            progress_label = tk.Label(progress_window, text=f"进度：0/{total_frames}", font=self.font)
-            progress_label.pack(pady=10)
-            progress_bar = ttk.Progressbar(progress_window, length=250, mode='determinate')
-            progress_bar.pack(pady=5)
-            progress_bar["maximum"] = total_frames
-            
-            # 从缓存写入指定帧区间
-            frames_written = 0
-            
-            self.root.after(0, lambda: self.root.update())
-            
-            for frame_num in range(self.start_frame, self.end_frame + 1):
-                if frame_num < len(self.frames_cache) and self.frames_cache[frame_num] is not None:
-                    out.write(self.frames_cache[frame_num])
-                    frames_written += 1
-                    
-                    # 更新进度
-                    progress_label.config(text=f"进度：{frames_written}/{total_frames}")
-                    progress_bar["value"] = frames_written
-                    if frames_written % 10 == 0:
-                        self.root.after(0, lambda: self.root.update())
-            
-            out.release()
+            method = None
+            if smart_cut.is_ffmpeg_available():
+                try:
+                    method = smart_cut.cut_clip(
+                        self.video_path, self.start_frame, self.end_frame, temp_path,
+                        on_progress=lambda fraction: report_progress(int(fraction * total_frames)))
+                    frames_written = total_frames
+                except Exception as e:
+                    logger.warning(f"ffmpeg 快速剪辑失败，改用逐帧导出：{e}")
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
             
-            # 关闭进度窗口
-            if progress_window:
-                self.root.after(0, lambda: progress_window.destroy())
+            if method is None:
+                method = "opencv"
+                frames_written = self._write_clip_opencv(temp_path, report_progress)
             
             if frames_written == 0:
                 self.root.after(0, lambda: messagebox.showerror("错误", "未能写入任何帧！"))
@@ -447,35 +535,29 @@ class VideoClipper:
                 return
             
             # 删除原文件，重命名临时文件（替换原视频）
-            os.remove(self.video_path)
-            os.rename(temp_path, self.video_path)
-            
-            # 重新加载视频
-            self.root.after(0, lambda: self.load_video())
+            if closed_cache is not None and not closed_cache.wait_closed(CACHE_CLOSE_TIMEOUT):
+                logger.warning("预览解码线程仍未退出，替换原文件可能失败")
+            os.replace(temp_path, self.video_path)
             
             # 更新 UI
+            method_text = EXPORT_METHOD_LABELS.get(method, method)
             self.root.after(0, lambda: messagebox.showinfo("成功", 
-                f"视频已保存并替换！\n{self.video_path}\n共保存 {frames_written} 帧"))
+                f"视频已保存并替换！\n{self.video_path}\n共保存 {frames_written} 帧（{method_text}）"))
             
         except Exception as e:
             # 清理临时文件
             if temp_path and os.path.exists(temp_path):
                 os.remove(temp_path)
-            self.root.after(0, lambda: messagebox.showerror("错误", f"保存视频时出错:\n{str(e)}"))
+            self.root.after(0, lambda e=e: messagebox.showerror("错误", f"保存视频时出错:\n{str(e)}"))
         finally:
-            # 确保进度窗口被关闭
-            if progress_window:
-                try:
-                    self.root.after(0, lambda: progress_window.destroy())
-                except:
-                    pass
+            # 确保进度窗口被关闭，并重新加载（替换后的）视频
+            self.root.after(0, lambda: progress_window.winfo_exists() and progress_window.destroy())
+            self.root.after(0, lambda: self.load_video(self.video_path, show_message=False))
 
     def on_closing(self):
         """关闭窗口事件"""
-        if self.cap is not None:
-            self.cap.release()
         self.playing = False
-        self.frames_cache = []
+        self._release_frame_cache()
         self.root.destroy()
 
 
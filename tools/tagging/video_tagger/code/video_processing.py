@@ -6,7 +6,8 @@ import os
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from PIL import Image, ImageTk
-import threading
+
+from frame_store import LazyFrameStore, compute_frame_interval
 
 
 def load_video_manager(self):
@@ -145,7 +146,7 @@ def load_selected_video(self):
     self.current_frame = 0
 
     # 清空之前处理的帧
-    self.processed_frames = []
+    _release_frame_store(self)
     self.frames_loaded = False
     self.tags = []  # 清空标记
     self.excluded_segments = []  # 清空排除片段
@@ -245,10 +246,10 @@ def play_video(self):
 
 
 def preprocess_frames(self, silent=False):
-    """预处理所有视频帧并存储为图片
+    """建立采样帧存储（按需解码，不再预先解码全部帧）
 
     Args:
-        silent: True 时跳过所有 UI 操作（不创建窗口/不更新主界面），适用于批量处理
+        silent: True 时跳过所有 UI 操作（不弹出错误窗口/不更新主界面），适用于批量处理
     """
     if not self.cap:
         return
@@ -257,121 +258,47 @@ def preprocess_frames(self, silent=False):
     target_fps = self.config.getint('PROCESSING', 'target_frame_rate', fallback=24)
 
     # 计算帧采样间隔
-    if self.fps > target_fps:
-        frame_interval = self.fps / target_fps
-        effective_fps = target_fps
-    else:
-        frame_interval = 1
-        effective_fps = self.fps
+    frame_interval, effective_fps = compute_frame_interval(self.fps, target_fps)
 
     if silent:
-        self._preprocess_frames_core(frame_interval)
+        self._preprocess_frames_core(frame_interval, effective_fps)
         return
 
-    # 创建加载提示窗口
-    self.loading_window = tk.Toplevel(self.root)
-    self.loading_window.title("加载中")
-    self.loading_window.geometry("300x200")
-    self.loading_window.transient(self.root)
-    self.loading_window.grab_set()
-
-    self.loading_window.update_idletasks()
-    x = (self.loading_window.winfo_screenwidth() // 2) - (300 // 2)
-    y = (self.loading_window.winfo_screenheight() // 2) - (100 // 2)
-    self.loading_window.geometry(f"300x150+{x}+{y}")
-
-    tk.Label(self.loading_window, text="正在预处理视频帧，请稍候...", font=self.font).pack(pady=10)
-
-    self.loading_progress = ttk.Progressbar(self.loading_window, mode='determinate', length=200)
-    self.loading_progress.pack(pady=10)
-    self.loading_progress['maximum'] = self.total_frames
-
-    self.loading_label = tk.Label(self.loading_window, text="0%", font=self.font)
-    self.loading_label.pack()
-
-    self.root.update()
-
-    # 后台线程顺序读取
-    def _thread_target():
-        try:
-            frames = []
-            self.cap.release()
-            self.cap = cv2.VideoCapture(self.video_path)
-
-            processed_count = 0
-            i = 0
-            # 最多更新 50 次，减少 UI 交互开销
-            update_interval = max(1, int(self.total_frames / 50))
-
-            while True:
-                ret, frame = self.cap.read()
-                if not ret:
-                    break
-
-                if i % frame_interval < 1:
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    frame = self.resize_to_720p(frame)
-                    frames.append(frame)
-                    processed_count += 1
-
-                i += 1
-
-                if i % update_interval == 0 or i >= self.total_frames:
-                    progress_percent = int(i / self.total_frames * 100)
-                    frame_num = i
-                    def _update(progress=progress_percent, fn=frame_num):
-                        self.loading_progress['value'] = fn
-                        self.loading_label.config(text=f"{progress}%")
-                    self.root.after(0, _update)
-
-            self.cap.release()
-
-            self.processed_frames = frames
-            self.total_frames = processed_count
-            self.fps = effective_fps
-            self.frames_loaded = True
-
-            def _finish():
-                self.loading_window.destroy()
-                self.progress.config(to=self.total_frames - 1)
-                self.export_fps.set(f"{self.fps:.2f}")
-                self.show_frame()
-                self.draw_tag_markers()
-
-            self.root.after(0, _finish)
-
-        except Exception as e:
-            def _error():
-                self.loading_window.destroy()
-                messagebox.showerror("错误", f"预处理失败：{e}")
-            self.root.after(0, _error)
-
-    thread = threading.Thread(target=_thread_target, daemon=True)
-    thread.start()
-
-
-def _preprocess_frames_core(self, frame_interval):
-    """核心帧处理逻辑（无 UI），供 silent 模式调用"""
-    frames = []
-    self.cap.release()
-    self.cap = cv2.VideoCapture(self.video_path)
-    i = 0
-    while True:
-        ret, frame = self.cap.read()
-        if not ret:
-            break
-        if i % frame_interval < 1:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = self.resize_to_720p(frame)
-            frames.append(frame)
-        i += 1
+    try:
+        self._preprocess_frames_core(frame_interval, effective_fps)
+    except Exception as e:
+        messagebox.showerror("错误", f"预处理失败：{e}")
+        return
+
+    self.progress.config(to=self.total_frames - 1)
+    self.export_fps.set(f"{self.fps:.2f}")
+    self.show_frame()
+    self.draw_tag_markers()
+
+
+def _preprocess_frames_core(self, frame_interval, effective_fps=None):
+    """核心帧处理逻辑（无 UI）：按采样间隔建立按需解码的帧存储"""
     self.cap.release()
-    self.processed_frames = frames
-    self.total_frames = len(frames)
-    self.fps = self.config.getint('PROCESSING', 'target_frame_rate', fallback=24)
+    _release_frame_store(self)
+
+    cache_size = self.config.getint('PROCESSING', 'frame_cache_size', fallback=240)
+    self.processed_frames = LazyFrameStore(self.video_path, frame_interval,
+                                           resize_fn=self.resize_to_720p, cache_size=cache_size)
+    self.total_frames = len(self.processed_frames)
+    if effective_fps is None:
+        effective_fps = self.config.getint('PROCESSING', 'target_frame_rate', fallback=24)
+    self.fps = effective_fps
     self.frames_loaded = True
 
 
+def _release_frame_store(self):
+    """释放当前视频的帧存储（解码器与缓存）"""
+    frames = getattr(self, 'processed_frames', None)
+    if isinstance(frames, LazyFrameStore):
+        frames.close()
+    self.processed_frames = []
+
+
 def resize_to_720p(self, frame):
     """
     将帧按最长边缩放以提高性能
@@ -519,6 +446,7 @@ __all__ = [
     'play_video',
     'preprocess_frames',
     '_preprocess_frames_core',
+    '_release_frame_store',
     'resize_to_720p',
     'save_and_replace_video'
 ]
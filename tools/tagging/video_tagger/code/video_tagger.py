@@ -45,7 +45,7 @@ class VideoTagger:
         self.excluded_segments = []  # 存储排除的片段 [{start, end}]
         
         # 预处理帧存储
-        self.processed_frames = []  # 存储预处理的帧
+        self.processed_frames = []  # 采样帧序列（加载视频后为按需解码的 LazyFrameStore）
         self.frames_loaded = False   # 标记是否已完成帧预处理
         
         # 导出设置
@@ -333,7 +333,8 @@ class VideoTagger:
         load_video, load_video_manager, add_single_video, add_video_folder,
         clear_video_list,
         refresh_video_list, load_selected_video, preprocess_frames, show_frame,
-        play_video, resize_to_720p, save_and_replace_video, _preprocess_frames_core
+        play_video, resize_to_720p, save_and_replace_video, _preprocess_frames_core,
+        _release_frame_store
     )
     
     from tag_management import (
@@ -343,7 +344,7 @@ class VideoTagger:
     
     from ai_features import (
         generate_ai_caption, _generate_ai_caption_local, _generate_ai_caption_local_thread,
-        auto_segment_and_recognize, _generate_single_tag_caption
+        auto_segment_and_recognize, _generate_single_tag_caption, regenerate_segment_captions
     )
     
     from presets import (
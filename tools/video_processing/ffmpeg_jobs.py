@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+并行 ffmpeg 任务执行器（帧率转换、视频拆分等工具共用）
+
+- 按 CPU 核心数和编码器类型决定同时运行的 ffmpeg 进程数
+- 解析 -progress pipe:1 输出，实时更新每个任务的进度
+- 失败自动重试，支持取消（结束正在运行的进程，跳过未开始的任务）
+
+工具脚本位于子文件夹中，使用前需要把本文件所在目录加入 sys.path。
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# 硬件编码器同时可用的会话数有限（消费级 NVENC 等通常为 3~5 路）
+HARDWARE_ENCODER_SESSIONS = 3
+HARDWARE_ENCODER_SUFFIXES = ('_nvenc', '_qsv', '_amf', '_videotoolbox', '_vaapi')
+# 流复制主要受磁盘读写限制，并发过多反而变慢
+STREAM_COPY_WORKERS = 8
+# 控制台进度刷新间隔（秒）
+PROGRESS_PRINT_INTERVAL = 0.5
+# 并行读取时长时同时运行的 ffprobe 数
+PROBE_WORKERS = 8
+
+
+def is_ffmpeg_available():
+    """检查系统中是否有 ffmpeg"""
+    return shutil.which("ffmpeg") is not None
+
+
+def probe_duration(path):
+    """用 ffprobe 读取媒体时长（秒），不可用或失败时返回 None"""
+    if shutil.which("ffprobe") is None:
+        return None
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+        capture_output=True, encoding='utf-8', errors='ignore')
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+def probe_durations(paths, max_workers=PROBE_WORKERS):
+    """并行读取多个媒体文件的时长，返回与 paths 一一对应的列表（失败为 None）"""
+    if shutil.which("ffprobe") is None:
+        return [None] * len(paths)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        return list(executor.map(probe_duration, paths))
+
+
+def default_worker_count(encoder=None):
+    """
+    根据编码器类型计算默认并发数
+
+    Args:
+        encoder (str): 视频编码器名称，'copy' 表示流复制，None 表示 ffmpeg 默认的软件编码
+
+    Returns:
+        tuple: (并发进程数, 每个进程的编码线程数，None 表示不限制)
+    """
+    cores = os.cpu_count() or 4
+    if encoder == 'copy':
+        return min(cores, STREAM_COPY_WORKERS), None
+    if encoder and encoder.endswith(HARDWARE_ENCODER_SUFFIXES):
+        return HARDWARE_ENCODER_SESSIONS, None
+    # 软件编码器本身是多线程的：按一半核心数开进程，平分线程，避免过度抢占
+    workers = max(1, cores // 2)
+    return workers, max(1, cores // workers)
+
+
+class FFmpegJob:
+    """单个 ffmpeg 任务
+
+    Attributes:
+        status: pending / running / done / failed / cancelled
+        progress: 0~1，duration 未知时保持为 0，直到完成
+    """
+
+    def __init__(self, cmd, name, duration=None, output_path=None, on_success=None):
+        """
+        Args:
+            cmd (list): ffmpeg 命令（不需要包含 -progress / -y 参数），最后一个参数必须是输出文件
+            name (str): 显示名称
+            duration (float): 预计输出时长（秒），用于计算进度
+            output_path (str): 输出文件，失败或取消时删除
+            on_success (callable): 成功后在工作线程中调用 on_success(job)，例如替换原文件
+        """
+        self.cmd = list(cmd)
+        self.name = name
+        self.duration = duration
+        self.output_path = output_path
+        self.on_success = on_success
+        self.status = "pending"
+        self.progress = 0.0
+        self.attempts = 0
+        self.error = None
+        self.elapsed = 0.0
+
+
+class FFmpegJobRunner:
+    """在有界的子进程池中并行运行 ffmpeg 任务"""
+
+    def __init__(self, max_workers=None, threads_per_job=None, retries=1, on_progress=None):
+        """
+        Args:
+            max_workers (int): 同时运行的 ffmpeg 进程数，默认按 CPU 核心数
+            threads_per_job (int): 每个 ffmpeg 进程的编码线程数（输出选项 -threads），None 表示不限制
+            retries (int): 失败后的重试次数
+            on_progress (callable): 进度回调 on_progress(job)，在工作线程中调用
+        """
+        if max_workers is None:
+            max_workers, default_threads = default_worker_count()
+            threads_per_job = threads_per_job or default_threads
+        self.max_workers = max(1, max_workers)
+        self.threads_per_job = threads_per_job
+        self.retries = max(0, retries)
+        self.on_progress = on_progress
+        self._cancel_event = threading.Event()
+        self._processes = set()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """取消：结束正在运行的 ffmpeg，未开始的任务不再运行"""
+        self._cancel_event.set()
+        with self._lock:
+            for process in list(self._processes):
+                process.terminate()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def run(self, jobs):
+        """运行全部任务并等待结束（Ctrl+C 会取消剩余任务）
+
+        Returns:
+            list: 传入的任务列表（状态已更新）
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(self._run_job, job) for job in jobs}
+            try:
+                while pending:
+                    _, pending = wait(pending, timeout=0.5)
+            except KeyboardInterrupt:
+                self.cancel()
+                wait(pending)
+        return jobs
+
+    def _build_command(self, job):
+        cmd = job.cmd[:1] + ["-y", "-v", "error", "-nostats", "-progress", "pipe:1"] + job.cmd[1:-1]
+        if self.threads_per_job:
+            # 放在 -i 之前是解码器选项，限制编码线程必须放在输出文件之前
+            cmd += ["-threads", str(self.threads_per_job)]
+        return cmd + job.cmd[-1:]
+
+    def _run_job(self, job):
+        start = time.perf_counter()
+        try:
+            while not self.cancelled:
+                job.attempts += 1
+                job.status = "running"
+                job.progress = 0.0
+                self._notify(job)
+
+                returncode, stderr = self._run_process(job)
+                if returncode == 0:
+                    if job.on_success:
+                        job.on_success(job)
+                    job.status = "done"
+                    job.progress = 1.0
+                    job.error = None
+                    return job
+
+                job.error = stderr.strip().splitlines()[-1] if stderr.strip() else f"ffmpeg 退出码 {returncode}"
+                self._remove_output(job)
+                if job.attempts > self.retries and not self.cancelled:
+                    job.status = "failed"
+                    return job
+
+            job.status = "cancelled"
+            self._remove_output(job)
+            return job
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            self._remove_output(job)
+            return job
+        finally:
+            job.elapsed = time.perf_counter() - start
+            self._notify(job)
+
+    def _run_process(self, job):
+        """启动 ffmpeg 并解析进度输出，返回 (退出码, 错误输出)"""
+        # stderr 写入临时文件，避免管道写满导致 ffmpeg 阻塞
+        with tempfile.TemporaryFile() as stderr_file:
+            process = subprocess.Popen(self._build_command(job), stdout=subprocess.PIPE, stderr=stderr_file,
+                                       stdin=subprocess.DEVNULL, encoding='utf-8', errors='ignore')
+            with self._lock:
+                self._processes.add(process)
+                if self.cancelled:
+                    process.terminate()
+            try:
+                for line in process.stdout:
+                    key, _, value = line.strip().partition("=")
+                    if key == "out_time_us" and job.duration:
+                        try:
+                            job.progress = min(1.0, int(value) / 1e6 / job.duration)
+                        except ValueError:
+                            continue
+                        self._notify(job)
+                returncode = process.wait()
+            finally:
+                with self._lock:
+                    self._processes.discard(process)
+            stderr_file.seek(0)
+            return returncode, stderr_file.read().decode('utf-8', errors='ignore')
+
+    def _remove_output(self, job):
+        # 从未启动过 ffmpeg 的任务（开始前就被取消）不删除：输出路径上可能是之前运行生成的文件
+        if job.attempts == 0:
+            return
+        if job.output_path and os.path.exists(job.output_path):
+            try:
+                os.remove(job.output_path)
+            except OSError:
+                pass
+
+    def _notify(self, job):
+        if self.on_progress:
+            self.on_progress(job)
+
+
+class ConsoleProgress:
+    """在控制台单行显示整体进度和正在运行的任务（可作为 on_progress 回调）"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._lock = threading.Lock()
+        self._last_print = 0.0
+
+    def __call__(self, job):
+        now = time.monotonic()
+        with self._lock:
+            if job.status == "running" and now - self._last_print < PROGRESS_PRINT_INTERVAL:
+                return
+            self._last_print = now
+            finished = sum(1 for j in self.jobs if j.status in ("done", "failed", "cancelled"))
+            running = [j for j in self.jobs if j.status == "running"]
+            overall = sum(j.progress if j.status == "running" else (1.0 if j.status != "pending" else 0.0)
+                          for j in self.jobs) / max(1, len(self.jobs))
+            running_text = " ".join(f"{j.name}:{j.progress:.0%}" for j in running[:3])
+            if len(running) > 3:
+                running_text += f" 等{len(running)}个"
+            line = f"\r总进度: {overall:.1%} 完成 {finished}/{len(self.jobs)} {running_text}"
+            sys.stdout.write(line[:120].ljust(120))
+            sys.stdout.flush()
+
+
+def print_job_summary(jobs):
+    """打印任务结果汇总，返回失败的任务列表"""
+    print()
+    failed = [job for job in jobs if job.status == "failed"]
+    cancelled = sum(1 for job in jobs if job.status == "cancelled")
+    done = sum(1 for job in jobs if job.status == "done")
+    for job in failed:
+        print(f"失败: {job.name}（尝试 {job.attempts} 次）: {job.error}")
+    print(f"完成 {done} 个，失败 {len(failed)} 个，取消 {cancelled} 个")
+    return failed
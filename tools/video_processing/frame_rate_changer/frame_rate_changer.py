@@ -1,69 +1,77 @@
 import os
-import subprocess
 import sys
 from pathlib import Path
 
-def change_video_fps(input_folder, target_fps=30):
+# 共用的 ffmpeg 并行任务执行器位于上一级目录
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ffmpeg_jobs import (FFmpegJob, FFmpegJobRunner, ConsoleProgress, default_worker_count,
+                         is_ffmpeg_available, probe_durations, print_job_summary)
+
+def change_video_fps(input_folder, target_fps=30, max_workers=None, retries=1):
     """
-    批量修改指定文件夹中所有视频的帧率
+    批量修改指定文件夹中所有视频的帧率（多个 ffmpeg 进程并行）
     
     Args:
         input_folder (str): 包含视频文件的文件夹路径
         target_fps (int): 目标帧率，默认为30fps
+        max_workers (int): 同时运行的 ffmpeg 进程数，默认按 CPU 核心数计算
+        retries (int): 失败后的重试次数
+    
+    Returns:
+        list: 失败的任务列表
     """
     
     # 支持的视频格式
     video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm']
     
-    # 获取文件夹中的所有视频文件
-    video_files = []
+    # 获取文件夹中的所有视频文件（大小写不敏感的文件系统上两种扩展名会匹配到同一文件，需要去重）
+    video_files = set()
     for ext in video_extensions:
-        video_files.extend(Path(input_folder).glob(f'*{ext}'))
-        video_files.extend(Path(input_folder).glob(f'*{ext.upper()}'))
+        video_files.update(Path(input_folder).glob(f'*{ext}'))
+        video_files.update(Path(input_folder).glob(f'*{ext.upper()}'))
+    video_files = sorted(video_files)
     
     if not video_files:
         print(f"在 {input_folder} 中未找到视频文件")
-        return
+        return []
+    
+    if not is_ffmpeg_available():
+        print("错误: 未找到ffmpeg命令，请确保已安装ffmpeg并添加到系统PATH中")
+        return []
     
     print(f"找到 {len(video_files)} 个视频文件")
     
-    # 处理每个视频文件
-    for video_path in video_files:
-        print(f"正在处理: {video_path.name}")
-        
+    # 并行读取所有视频的时长（用于显示进度）
+    durations = probe_durations([str(path) for path in video_files])
+    
+    jobs = []
+    for video_path, duration in zip(video_files, durations):
         # 创建临时文件路径
         temp_path = video_path.parent / f"temp_{video_path.name}"
         
-        try:
-            # 使用ffmpeg修改帧率
-            cmd = [
-                'ffmpeg',
-                '-i', str(video_path),
-                '-vf', f'fps={target_fps}',
-                '-c:a', 'copy',  # 复制音频流而不重新编码
-                str(temp_path)
-            ]
-            
-            # 执行命令，避免文本解码问题
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            if result.returncode == 0:
-                # 删除原文件
-                os.remove(video_path)
-                # 重命名临时文件为原文件名
-                os.rename(temp_path, video_path)
-                print(f"成功修改 {video_path.name} 的帧率为 {target_fps}fps")
-            else:
-                # 如果失败，删除临时文件
-                if temp_path.exists():
-                    os.remove(temp_path)
-                print(f"处理 {video_path.name} 失败: {result.stderr}")
-                
-        except Exception as e:
-            # 清理临时文件
-            if temp_path.exists():
-                os.remove(temp_path)
-            print(f"处理 {video_path.name} 时发生错误: {str(e)}")
+        # 使用ffmpeg修改帧率
+        cmd = [
+            'ffmpeg',
+            '-i', str(video_path),
+            '-vf', f'fps={target_fps}',
+            '-c:a', 'copy',  # 复制音频流而不重新编码
+            str(temp_path)
+        ]
+        # 成功后用临时文件替换原文件
+        jobs.append(FFmpegJob(cmd, video_path.name, duration=duration,
+                              output_path=str(temp_path),
+                              on_success=lambda job, source=str(video_path): os.replace(job.output_path, source)))
+    
+    workers, threads = default_worker_count()
+    if max_workers:
+        workers = max(1, max_workers)
+        threads = max(1, (os.cpu_count() or 4) // workers)
+    print(f"使用 {workers} 个 ffmpeg 进程并行处理，目标帧率 {target_fps}fps（Ctrl+C 取消）")
+    
+    runner = FFmpegJobRunner(max_workers=workers, threads_per_job=threads, retries=retries,
+                             on_progress=ConsoleProgress(jobs))
+    runner.run(jobs)
+    return print_job_summary(jobs)
 
 def main():
     # 获取用户输入的文件夹路径
@@ -101,8 +109,19 @@ def main():
         print("操作已取消")
         return
     
+    # 并行进程数
+    default_workers, _ = default_worker_count()
+    workers_input = input(f"请输入并行处理的 ffmpeg 进程数 (默认{default_workers}): ").strip()
+    try:
+        max_workers = int(workers_input) if workers_input else None
+    except ValueError:
+        max_workers = -1
+    if max_workers is not None and max_workers < 1:
+        print(f"无效输入，使用默认值 {default_workers}")
+        max_workers = None
+    
     # 执行帧率转换
-    change_video_fps(folder_path, target_fps)
+    change_video_fps(folder_path, target_fps, max_workers=max_workers)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
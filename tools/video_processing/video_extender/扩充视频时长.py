@@ -1,30 +1,130 @@
 import os
+import time
+import json
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import cv2
-import numpy as np
+
+# 文件夹处理结果报告文件名
+REPORT_NAME = "stretch_report.json"
+
+
+def build_stretch_mapping(source_frame_count, target_frame_count):
+    """
+    计算拉伸（重复帧）时每个输出帧对应的源帧号。
+    源帧 i 覆盖输出帧 [int(i * r), int((i + 1) * r))，r = 目标帧数 / 源帧数；
+    源帧数多于目标帧数时等间隔抽帧。
+    
+    Returns:
+        list: 长度为 target_frame_count 的源帧号列表（单调不减）
+    """
+    if source_frame_count <= 0 or target_frame_count <= 0:
+        return []
+    # 输出帧 j 对应满足 int(i * r) <= j 的最大 i，即 ceil((j + 1) / r) - 1，用整数运算避免浮点误差
+    return [min(((j + 1) * source_frame_count + target_frame_count - 1) // target_frame_count - 1,
+                source_frame_count - 1)
+            for j in range(target_frame_count)]
 
 
-def stretch_video_to_5_seconds(input_path, target_fps=16, target_duration=5):
+def build_resample_mapping(source_frame_count, target_frame_count):
     """
-    加载视频，如果其时长小于目标时长，则将其放慢以达到目标时长，
-    并设置固定的目标帧率。返回处理后的视频帧列表和实际FPS。
+    计算重新采样时每个输出帧对应的源帧号（输出帧 i 取源帧 int(i * 源帧数 / 目标帧数)）
+    
+    Returns:
+        list: 长度为 target_frame_count 的源帧号列表（单调不减）
+    """
+    if source_frame_count <= 0 or target_frame_count <= 0:
+        return []
+    return [min(i * source_frame_count // target_frame_count, source_frame_count - 1)
+            for i in range(target_frame_count)]
+
+
+def stream_frames_to_video(input_path, output_path, mapping, fps):
+    """
+    按输出帧→源帧映射流式写出视频：只向前解码一遍，源帧解码出来后立即写出
+    对应的所有输出帧，内存中最多保留一帧。不需要的源帧只 grab() 跳过。
+    源视频实际帧数少于元数据帧数时，剩余输出帧用最后一帧填充。
+    
+    Args:
+        input_path (str): 输入视频路径
+        output_path (str): 输出视频路径
+        mapping (list): 每个输出帧对应的源帧号（单调不减）
+        fps (float): 输出帧率
+        
+    Returns:
+        int: 写出的帧数，出错返回 0
+    """
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        print(f"  - 错误: 无法打开视频文件 {input_path}")
+        return 0
+    
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    if not out.isOpened():
+        print(f"  - 错误: 无法创建输出视频文件 {output_path}")
+        cap.release()
+        return 0
+    
+    frame = None
+    next_index = 0  # 解码器下一次 grab() 得到的源帧号
+    source_ended = False
+    written = 0
+    try:
+        for source_index in mapping:
+            # 向前跳到需要的源帧，中间的帧只 grab 不解码
+            while not source_ended and next_index <= source_index:
+                if not cap.grab():
+                    source_ended = True
+                    break
+                if next_index == source_index:
+                    ret, decoded = cap.retrieve()
+                    if ret:
+                        frame = decoded
+                next_index += 1
+            
+            if frame is None:
+                break
+            # 确保帧尺寸正确
+            if frame.shape[0] != height or frame.shape[1] != width:
+                frame = cv2.resize(frame, (width, height))
+            out.write(frame)
+            written += 1
+    finally:
+        out.release()
+        cap.release()
+    
+    return written
+
+
+def stretch_video_to_5_seconds(input_path, output_path, target_fps=16, target_duration=5):
+    """
+    将视频流式处理为固定帧率和时长：如果其时长小于目标时长，则将其放慢（重复帧）
+    以达到目标时长；否则重新采样到目标帧率。结果直接写入 output_path。
     
     Args:
         input_path (str): 输入视频文件的路径。
+        output_path (str): 输出视频文件的路径。
         target_fps (int): 目标帧率，默认为 16。
         target_duration (float): 目标时长（秒），默认为 5.
         
     Returns:
-        tuple: (frames list, actual_fps) 处理后的视频帧列表和实际FPS，如果出错则返回 ([], 0)。
+        tuple: (写出的帧数, 实际FPS)，如果出错则返回 (0, 0)。
     """
     cap = cv2.VideoCapture(input_path)
     
     if not cap.isOpened():
         print(f"  - 错误: 无法打开视频文件 {input_path}")
-        return [], 0
+        return 0, 0
     
     original_fps = cap.get(cv2.CAP_PROP_FPS)
     total_original_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     original_duration = total_original_frames / original_fps if original_fps > 0 else 0
+    cap.release()
 
     print(f"正在处理: {os.path.basename(input_path)}")
     print(f"  - 原始时长: {original_duration:.2f} 秒")
@@ -33,108 +133,164 @@ def stretch_video_to_5_seconds(input_path, target_fps=16, target_duration=5):
 
     if original_fps <= 0 or total_original_frames <= 0:
         print(f"  - 错误: 无法读取视频的持续时间或帧率。")
-        cap.release()
-        return [], 0
-
-    # 如果视频本身已经大于等于目标时长，跳过
-    if original_duration >= target_duration:
-        print(f"  - 跳过: 视频时长 >= {target_duration} 秒。")
-        # 读取视频帧并调整到目标帧率
-        frames = []
-        frame_count = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            frames.append(frame)
-            frame_count += 1
-        
-        cap.release()
-        # 重新采样到目标帧率
-        target_total_frames = target_fps * target_duration
-        resampled_frames = resample_frames(frames, total_original_frames, int(target_total_frames))
-        return resampled_frames, target_fps
+        return 0, 0
 
     # 计算目标总帧数
-    target_total_frames = target_fps * target_duration
+    target_total_frames = int(target_fps * target_duration)
     
-    # 计算需要重复的帧数来达到目标时长
-    # 为了将视频从 original_duration 拉伸到 target_duration，我们需要重复帧
-    frames = []
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame)
+    if original_duration >= target_duration:
+        # 视频本身已经大于等于目标时长，不拉伸，只重新采样到目标帧率
+        print(f"  - 跳过拉伸: 视频时长 >= {target_duration} 秒，仅重新采样。")
+        mapping = build_resample_mapping(total_original_frames, target_total_frames)
+    else:
+        # 重复帧以达到目标持续时间
+        mapping = build_stretch_mapping(total_original_frames, target_total_frames)
     
-    cap.release()
+    written = stream_frames_to_video(input_path, output_path, mapping, target_fps)
+    print(f"  - 处理完成: 原始帧数 {total_original_frames}, 目标帧数 {written}, 目标帧率 {target_fps} fps")
     
-    # 重复帧以达到目标持续时间
-    stretched_frames = []
-    if len(frames) > 0:
-        # 计算每个原始帧应该重复多少次
-        if total_original_frames > 0:
-            repeat_factor = target_total_frames / total_original_frames
-            for i, frame in enumerate(frames):
-                # 根据位置计算应该重复的次数
-                start_idx = int(i * repeat_factor)
-                end_idx = int((i + 1) * repeat_factor)
-                for _ in range(end_idx - start_idx):
-                    stretched_frames.append(frame)
-        
-        # 确保帧数准确为目标帧数
-        if len(stretched_frames) > target_total_frames:
-            stretched_frames = stretched_frames[:int(target_total_frames)]
-        elif len(stretched_frames) < target_total_frames:
-            # 如果帧数不够，复制最后一帧
-            last_frame = stretched_frames[-1] if stretched_frames else frames[-1] if frames else None
-            if last_frame is not None:
-                while len(stretched_frames) < target_total_frames:
-                    stretched_frames.append(last_frame)
+    return (written, target_fps) if written else (0, 0)
 
-    print(f"  - 处理完成: 原始帧数 {len(frames)}, 目标帧数 {len(stretched_frames)}, 目标帧率 {target_fps} fps")
-    
-    return stretched_frames, target_fps
 
+def is_ffmpeg_available():
+    """检查系统中是否有 ffmpeg"""
+    return shutil.which("ffmpeg") is not None
 
-def resample_frames(frames, original_frame_count, target_frame_count):
-    """
-    重新采样帧列表以匹配目标帧数
+
+def stretch_video_with_ffmpeg(input_path, output_path, target_fps=16, target_duration=5):
     """
-    if target_frame_count <= 0:
-        return []
+    用单个 ffmpeg 滤镜图完成拉伸：setpts 按比例缩放时间戳，fps 重新采样到目标帧率，
+    tpad 用最后一帧补足，-frames:v 精确限定输出帧数。帧处理全部在 ffmpeg 内完成。
+    yuv420p 要求宽高为偶数，奇数尺寸会裁掉最后一行/列像素。
+    与 OpenCV 路径一致，输出不带音频。
     
-    if target_frame_count == original_frame_count:
-        return frames[:]
+    Returns:
+        tuple: (输出帧数, 实际FPS)，如果出错则返回 (0, 0)。
+    """
+    cap = cv2.VideoCapture(input_path)
+    original_fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0
+    total_original_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+    cap.release()
+    if original_fps <= 0 or total_original_frames <= 0:
+        print(f"  - 错误: 无法读取视频的持续时间或帧率: {input_path}")
+        return 0, 0
     
-    resampled = []
-    for i in range(target_frame_count):
-        idx = int(i * original_frame_count / target_frame_count)
-        idx = min(idx, len(frames) - 1)  # 确保索引不越界
-        resampled.append(frames[idx])
+    original_duration = total_original_frames / original_fps
+    target_total_frames = int(target_fps * target_duration)
+    factor = target_duration / original_duration
     
-    return resampled
+    cmd = [
+        "ffmpeg", "-y", "-v", "error", "-i", input_path, "-an",
+        "-vf", f"setpts={factor:.6f}*PTS,fps={target_fps},tpad=stop_mode=clone:stop=-1,"
+               "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+        "-frames:v", str(target_total_frames),
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p",
+        output_path,
+    ]
+    result = subprocess.run(cmd, capture_output=True, encoding='utf-8', errors='ignore')
+    if result.returncode != 0:
+        print(f"  - ffmpeg 处理失败: {result.stderr.strip()}")
+        return 0, 0
+    return target_total_frames, target_fps
 
 
-def save_video_with_opencv(frames, output_path, fps, width, height):
+def _process_one_video(video_path, target_fps, target_duration, use_ffmpeg):
     """
-    使用OpenCV保存视频帧到文件
+    处理单个视频（可在子进程中运行）：先写入临时文件，成功后重命名替换原文件。
+    
+    Returns:
+        dict: 处理结果，包含状态、原时长、输出帧数、处理方式和耗时
     """
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    start = time.perf_counter()
+    result = {"video": video_path, "status": "failed", "method": None,
+              "original_duration": None, "frames": 0, "seconds": 0.0, "error": None}
+    
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        result["error"] = "无法打开视频"
+        return result
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    duration = total_frames / fps if fps > 0 else 0
+    result["original_duration"] = round(duration, 3)
+    
+    # 只处理时长小于目标时长的视频
+    if duration >= target_duration:
+        result["status"] = "skipped"
+        return result
+    
+    # 临时文件与原文件在同一目录，保证 os.replace 是原子操作
+    temp_path = video_path + "_temp.mp4"
+    try:
+        written = 0
+        if use_ffmpeg:
+            result["method"] = "ffmpeg"
+            written, _ = stretch_video_with_ffmpeg(video_path, temp_path, target_fps, target_duration)
+            if not written:
+                # ffmpeg 失败（编码器不支持的格式等）时改用 OpenCV 流式处理
+                print(f"  - ffmpeg 处理失败，改用 OpenCV: {video_path}")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                result["method"] = "ffmpeg→opencv"
+                written, _ = stretch_video_to_5_seconds(video_path, temp_path, target_fps, target_duration)
+        else:
+            result["method"] = "opencv"
+            written, _ = stretch_video_to_5_seconds(video_path, temp_path, target_fps, target_duration)
+        
+        if written:
+            os.replace(temp_path, video_path)
+            result["status"] = "processed"
+            result["frames"] = written
+        else:
+            result["error"] = "未写出任何帧"
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def print_summary(results, elapsed, report_path=None):
+    """打印处理报告（每个视频的状态和耗时），并可保存为 JSON"""
+    status_text = {"processed": "已处理", "skipped": "跳过", "failed": "失败"}
+    print("\n" + "=" * 60)
+    print("处理报告")
+    print("=" * 60)
+    for r in sorted(results, key=lambda r: r["video"]):
+        line = f"[{status_text[r['status']]}] {r['video']}"
+        if r["original_duration"] is not None:
+            line += f" | 原时长 {r['original_duration']:.2f}s"
+        if r["status"] == "processed":
+            line += f" | {r['frames']} 帧 | {r['method']} | 耗时 {r['seconds']:.2f}s"
+        if r["error"]:
+            line += f" | {r['error']}"
+        print(line)
     
-    for frame in frames:
-        # 确保帧尺寸正确
-        if frame.shape[0] != height or frame.shape[1] != width:
-            frame = cv2.resize(frame, (width, height))
-        out.write(frame)
+    counts = {key: sum(1 for r in results if r["status"] == key) for key in status_text}
+    print("-" * 60)
+    print(f"共 {len(results)} 个视频: 已处理 {counts['processed']}，跳过 {counts['skipped']}，"
+          f"失败 {counts['failed']}，总耗时 {elapsed:.2f}s")
     
-    out.release()
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({"elapsed": round(elapsed, 3), "counts": counts, "videos": results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"报告已保存: {report_path}")
 
 
-def process_video_folder(folder_path):
+def process_video_folder(folder_path, target_fps=16, target_duration=5, max_workers=1, use_ffmpeg=False):
     """
     处理文件夹中的视频，将时长小于5秒的视频通过重复帧扩展到5秒
+    
+    Args:
+        max_workers (int): 并行处理的进程数，1 为逐个处理
+        use_ffmpeg (bool): 使用 ffmpeg 滤镜图完成拉伸（ffmpeg 不可用时自动改用 OpenCV）
+        
+    Returns:
+        list: 每个视频的处理结果
     """
     # 获取文件夹中所有视频文件
     video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.webm']
@@ -145,81 +301,33 @@ def process_video_folder(folder_path):
             if any(file.lower().endswith(ext) for ext in video_extensions):
                 video_files.append(os.path.join(root, file))
     
-    for video_path in video_files:
-        # 获取视频信息
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            print(f"无法打开视频: {video_path}")
-            continue
-            
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / fps if fps > 0 else 0
-        
-        # 如果视频时长小于5秒，则进行处理
-        if duration < 5:
-            print(f"正在处理视频: {video_path} (原时长: {duration:.2f}s)")
-            
-            # 读取所有帧
-            frames = []
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                frames.append(frame)
-            
-            cap.release()
-            
-            # 计算目标总帧数
-            target_fps = 16
-            target_duration = 5
-            target_total_frames = target_fps * target_duration
-            
-            # 通过重复帧的方式延长视频到5秒
-            extended_frames = []
-            if len(frames) > 0:
-                # 计算每个原始帧应该重复多少次
-                repeat_factor = target_total_frames / len(frames)
-                
-                for i, frame in enumerate(frames):
-                    # 根据位置计算应该重复的次数
-                    start_idx = int(i * repeat_factor)
-                    end_idx = int((i + 1) * repeat_factor)
-                    
-                    # 添加帧副本
-                    for _ in range(max(1, end_idx - start_idx)):
-                        if len(extended_frames) < target_total_frames:
-                            extended_frames.append(frame)
-                
-                # 如果帧数仍不足，用最后一帧填充
-                while len(extended_frames) < target_total_frames and len(frames) > 0:
-                    extended_frames.append(frames[-1])
-                
-                # 如果帧数超出，截断
-                if len(extended_frames) > target_total_frames:
-                    extended_frames = extended_frames[:target_total_frames]
-            
-            # 保存处理后的视频
-            if extended_frames and len(extended_frames) > 0:
-                temp_path = video_path + "_temp.mp4"
-                
-                # 获取原始视频的尺寸
-                height, width = extended_frames[0].shape[:2]
-                
-                save_video_with_opencv(extended_frames, temp_path, target_fps, width, height)
-                
-                # 替换原始文件
-                os.remove(video_path)
-                os.rename(temp_path, video_path.replace('.tmp', '') if video_path.endswith('.tmp') else video_path)
-                
-                print(f"已保存处理后的视频: {video_path}")
-            else:
-                print(f"处理失败: {video_path}")
-        else:
-            print(f"跳过视频 (时长 >= 5s): {video_path}")
-        
-        # 释放cap资源
-        cap.release()
+    if use_ffmpeg and not is_ffmpeg_available():
+        print("未找到 ffmpeg，改用 OpenCV 处理")
+        use_ffmpeg = False
+    
+    start = time.perf_counter()
+    results = []
+    if max_workers > 1 and len(video_files) > 1:
+        print(f"使用 {min(max_workers, len(video_files))} 个进程并行处理 {len(video_files)} 个视频")
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(video_files))) as executor:
+            futures = {executor.submit(_process_one_video, video_path, target_fps, target_duration, use_ffmpeg):
+                       video_path for video_path in video_files}
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"video": futures[future], "status": "failed", "method": None,
+                              "original_duration": None, "frames": 0, "seconds": 0.0, "error": str(e)}
+                results.append(result)
+                print(f"[{done}/{len(video_files)}] {result['status']}: {result['video']}")
+    else:
+        for done, video_path in enumerate(video_files, 1):
+            result = _process_one_video(video_path, target_fps, target_duration, use_ffmpeg)
+            results.append(result)
+            print(f"[{done}/{len(video_files)}] {result['status']}: {video_path}")
+    
+    print_summary(results, time.perf_counter() - start, os.path.join(folder_path, REPORT_NAME))
+    return results
 
 
 def main():
@@ -229,8 +337,19 @@ def main():
         print("错误: 指定的路径不是有效目录")
         return
     
+    worker_input = input(f"请输入并行处理的进程数 (回车使用默认值 1，CPU 核心数 {os.cpu_count()}): ").strip()
+    try:
+        max_workers = max(1, int(worker_input)) if worker_input else 1
+    except ValueError:
+        print("无效输入，使用默认值 1")
+        max_workers = 1
+    
+    use_ffmpeg = False
+    if is_ffmpeg_available():
+        use_ffmpeg = input("检测到 ffmpeg，是否使用 ffmpeg 滤镜完成拉伸 (y/n，回车默认 y): ").strip().lower() != 'n'
+    
     print(f"开始处理文件夹: {folder_path}")
-    process_video_folder(folder_path)
+    process_video_folder(folder_path, max_workers=max_workers, use_ffmpeg=use_ffmpeg)
     print("处理完成!")
 
 
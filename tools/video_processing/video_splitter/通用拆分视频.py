@@ -1,15 +1,23 @@
 import os
+import re
+import sys
 import cv2
 from math import ceil
-import subprocess
 
-def split_video_by_seconds(video_path, interval_seconds):
+# 共用的 ffmpeg 并行任务执行器位于上一级目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ffmpeg_jobs import (FFmpegJob, FFmpegJobRunner, ConsoleProgress, default_worker_count,
+                         is_ffmpeg_available, print_job_summary)
+
+def split_video_by_seconds(video_path, interval_seconds, max_workers=None, retries=1):
     """
-    按指定秒数分割视频
+    按指定秒数分割视频（各片段由多个 ffmpeg 进程并行导出）
     
     Args:
         video_path (str): 视频文件路径
         interval_seconds (int): 分割间隔秒数
+        max_workers (int): 同时运行的 ffmpeg 进程数，默认按流复制的并发数
+        retries (int): 失败后的重试次数
     """
     # 检查视频文件是否存在
     if not os.path.exists(video_path):
@@ -43,7 +51,12 @@ def split_video_by_seconds(video_path, interval_seconds):
     
     cap.release()
     
+    if not is_ffmpeg_available():
+        print("错误: 未找到ffmpeg命令，请确保已安装ffmpeg并添加到系统PATH中")
+        return
+    
     # 使用ffmpeg分割视频以保留音频
+    jobs = []
     for segment_index in range(total_segments):
         start_time = segment_index * interval_seconds
         end_time = min((segment_index + 1) * interval_seconds, duration)
@@ -58,30 +71,119 @@ def split_video_by_seconds(video_path, interval_seconds):
             '-ss', str(start_time),
             '-t', str(end_time - start_time),
             '-c', 'copy',  # 直接复制编解码，速度更快
-            output_path,
-            '-y'  # 覆盖已存在的文件
+            output_path
         ]
-        
-        # 执行ffmpeg命令
-        try:
-            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            print(f"已保存片段: {os.path.basename(output_path)}")
-        except subprocess.CalledProcessError as e:
-            print(f"分割片段 {segment_index+1} 时出错: {e}")
-        except FileNotFoundError:
-            print("错误: 未找到ffmpeg命令，请确保已安装ffmpeg并添加到系统PATH中")
-            return
-            
-        # 显示进度
-        progress = (segment_index + 1) / total_segments * 100
-        print(f"\r处理进度: {progress:.1f}%", end="", flush=True)
+        jobs.append(FFmpegJob(cmd, os.path.basename(output_path), duration=end_time - start_time,
+                              output_path=output_path))
+    
+    workers, _ = default_worker_count('copy')
+    runner = FFmpegJobRunner(max_workers=max_workers or workers, retries=retries,
+                             on_progress=ConsoleProgress(jobs))
+    runner.run(jobs)
+    print_job_summary(jobs)
     
     print(f"\n所有片段已保存至: {output_folder}")
 
+def _list_segments(output_folder, video_name_without_ext):
+    """列出输出文件夹中由分割生成的片段（<视频名>_part_NNN.mp4）"""
+    pattern = re.compile(re.escape(video_name_without_ext) + r"_part_\d{3,}\.mp4$")
+    return sorted(f for f in os.listdir(output_folder) if pattern.match(f))
+
+
+def split_video_single_pass(video_path, interval_seconds, force_keyframes=False, crf=18):
+    """
+    使用 ffmpeg segment 复用器单次读取输入，一次生成全部片段
+    
+    Args:
+        video_path (str): 视频文件路径
+        interval_seconds (int): 分割间隔秒数
+        force_keyframes (bool): False 时流复制，只能在关键帧处切分，片段时长会对齐到
+            间隔之后的第一个关键帧；True 时重新编码视频一遍，并在每个间隔处强制插入关键帧，
+            片段时长精确（音频仍然流复制）
+        crf (int): 重新编码时的质量参数
+    """
+    # 检查视频文件是否存在
+    if not os.path.exists(video_path):
+        print(f"错误: 视频文件 {video_path} 不存在")
+        return
+    
+    if not is_ffmpeg_available():
+        print("错误: 未找到ffmpeg命令，请确保已安装ffmpeg并添加到系统PATH中")
+        return
+    
+    # 获取视频所在目录和文件名
+    video_dir = os.path.dirname(video_path)
+    video_name_without_ext = os.path.splitext(os.path.basename(video_path))[0]
+    
+    # 创建保存分割视频的文件夹
+    output_folder = os.path.join(video_dir, f"{video_name_without_ext}_segments")
+    os.makedirs(output_folder, exist_ok=True)
+    
+    # 读取时长用于显示进度
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    duration = total_frames / fps if fps > 0 else None
+    if duration:
+        print(f"视频总时长: {duration:.2f} 秒，预计 {ceil(duration / interval_seconds)} 个片段")
+    
+    # 删除之前（可能使用不同间隔）生成的片段，避免混入本次结果
+    old_segments = _list_segments(output_folder, video_name_without_ext)
+    for name in old_segments:
+        os.remove(os.path.join(output_folder, name))
+    if old_segments:
+        print(f"已删除之前生成的 {len(old_segments)} 个片段")
+    
+    output_pattern = os.path.join(output_folder, f"{video_name_without_ext}_part_%03d.mp4")
+    cmd = ['ffmpeg', '-i', video_path, '-map', '0:v:0', '-map', '0:a?']
+    if force_keyframes:
+        # segment_time_delta 取半帧时长，避免强制关键帧的时间戳因精度略小于切分点而被跳过
+        cmd += ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(crf),
+                '-force_key_frames', f'expr:gte(t,n_forced*{interval_seconds})', '-c:a', 'copy',
+                '-segment_time_delta', f'{0.5 / fps if fps > 0 else 0.05:.6f}']
+    else:
+        cmd += ['-c', 'copy']
+    cmd += ['-f', 'segment', '-segment_time', str(interval_seconds), '-segment_start_number', '1',
+            '-reset_timestamps', '1', output_pattern]
+    
+    mode_text = "重新编码并强制关键帧" if force_keyframes else "流复制（按关键帧切分）"
+    print(f"单次读取分割: {mode_text}")
+    job = FFmpegJob(cmd, os.path.basename(video_path), duration=duration)
+    # 只有一个 ffmpeg 进程：重新编码时不限制线程数
+    FFmpegJobRunner(max_workers=1, retries=0, on_progress=ConsoleProgress([job])).run([job])
+    print_job_summary([job])
+    
+    segments = _list_segments(output_folder, video_name_without_ext)
+    if job.status != "done":
+        # 失败或取消：segment 复用器没有单一输出文件，手动删除本次生成的不完整片段
+        for name in segments:
+            os.remove(os.path.join(output_folder, name))
+        print(f"分割未完成，已删除本次生成的 {len(segments)} 个片段")
+        return
+    print(f"共生成 {len(segments)} 个片段，已保存至: {output_folder}")
+
+
+# 分割方式
+SPLIT_MODES = {
+    "1": ("单次读取，流复制（最快，片段在关键帧处切分）", lambda path, sec: split_video_single_pass(path, sec)),
+    "2": ("单次读取，重新编码并强制关键帧（片段时长精确）",
+          lambda path, sec: split_video_single_pass(path, sec, force_keyframes=True)),
+    "3": ("逐段导出（每个片段一个 ffmpeg 进程并行运行）", split_video_by_seconds),
+}
+
+
 if __name__ == "__main__":
     # 获取用户输入
     video_path = input("请输入视频文件路径: ").strip()
     interval_seconds = int(input("请输入分割间隔秒数: "))
     
+    for key, (label, _) in SPLIT_MODES.items():
+        print(f"  {key}. {label}")
+    mode = input("请选择分割方式 (回车默认 1): ").strip() or "1"
+    if mode not in SPLIT_MODES:
+        print("无效选择，使用方式 1")
+        mode = "1"
+    
     # 执行分割
-    split_video_by_seconds(video_path, interval_seconds)
\ No newline at end of file
+    SPLIT_MODES[mode][1](video_path, interval_seconds)
\ No newline at end of file
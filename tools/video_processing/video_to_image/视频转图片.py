@@ -5,7 +5,13 @@ import argparse
 from tqdm import tqdm
 import logging
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import math
+import queue
+import shutil
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 # 设置系统编码为utf-8，解决中文路径问题
 if sys.platform.startswith('win'):
@@ -25,19 +31,105 @@ logger = logging.getLogger(__name__)
 # 支持的视频格式
 VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm', '.m4v', '.webp'}
 
+# 输出图片格式：扩展名、质量参数、默认值、取值范围
+# PNG 为压缩级别（越大文件越小、编码越慢），默认 None 使用 OpenCV 默认的快速 RLE 压缩
+# （显式指定级别后会改用 zlib 默认策略，即使级别 1 也明显更慢）；JPEG / WebP 为画质
+IMAGE_FORMATS = {
+    'png': ('.png', cv2.IMWRITE_PNG_COMPRESSION, None, (0, 9)),
+    'jpg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 95, (1, 100)),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 95, (1, 100)),
+}
+
+# 每个视频的图片编码线程数（cv2.imencode 会释放 GIL，线程即可并行）
+ENCODE_WORKERS = max(2, min(8, (os.cpu_count() or 4) // 2))
+# 多进程提取时每个进程的编码线程数（进程数已经占满 CPU）
+PROCESS_ENCODE_WORKERS = 2
+
+# 多视频调度：帧数超过该值的视频才按时间段拆分给多个进程
+MIN_SPLIT_FRAMES = 3000
+# 工作进程每处理多少帧上报一次进度
+PROGRESS_REPORT_FRAMES = 100
+# 分段任务定位时提前的帧数：FFmpeg 后端按时间戳定位，B 帧 / 可变帧率视频会落在目标帧附近，
+# 先定位到更早的位置，再用 grab() 逐帧前进到准确的起始帧
+SEEK_MARGIN_FRAMES = 32
+# 提取清单文件名（记录每张图片对应的视频和帧号）
+MANIFEST_NAME = "extract_manifest.json"
+
+
+class FrameWriter:
+    """后台编码并写入图片的线程池
+
+    submit() 在排队中的图片达到上限时阻塞，避免解码速度快于编码时帧堆积占满内存。
+    """
+
+    def __init__(self, image_format='png', quality=None, max_workers=ENCODE_WORKERS):
+        self.ext, param, default, _ = IMAGE_FORMATS[image_format]
+        quality = default if quality is None else quality
+        self.params = [param, int(quality)] if quality is not None else []
+        self.saved_count = 0
+        self.failed_count = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit(self, frame, output_path):
+        """提交一帧（BGR），output_path 不含扩展名"""
+        self._slots.acquire()
+        try:
+            self._executor.submit(self._write, frame, Path(f"{output_path}{self.ext}"))
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _write(self, frame, output_path):
+        try:
+            # 使用cv2.imencode然后写入文件，避免直接imwrite的中文路径问题
+            success, encoded_image = cv2.imencode(self.ext, frame, self.params)
+            if success:
+                with open(str(output_path), 'wb') as f:
+                    f.write(encoded_image)
+            else:
+                logger.warning(f"编码失败: {output_path.name}")
+            with self._lock:
+                if success:
+                    self.saved_count += 1
+                else:
+                    self.failed_count += 1
+        except Exception as e:
+            logger.warning(f"保存失败: {output_path.name}: {e}")
+            with self._lock:
+                self.failed_count += 1
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """等待所有图片写完，返回成功保存的数量"""
+        self._executor.shutdown(wait=True)
+        return self.saved_count
+
+
 def is_video_file(file_path):
     """判断是否为视频文件"""
     return file_path.suffix.lower() in VIDEO_EXTENSIONS
 
-def get_all_videos(folder_path):
-    """递归获取文件夹中所有视频文件"""
+def get_all_videos(folder_path, exclude_folder=None):
+    """递归获取文件夹中所有视频文件
+    
+    Args:
+        folder_path: 输入文件夹
+        exclude_folder: 跳过该文件夹下的文件（输出文件夹位于输入文件夹内，
+            输出 webp 时上次提取的帧会被误认为动画 WebP 视频）
+    """
     # 处理路径编码问题
     folder_path = Path(str(folder_path).encode('utf-8').decode('utf-8'))
     if not folder_path.exists():
         raise FileNotFoundError(f"文件夹不存在: {folder_path}")
     
+    exclude_folder = Path(exclude_folder).resolve() if exclude_folder else None
     video_files = []
     for file_path in folder_path.rglob('*'):
+        if exclude_folder and exclude_folder in file_path.resolve().parents:
+            continue
         if file_path.is_file() and is_video_file(file_path):
             # 确保文件路径正确编码
             video_files.append(Path(str(file_path).encode('utf-8').decode('utf-8')))
@@ -47,7 +139,8 @@ def get_all_videos(folder_path):
         logger.info(f"  - {video}")
     return video_files
 
-def extract_frames_from_webp(webp_path, output_folder, frames_per_second, start_index=0, show_progress=True):
+def extract_frames_from_webp(webp_path, output_folder, frames_per_second, start_index=0, show_progress=True,
+                             image_format='png', quality=None):
     """从动画WebP文件中提取帧（使用Pillow，支持动画和静态WebP）"""
     try:
         from PIL import Image
@@ -63,27 +156,19 @@ def extract_frames_from_webp(webp_path, output_folder, frames_per_second, start_
         is_animated = getattr(im, 'is_animated', False)
         n_frames = getattr(im, 'n_frames', 1)
 
+        safe_stem = _sanitize_filename(webp_path.stem)
+        writer = FrameWriter(image_format, quality, max_workers=1 if not is_animated or n_frames <= 1 else ENCODE_WORKERS)
+
         if not is_animated or n_frames <= 1:
-            # 静态WebP，直接保存为PNG
+            # 静态WebP，直接保存为一张图片
             logger.info(f"静态WebP图片: {webp_path}")
             frame = np.array(im.convert('RGB'))
             frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
 
-            safe_stem = _sanitize_filename(webp_path.stem)
-            output_filename = f"{safe_stem}_{start_index:06d}.png"
-            output_path = output_folder / output_filename
-
-            success, encoded_image = cv2.imencode('.png', frame)
-            if success:
-                with open(str(output_path), 'wb') as f:
-                    f.write(encoded_image)
-                logger.info(f"已保存: {output_filename}")
-                im.close()
-                return 1, start_index + 1
-            else:
-                logger.warning(f"编码失败: {output_filename}")
-                im.close()
-                return 0, start_index
+            writer.submit(frame, output_folder / f"{safe_stem}_{start_index:06d}")
+            saved_count = writer.close()
+            im.close()
+            return saved_count, start_index + saved_count
 
         # 动画WebP处理
         # 逐帧读取真实帧间隔（每帧的duration独立存储，需seek后才能获取）
@@ -121,7 +206,6 @@ def extract_frames_from_webp(webp_path, output_folder, frames_per_second, start_
         actual_rate = webp_fps / skip_frames
         logger.info(f"每隔 {skip_frames} 帧提取一张图片（等效 {actual_rate:.2f} 张/秒）")
 
-        saved_count = 0
         current_index = start_index
 
         if show_progress:
@@ -139,22 +223,13 @@ def extract_frames_from_webp(webp_path, output_folder, frames_per_second, start_
             frame = np.array(im.convert('RGB'))
             frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
 
-            safe_stem = _sanitize_filename(webp_path.stem)
-            output_filename = f"{safe_stem}_{current_index:06d}.png"
-            output_path = output_folder / output_filename
-
-            success, encoded_image = cv2.imencode('.png', frame)
-            if success:
-                with open(str(output_path), 'wb') as f:
-                    f.write(encoded_image)
-                saved_count += 1
-                current_index += 1
-            else:
-                logger.warning(f"编码失败: {output_filename}")
+            writer.submit(frame, output_folder / f"{safe_stem}_{current_index:06d}")
+            current_index += 1
 
             if pbar:
                 pbar.update(1)
 
+        saved_count = writer.close()
         if pbar:
             pbar.close()
         im.close()
@@ -179,13 +254,19 @@ def _sanitize_filename(stem):
     return safe[:50] if len(safe) > 50 else safe
 
 
-def extract_frames_from_video(video_path, output_folder, frames_per_second, start_index=0, show_progress=True):
-    """从单个视频中提取帧"""
+def extract_frames_from_video(video_path, output_folder, frames_per_second, start_index=0, show_progress=True,
+                              image_format='png', quality=None, encode_workers=ENCODE_WORKERS):
+    """从单个视频中提取帧
+
+    不需要保存的帧只 grab() 跳过（不解码转换），需要保存的帧 retrieve() 后交给
+    FrameWriter 线程池编码写入，解码与编码并行进行。
+    """
     # WebP文件使用Pillow处理
     if Path(video_path).suffix.lower() == '.webp':
         return extract_frames_from_webp(
             video_path, output_folder, frames_per_second,
-            start_index=start_index, show_progress=show_progress
+            start_index=start_index, show_progress=show_progress,
+            image_format=image_format, quality=quality
         )
 
     try:
@@ -220,8 +301,9 @@ def extract_frames_from_video(video_path, output_folder, frames_per_second, star
         logger.info(f"每隔 {skip_frames} 帧提取一张图片")
 
         frame_count = 0
-        saved_count = 0
         current_index = start_index
+        safe_stem = _sanitize_filename(video_path.stem)
+        writer = FrameWriter(image_format, quality, max_workers=encode_workers)
 
         # 显示进度条（多线程模式下隐藏单个视频的进度条，避免显示混乱）
         if show_progress:
@@ -229,41 +311,28 @@ def extract_frames_from_video(video_path, output_folder, frames_per_second, star
         else:
             pbar = None
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # 每隔skip_frames帧保存一次
-            if frame_count % skip_frames == 0:
-                # 生成输出文件名
-                safe_stem = _sanitize_filename(video_path.stem)
-                output_filename = f"{safe_stem}_{current_index:06d}.png"
-                output_path = output_folder / output_filename
-                
-                # 保存图片 - 使用cv2.imencode然后写入文件，避免直接imwrite的编码问题
-                success, encoded_image = cv2.imencode('.png', frame)
-                if success:
-                    with open(str(output_path), 'wb') as f:
-                        f.write(encoded_image)
-                    saved_count += 1
-                    current_index += 1
-                    # 验证文件是否真的保存成功
-                    if output_path.exists():
-                        logger.debug(f"已保存: {output_filename}")
+        try:
+            while cap.grab():
+                # 每隔skip_frames帧保存一次，其余帧只 grab 不解码
+                if frame_count % skip_frames == 0:
+                    ret, frame = cap.retrieve()
+                    if ret:
+                        writer.submit(frame, output_folder / f"{safe_stem}_{current_index:06d}")
+                        current_index += 1
                     else:
-                        logger.warning(f"文件可能未正确保存: {output_filename}")
-                else:
-                    logger.warning(f"编码失败: {output_filename}")
-            
-            frame_count += 1
+                        logger.warning(f"解码失败: 第 {frame_count} 帧")
+                
+                frame_count += 1
+                if pbar:
+                    pbar.update(1)
+        finally:
+            saved_count = writer.close()
             if pbar:
-                pbar.update(1)
-
-        if pbar:
-            pbar.close()
-        cap.release()
+                pbar.close()
+            cap.release()
         
+        if writer.failed_count:
+            logger.warning(f"{video_path.name} 有 {writer.failed_count} 张图片保存失败")
         logger.info(f"从 {video_path.name} 提取了 {saved_count} 张图片")
         return saved_count, current_index
         
@@ -273,17 +342,247 @@ def extract_frames_from_video(video_path, output_folder, frames_per_second, star
         logger.error(traceback.format_exc())
         return 0, start_index
 
-def _extract_video_task(args):
-    """线程安全的任务包装器，从 extract_frames_from_video 参数元组中解包并调用"""
-    video_file, output_folder, frames_per_second, start_index = args
-    return extract_frames_from_video(
-        video_file, output_folder, frames_per_second,
-        start_index=start_index, show_progress=False
-    )
+def _probe_video(video_file):
+    """读取视频的帧率和帧数，WebP 动画按帧数估算，失败返回 (0, 0)"""
+    if video_file.suffix.lower() == '.webp':
+        try:
+            from PIL import Image
+            with Image.open(str(video_file)) as im:
+                return 0, getattr(im, 'n_frames', 1)
+        except Exception:
+            return 0, 0
+    cap = cv2.VideoCapture(str(video_file))
+    try:
+        if not cap.isOpened():
+            return 0, 0
+        return cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
 
+def _plan_tasks(video_files, frames_per_second, max_workers):
+    """按预计帧数把视频拆分为任务
+
+    长视频按时间段（帧区间）拆成多个任务，区间长度是采样间隔的整数倍，
+    各分段由 _seek_to_frame 准确定位到起始帧，保证拆分后的采样帧与整段顺序提取完全一致。任务按帧数从大到小排列，
+    先提交大任务，避免一个长视频最后单独占用一个进程。
+
+    Returns:
+        tuple: (任务列表, 总帧数)；任务为 (视频序号, 分段序号, 视频路径, 起始帧, 结束帧, 采样间隔, 视频FPS, 帧数)
+    """
+    videos = []
+    for video_index, video_file in enumerate(video_files):
+        video_fps, total_frames = _probe_video(video_file)
+        if video_file.suffix.lower() != '.webp' and (video_fps == 0 or total_frames == 0):
+            logger.warning(f"视频文件信息异常，已跳过: {video_file}")
+            continue
+        skip_frames = max(1, int(round(video_fps / frames_per_second))) if video_fps else 1
+        videos.append((video_index, video_file, video_fps, total_frames, skip_frames))
+
+    total_frames_all = sum(v[3] for v in videos)
+    chunk_target = max(MIN_SPLIT_FRAMES, math.ceil(total_frames_all / max(1, max_workers * 2)))
+
+    tasks = []
+    for video_index, video_file, video_fps, total_frames, skip_frames in videos:
+        if video_file.suffix.lower() == '.webp' or total_frames <= chunk_target:
+            tasks.append((video_index, 0, str(video_file), 0, None, skip_frames, video_fps, total_frames))
+            continue
+        chunk_count = math.ceil(total_frames / chunk_target)
+        chunk_frames = math.ceil(total_frames / chunk_count / skip_frames) * skip_frames
+        for part_index, start in enumerate(range(0, total_frames, chunk_frames)):
+            # 最后一段读到视频结束，元数据帧数不准时也不会漏帧
+            end = start + chunk_frames if start + chunk_frames < total_frames else None
+            tasks.append((video_index, part_index, str(video_file), start, end, skip_frames, video_fps,
+                          min(chunk_frames, total_frames - start)))
+
+    tasks.sort(key=lambda task: task[7], reverse=True)
+    return tasks, total_frames_all
+
+
+def _seek_to_frame(cap, video_path, frame_number):
+    """把解码器准确定位到 frame_number（下一次 grab() 返回该帧）
+
+    先定位到提前 SEEK_MARGIN_FRAMES 帧的位置，读回实际位置后逐帧 grab() 前进；
+    实际位置不可用或越过了目标帧时，重新打开视频从头顺序前进。
+
+    Returns:
+        cv2.VideoCapture: 已定位的解码器（可能是重新打开的新对象），失败返回 None
+    """
+    target = max(0, frame_number - SEEK_MARGIN_FRAMES)
+    position = 0
+    if target > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        position = int(round(cap.get(cv2.CAP_PROP_POS_FRAMES)))
+        if not 0 <= position <= frame_number:
+            logger.debug(f"定位不准确（目标 {target}，实际 {position}），从头顺序读取: {video_path}")
+            cap.release()
+            cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                return None
+            position = 0
+    while position < frame_number:
+        if not cap.grab():
+            cap.release()
+            return None
+        position += 1
+    return cap
 
-def extract_frames_from_folder(input_folder, output_folder, frames_per_second, max_workers=4):
-    """从文件夹中所有视频提取帧（支持多线程并行处理）"""
+
+def _extract_range_task(task, staging_folder, frames_per_second, image_format, quality, progress_queue):
+    """进程池任务：提取视频 [起始帧, 结束帧) 区间内的采样帧到暂存文件夹
+
+    暂存文件按原视频帧号命名，最终编号在全部任务完成后统一分配。
+
+    Returns:
+        tuple: (视频序号, 分段序号, [(帧号, 暂存文件路径), ...])
+    """
+    video_index, part_index, video_path, start_frame, end_frame, skip_frames, _, estimated_frames = task
+    staging_folder = Path(staging_folder)
+    prefix = f"{video_index:05d}_{part_index:04d}"
+
+    if Path(video_path).suffix.lower() == '.webp':
+        # 动画WebP不拆分，暂存文件按顺序编号，没有对应的视频帧号
+        webp_folder = staging_folder / prefix
+        extract_frames_from_webp(video_path, webp_folder, frames_per_second, show_progress=False,
+                                 image_format=image_format, quality=quality)
+        progress_queue.put(estimated_frames)
+        return video_index, part_index, [(None, str(f)) for f in sorted(webp_folder.iterdir())]
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        logger.warning(f"无法打开视频文件: {video_path}")
+        progress_queue.put(estimated_frames)
+        return video_index, part_index, []
+    if start_frame > 0:
+        cap = _seek_to_frame(cap, video_path, start_frame)
+        if cap is None:
+            logger.warning(f"无法定位到第 {start_frame} 帧: {video_path}")
+            progress_queue.put(estimated_frames)
+            return video_index, part_index, []
+
+    writer = FrameWriter(image_format, quality, max_workers=PROCESS_ENCODE_WORKERS)
+    staged = []
+    frame_number = start_frame
+    reported = 0
+    try:
+        while end_frame is None or frame_number < end_frame:
+            if not cap.grab():
+                break
+            if (frame_number - start_frame) % skip_frames == 0:
+                ret, frame = cap.retrieve()
+                if ret:
+                    output_path = staging_folder / f"{prefix}_{frame_number:09d}"
+                    writer.submit(frame, output_path)
+                    staged.append((frame_number, f"{output_path}{writer.ext}"))
+            frame_number += 1
+            if frame_number - start_frame - reported >= PROGRESS_REPORT_FRAMES:
+                progress_queue.put(frame_number - start_frame - reported)
+                reported = frame_number - start_frame
+    finally:
+        writer.close()
+        cap.release()
+        # 实际帧数与估算不一致时，按估算值补齐进度，保证总进度能走到 100%
+        progress_queue.put(max(0, estimated_frames - reported))
+
+    return video_index, part_index, [(n, path) for n, path in staged if os.path.exists(path)]
+
+
+def _finalize_extraction(results, video_files, tasks, output_folder, frames_per_second, image_format):
+    """按视频顺序和帧号分配连续编号：先写入清单，再把暂存文件重命名为最终文件名
+
+    Returns:
+        int: 最终保存的图片数量
+    """
+    ext = IMAGE_FORMATS[image_format][0]
+    video_fps = {task[0]: task[6] for task in tasks}
+
+    entries = []
+    renames = []
+    index = 0
+    for video_index, _, staged in sorted(results, key=lambda r: (r[0], r[1])):
+        video_file = video_files[video_index]
+        safe_stem = _sanitize_filename(video_file.stem)
+        fps = video_fps.get(video_index) or 0
+        for frame_number, staged_path in staged:
+            output_name = f"{safe_stem}_{index:06d}{ext}"
+            entries.append({
+                "file": output_name,
+                "video": str(video_file),
+                "frame": frame_number,
+                "time": round(frame_number / fps, 3) if fps and frame_number is not None else None,
+            })
+            renames.append((staged_path, output_folder / output_name))
+            index += 1
+
+    manifest = {
+        "frames_per_second": frames_per_second,
+        "image_format": image_format,
+        "total": len(entries),
+        "files": entries,
+    }
+    with open(output_folder / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    for staged_path, output_path in renames:
+        os.replace(staged_path, output_path)
+    return len(entries)
+
+
+def _run_extraction(video_files, output_folder, frames_per_second, max_workers, image_format, quality):
+    """多进程提取多个视频：按帧数均衡调度，按帧汇总进度，结束后统一分配连续编号
+
+    Returns:
+        int: 保存的图片数量
+    """
+    tasks, total_frames = _plan_tasks(video_files, frames_per_second, max_workers)
+    if not tasks:
+        return 0
+
+    staging_folder = output_folder / f".extract_staging_{os.getpid()}"
+    staging_folder.mkdir(parents=True, exist_ok=True)
+    actual_workers = min(max_workers, len(tasks))
+    split_count = len(tasks) - len({task[0] for task in tasks})
+    logger.info(f"共 {len(tasks)} 个提取任务（长视频额外拆分出 {split_count} 段），使用 {actual_workers} 个进程")
+
+    results = []
+    try:
+        with tqdm(total=total_frames, desc="提取总进度", unit="帧") as pbar:
+            if actual_workers <= 1:
+                progress_queue = queue.Queue()
+                for task in tasks:
+                    results.append(_extract_range_task(task, str(staging_folder), frames_per_second,
+                                                       image_format, quality, progress_queue))
+                    while not progress_queue.empty():
+                        pbar.update(progress_queue.get())
+            else:
+                with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=actual_workers) as executor:
+                    progress_queue = manager.Queue()
+                    futures = {
+                        executor.submit(_extract_range_task, task, str(staging_folder), frames_per_second,
+                                        image_format, quality, progress_queue): task
+                        for task in tasks
+                    }
+                    pending = set(futures)
+                    while pending:
+                        done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                        while not progress_queue.empty():
+                            pbar.update(progress_queue.get())
+                        for future in done:
+                            try:
+                                results.append(future.result())
+                            except Exception as e:
+                                logger.error(f"处理视频 {futures[future][2]} 时进程出错: {e}")
+                    while not progress_queue.empty():
+                        pbar.update(progress_queue.get())
+
+        return _finalize_extraction(results, video_files, tasks, output_folder, frames_per_second, image_format)
+    finally:
+        shutil.rmtree(staging_folder, ignore_errors=True)
+
+
+def extract_frames_from_folder(input_folder, output_folder, frames_per_second, max_workers=4,
+                               image_format='png', quality=None):
+    """从文件夹中所有视频提取帧（多进程并行，图片按视频顺序连续编号）"""
     # 处理路径编码
     input_folder = Path(str(input_folder).encode('utf-8').decode('utf-8'))
     output_folder = input_folder / str(output_folder).encode('utf-8').decode('utf-8')
@@ -297,7 +596,7 @@ def extract_frames_from_folder(input_folder, output_folder, frames_per_second, m
 
     # 获取所有视频文件
     try:
-        video_files = get_all_videos(input_folder)
+        video_files = get_all_videos(input_folder, exclude_folder=output_folder)
     except Exception as e:
         logger.error(f"搜索视频文件时出错: {e}")
         return
@@ -306,48 +605,16 @@ def extract_frames_from_folder(input_folder, output_folder, frames_per_second, m
         logger.warning("未找到任何视频文件")
         return
 
-    total_saved = 0
-
-    # 为每个视频预分配起始编号，避免线程间的锁竞争
-    # 每个视频预留 100000 个编号空间（足以覆盖 27+ 小时的 1fps 视频）
-    INDEX_RANGE_PER_VIDEO = 100000
-    video_tasks = []
-    for i, video_file in enumerate(video_files):
-        start_index = i * INDEX_RANGE_PER_VIDEO
-        video_tasks.append((video_file, output_folder, frames_per_second, start_index))
-
-    # 判断是否使用多线程（视频数量 > 1 且 max_workers > 1）
-    use_multithreading = max_workers > 1 and len(video_files) > 1
-    actual_workers = min(max_workers, len(video_files))
-
-    if use_multithreading:
-        logger.info(f"使用 {actual_workers} 个线程并行处理 {len(video_files)} 个视频文件...")
-        with ThreadPoolExecutor(max_workers=actual_workers) as executor:
-            futures = {executor.submit(_extract_video_task, task): task[0] for task in video_tasks}
-            with tqdm(total=len(video_tasks), desc="视频处理总进度", unit="个") as pbar:
-                for future in as_completed(futures):
-                    video_file = futures[future]
-                    try:
-                        saved_count, _ = future.result()
-                        total_saved += saved_count
-                        pbar.set_postfix_str(f"完成: {video_file.name}")
-                    except Exception as e:
-                        logger.error(f"处理视频 {video_file} 时线程出错: {e}")
-                    pbar.update(1)
-    else:
-        logger.info(f"开始处理 {len(video_files)} 个视频文件...")
-        for i, (video_file, _, _, start_index) in enumerate(video_tasks, 1):
-            logger.info(f"[{i}/{len(video_files)}] 开始处理: {video_file}")
-            saved_count, _ = extract_frames_from_video(
-                video_file, output_folder, frames_per_second, start_index
-            )
-            total_saved += saved_count
+    logger.info(f"开始处理 {len(video_files)} 个视频文件...")
+    total_saved = _run_extraction(video_files, output_folder, frames_per_second, max_workers,
+                                  image_format, quality)
 
     # 最终检查
-    final_files = list(output_folder.glob("*.png"))
+    ext = IMAGE_FORMATS[image_format][0]
+    final_files = list(output_folder.glob(f"*{ext}"))
     logger.info(f"处理完成！")
     logger.info(f"报告提取了 {total_saved} 张图片")
-    logger.info(f"实际在输出文件夹中找到 {len(final_files)} 个png文件")
+    logger.info(f"实际在输出文件夹中找到 {len(final_files)} 个{ext[1:]}文件")
 
     if len(final_files) > 0:
         logger.info(f"前5个文件:")
@@ -355,10 +622,12 @@ def extract_frames_from_folder(input_folder, output_folder, frames_per_second, m
             logger.info(f"  - {file.name}")
     else:
         logger.warning("输出文件夹中没有找到图片文件，请检查是否有权限或磁盘空间问题")
+    logger.info(f"提取清单: {output_folder / MANIFEST_NAME}")
 
 # 新增：处理单个视频文件
-def extract_frames_from_single_video(video_path, output_folder, frames_per_second):
-    """从单个视频文件提取帧"""
+def extract_frames_from_single_video(video_path, output_folder, frames_per_second, image_format='png', quality=None,
+                                     max_workers=1):
+    """从单个视频文件提取帧（max_workers > 1 时长视频按时间段拆分给多个进程）"""
     # 处理路径编码
     video_path = Path(str(video_path).encode('utf-8').decode('utf-8'))
     
@@ -384,21 +653,50 @@ def extract_frames_from_single_video(video_path, output_folder, frames_per_secon
     logger.info(f"输出文件夹已创建: {output_folder}")
     
     # 处理单个视频文件
-    saved_count, _ = extract_frames_from_video(
-        video_path, output_folder, frames_per_second, 0
-    )
+    if max_workers > 1:
+        saved_count = _run_extraction([video_path], output_folder, frames_per_second, max_workers,
+                                      image_format, quality)
+    else:
+        saved_count, _ = extract_frames_from_video(
+            video_path, output_folder, frames_per_second, 0,
+            image_format=image_format, quality=quality
+        )
     
     # 最终检查
-    final_files = list(output_folder.glob("*.png"))
+    ext = IMAGE_FORMATS[image_format][0]
+    final_files = list(output_folder.glob(f"*{ext}"))
     logger.info(f"处理完成！")
     logger.info(f"报告提取了 {saved_count} 张图片")
-    logger.info(f"实际在输出文件夹中找到 {len(final_files)} 个png文件")
+    logger.info(f"实际在输出文件夹中找到 {len(final_files)} 个{ext[1:]}文件")
     
     if len(final_files) > 0:
         logger.info(f"前5个文件:")
         for file in final_files[:5]:
             logger.info(f"  - {file.name}")
 
+def ask_image_format():
+    """询问输出图片格式和质量参数，返回 (image_format, quality)"""
+    image_format = input("请输入输出图片格式 png/jpg/webp (回车使用默认值 png): ").strip().lower()
+    if image_format == 'jpeg':
+        image_format = 'jpg'
+    if image_format not in IMAGE_FORMATS:
+        if image_format:
+            print("无效格式，使用默认值 png")
+        image_format = 'png'
+
+    _, _, default, (low, high) = IMAGE_FORMATS[image_format]
+    name = "PNG压缩级别" if image_format == 'png' else "图片质量"
+    default_text = "默认快速压缩" if default is None else f"默认值{default}"
+    quality_input = input(f"请输入{name} ({low}-{high}, 回车使用{default_text}): ").strip()
+    if not quality_input:
+        return image_format, default
+    try:
+        return image_format, min(high, max(low, int(quality_input)))
+    except ValueError:
+        print(f"无效输入，使用{default_text}")
+        return image_format, default
+
+
 def main():
     print("=== 视频帧提取工具 ===")
 
@@ -422,6 +720,26 @@ def main():
     if not output_folder:
         output_folder = "extracted_frames"
 
+    image_format, quality = ask_image_format()
+
+    # 询问进程数（多个视频并行处理，长视频也会按时间段拆分到多个进程）
+    worker_input = input("请输入并行处理的进程数 (1-16, 回车使用默认值4): ").strip()
+    if not worker_input:
+        max_workers = 4
+    else:
+        try:
+            max_workers = int(worker_input)
+            if max_workers < 1:
+                print("进程数不能小于1，已设置为1")
+                max_workers = 1
+            elif max_workers > 16:
+                print("进程数不建议超过16，已限制为16")
+                max_workers = 16
+        except ValueError:
+            print("无效输入，使用默认值4")
+            max_workers = 4
+    print(f"将使用 {max_workers} 个进程进行并行处理")
+
     input_path_obj = Path(input_path)
 
     # 判断输入的是文件还是文件夹
@@ -431,7 +749,9 @@ def main():
         print("\n开始处理...")
         print("-" * 50)
         try:
-            extract_frames_from_single_video(input_path, output_folder, frames_per_second)
+            extract_frames_from_single_video(input_path, output_folder, frames_per_second,
+                                             image_format=image_format, quality=quality,
+                                             max_workers=max_workers)
         except Exception as e:
             logger.error(f"程序执行出错: {e}")
             import traceback
@@ -439,29 +759,11 @@ def main():
     else:
         print(f"\n检测到输入的是文件夹")
         print(f"输出文件夹 '{output_folder}' 将创建在输入文件夹内")
-
-        # 询问线程数
-        thread_input = input("请输入并行处理的线程数 (1-16, 回车使用默认值4): ").strip()
-        if not thread_input:
-            max_workers = 4
-        else:
-            try:
-                max_workers = int(thread_input)
-                if max_workers < 1:
-                    print("线程数不能小于1，已设置为1")
-                    max_workers = 1
-                elif max_workers > 16:
-                    print("线程数不建议超过16，已限制为16")
-                    max_workers = 16
-            except ValueError:
-                print("无效输入，使用默认值4")
-                max_workers = 4
-
-        print(f"将使用 {max_workers} 个线程进行并行处理")
         print("\n开始处理...")
         print("-" * 50)
         try:
-            extract_frames_from_folder(input_path, output_folder, frames_per_second, max_workers=max_workers)
+            extract_frames_from_folder(input_path, output_folder, frames_per_second, max_workers=max_workers,
+                                       image_format=image_format, quality=quality)
         except Exception as e:
             logger.error(f"程序执行出错: {e}")
             import traceback